@@ -0,0 +1,322 @@
+# backend/article_extractor.py
+"""Full article text for summaries, fetched once per URL.
+
+NewsAPI only returns the first couple of hundred characters of an article, so
+`extract_articles` downloads the pages themselves: concurrently, at most
+ARTICLE_FETCH_PER_HOST at a time from any one site, reading no more than
+ARTICLE_MAX_BYTES of each response and giving up on whatever is still being
+fetched after ARTICLE_FETCH_DEADLINE_SECONDS. Redirects are followed only
+within the article's own site, at most ARTICLE_MAX_REDIRECTS times. Before
+the first request and every redirect the host is resolved, and pages on
+private, loopback, link-local or reserved addresses are not fetched (unless
+ARTICLE_ALLOW_PRIVATE_HOSTS is set, for local stubs). The main text (the
+paragraphs, preferring those inside <article>) is kept in a SQLite file shared
+by every process on the host, as an LRU of ARTICLE_CACHE_MAX_ENTRIES URLs, so
+an article is downloaded once however many editions and newsletters include
+it. Failed fetches are remembered too and retried after ARTICLE_RETRY_SECONDS.
+"""
+import asyncio
+import ipaddress
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+from http_client import get_http_session
+
+ARTICLE_EXTRACTION_ENABLED = os.getenv("ARTICLE_EXTRACTION_ENABLED", "true").lower() == "true"
+ARTICLE_CACHE_PATH = os.getenv("ARTICLE_CACHE_PATH", "./article_cache.db")
+ARTICLE_CACHE_MAX_ENTRIES = int(os.getenv("ARTICLE_CACHE_MAX_ENTRIES", "5000"))
+ARTICLE_FETCH_CONCURRENCY = int(os.getenv("ARTICLE_FETCH_CONCURRENCY", "16"))
+ARTICLE_FETCH_PER_HOST = int(os.getenv("ARTICLE_FETCH_PER_HOST", "2"))
+ARTICLE_FETCH_TIMEOUT_SECONDS = float(os.getenv("ARTICLE_FETCH_TIMEOUT_SECONDS", "10"))
+ARTICLE_FETCH_DEADLINE_SECONDS = float(os.getenv("ARTICLE_FETCH_DEADLINE_SECONDS", "20"))
+ARTICLE_MAX_REDIRECTS = int(os.getenv("ARTICLE_MAX_REDIRECTS", "3"))
+ARTICLE_MAX_BYTES = int(os.getenv("ARTICLE_MAX_BYTES", "1000000"))
+ARTICLE_MAX_TEXT_CHARS = int(os.getenv("ARTICLE_MAX_TEXT_CHARS", "20000"))
+ARTICLE_RETRY_SECONDS = float(os.getenv("ARTICLE_RETRY_SECONDS", "21600"))
+# Article URLs come from NewsAPI; only fetch internal addresses when testing against local stubs
+ARTICLE_ALLOW_PRIVATE_HOSTS = os.getenv("ARTICLE_ALLOW_PRIVATE_HOSTS", "false").lower() == "true"
+
+# Paragraphs shorter than this are usually captions, bylines or buttons
+MIN_PARAGRAPH_CHARS = 40
+_SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form", "button", "figcaption"}
+_PARAGRAPH_TAGS = {"p", "h2", "h3", "li", "blockquote"}
+_REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+# Counters for this process
+cache_stats = {"hits": 0, "misses": 0, "fetched": 0, "failed": 0, "timed_out": 0}
+
+
+class _ArticleTextExtractor(HTMLParser):
+    """Collects paragraph text, separately for paragraphs inside and outside <article>."""
+
+    def __init__(self):
+        super().__init__()
+        self.article_paragraphs: List[str] = []
+        self.other_paragraphs: List[str] = []
+        self._skip = 0
+        self._article = 0
+        self._paragraph: Optional[List[str]] = None
+
+    def _end_paragraph(self):
+        if self._paragraph is not None:
+            text = " ".join(" ".join(self._paragraph).split())
+            if len(text) >= MIN_PARAGRAPH_CHARS:
+                (self.article_paragraphs if self._article else self.other_paragraphs).append(text)
+            self._paragraph = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skip += 1
+        elif tag == "article":
+            self._article += 1
+        elif tag in _PARAGRAPH_TAGS and not self._skip:
+            self._end_paragraph()
+            self._paragraph = []
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag == "article":
+            self._end_paragraph()
+            self._article = max(0, self._article - 1)
+        elif tag in _PARAGRAPH_TAGS:
+            self._end_paragraph()
+
+    def handle_data(self, data):
+        if self._paragraph is not None and not self._skip:
+            self._paragraph.append(data)
+
+
+def extract_text(html: str, max_chars: int = ARTICLE_MAX_TEXT_CHARS) -> str:
+    """Main text of an article page, one paragraph per line; empty when none is found."""
+    extractor = _ArticleTextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    extractor._end_paragraph()
+    paragraphs = extractor.article_paragraphs or extractor.other_paragraphs
+    return "\n\n".join(paragraphs)[:max_chars]
+
+
+class ArticleTextCache:
+    """Extracted text by URL in a local SQLite file, least recently used evicted first.
+
+    An empty text records a failed fetch, which counts as a miss once it is
+    older than retry_seconds.
+    """
+
+    def __init__(self, path: str = ARTICLE_CACHE_PATH, max_entries: int = ARTICLE_CACHE_MAX_ENTRIES,
+                 retry_seconds: float = ARTICLE_RETRY_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.retry_seconds = retry_seconds
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS article_texts (
+                    url TEXT PRIMARY KEY, text TEXT NOT NULL, fetched_at REAL NOT NULL, accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_article_texts_accessed_at ON article_texts (accessed_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not cross threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, urls: List[str]) -> Dict[str, str]:
+        """Cached texts for urls, failed fetches included, marking them as recently used."""
+        if not urls:
+            return {}
+        now = time.time()
+        conn = self._connection()
+        found = {}
+        # Stay under SQLite's bound parameter limit
+        for start in range(0, len(urls), 500):
+            batch = urls[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT url, text, fetched_at FROM article_texts WHERE url IN ({placeholders})", batch
+            ).fetchall()
+            found.update(
+                (url, text) for url, text, fetched_at in rows if text or now - fetched_at < self.retry_seconds
+            )
+        if found:
+            hits = list(found)
+            for start in range(0, len(hits), 500):
+                batch = hits[start:start + 500]
+                conn.execute(
+                    f"UPDATE article_texts SET accessed_at = ? WHERE url IN ({','.join('?' * len(batch))})", [now, *batch]
+                )
+        return found
+
+    def set_many(self, texts: Dict[str, str]) -> int:
+        """Store texts by URL; returns how many entries were evicted to make room."""
+        if not texts:
+            return 0
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO article_texts (url, text, fetched_at, accessed_at) VALUES (?, ?, ?, ?)",
+                [(url, text, now, now) for url, text in texts.items()],
+            )
+            excess = conn.execute("SELECT COUNT(*) FROM article_texts").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM article_texts WHERE url IN "
+                    "(SELECT url FROM article_texts ORDER BY accessed_at LIMIT ?)", (excess,)
+                )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return max(0, excess)
+
+
+_cache: Optional[ArticleTextCache] = None
+
+
+def get_article_cache() -> ArticleTextCache:
+    """The process-wide cache, opened on first use."""
+    global _cache
+    if _cache is None:
+        _cache = ArticleTextCache()
+    return _cache
+
+
+def _same_site(url: str, target: str) -> bool:
+    """Whether target is an http(s) URL on url's host, a subdomain of it or its parent domain."""
+    parts = urlsplit(target)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return False
+    host = (urlsplit(url).hostname or "").removeprefix("www.")
+    target_host = parts.hostname.removeprefix("www.")
+    return target_host == host or target_host.endswith("." + host) or host.endswith("." + target_host)
+
+
+def _is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])  # Without an IPv6 scope id
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return not (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved
+                or ip.is_multicast or ip.is_unspecified)
+
+
+async def _check_public_host(url: str):
+    """Raise ValueError unless every address url's host resolves to is public."""
+    if ARTICLE_ALLOW_PRIVATE_HOSTS:
+        return
+    parts = urlsplit(url)
+    if not parts.hostname:
+        raise ValueError(f"no host in {url}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    addresses = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    for *_, sockaddr in addresses:
+        if not _is_public_address(sockaddr[0]):
+            raise ValueError(f"{parts.hostname} resolves to non-public address {sockaddr[0]}")
+
+
+async def fetch_article_text(url: str, max_bytes: int = ARTICLE_MAX_BYTES) -> str:
+    """Download one article page, reading at most max_bytes, and extract its text; empty on any failure."""
+    import aiohttp  # Loaded with the HTTP session
+
+    session = get_http_session()
+    location = url
+    try:
+        timeout = aiohttp.ClientTimeout(total=ARTICLE_FETCH_TIMEOUT_SECONDS)
+        # Redirects are followed here, so none leaves the article's site
+        for _ in range(ARTICLE_MAX_REDIRECTS + 1):
+            await _check_public_host(location)
+            async with session.get(location, timeout=timeout, headers={"Accept": "text/html"},
+                                   allow_redirects=False) as response:
+                if response.status in _REDIRECT_STATUSES:
+                    target = urljoin(location, response.headers.get("Location", ""))
+                    if not _same_site(url, target):
+                        print(f"Skipping article {url}: redirected off site to {target}")
+                        return ""
+                    location = target
+                    continue
+                if response.status != 200 or "html" not in response.content_type:
+                    print(f"Skipping article {url}: {response.status} {response.content_type}")
+                    return ""
+                body = bytearray()
+                # Stop reading at the cap; a truncated page still parses
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    body += chunk
+                    if len(body) >= max_bytes:
+                        del body[max_bytes:]
+                        break
+                charset = response.charset or "utf-8"
+                break
+        else:
+            print(f"Skipping article {url}: more than {ARTICLE_MAX_REDIRECTS} redirects")
+            return ""
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError, ValueError) as e:
+        # OSError: the host did not resolve; ValueError: a bad URL or a non-public address
+        print(f"Error fetching article {url}: {e!r}")
+        return ""
+    try:
+        html = body.decode(charset, errors="replace")
+    except LookupError:
+        html = body.decode("utf-8", errors="replace")
+    return await asyncio.to_thread(extract_text, html)
+
+
+async def extract_articles(urls: Iterable[Optional[str]], cache: Optional[ArticleTextCache] = None,
+                           concurrency: int = ARTICLE_FETCH_CONCURRENCY,
+                           per_host: int = ARTICLE_FETCH_PER_HOST, max_bytes: int = ARTICLE_MAX_BYTES,
+                           deadline_seconds: float = ARTICLE_FETCH_DEADLINE_SECONDS) -> Dict[str, str]:
+    """Main text for each http(s) URL, from the cache or downloaded; URLs without any text are left out.
+
+    Downloads still running after deadline_seconds are cancelled and left out
+    too, without caching anything for them, so the next call tries again.
+    """
+    cache = cache or get_article_cache()
+    urls = [url for url in dict.fromkeys(urls) if url and urlsplit(url).scheme in ("http", "https")]
+    try:
+        texts = await asyncio.to_thread(cache.get_many, urls)
+    except sqlite3.Error as e:
+        print(f"Error reading article cache: {e}")
+        texts = {}
+    missing = [url for url in urls if url not in texts]
+    cache_stats["hits"] += len(texts)
+    cache_stats["misses"] += len(missing)
+
+    if missing:
+        semaphore = asyncio.Semaphore(concurrency)
+        hosts = defaultdict(lambda: asyncio.Semaphore(per_host))
+
+        async def fetch(url: str) -> str:
+            # Host first, so requests queued for a busy site do not hold slots others could use
+            async with hosts[urlsplit(url).netloc.lower()], semaphore:
+                return await fetch_article_text(url, max_bytes)
+
+        tasks = {asyncio.create_task(fetch(url)): url for url in missing}
+        done, pending = await asyncio.wait(tasks, timeout=deadline_seconds)
+        for task in pending:
+            task.cancel()
+        if pending:
+            print(f"Article extraction deadline reached with {len(pending)} of {len(missing)} pages still loading")
+            cache_stats["timed_out"] += len(pending)
+        fetched = {tasks[task]: task.result() for task in done}
+        cache_stats["fetched"] += sum(1 for text in fetched.values() if text)
+        cache_stats["failed"] += sum(1 for text in fetched.values() if not text)
+        try:
+            await asyncio.to_thread(cache.set_many, fetched)
+        except sqlite3.Error as e:
+            print(f"Error storing article texts: {e}")
+        texts.update(fetched)
+    return {url: text for url, text in texts.items() if text}
@@ -0,0 +1,176 @@
+# backend/article_store.py
+import hashlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import NewsArticle, Newsletter, NewsletterArticle
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha256((url or "").encode("utf-8")).hexdigest()
+
+
+def _parse_published_at(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def _upsert_statement(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise ValueError(f"Article upserts support sqlite and postgresql databases, not {dialect}")
+    return insert
+
+
+def upsert_articles(db: Session, category: str, articles: List[dict]) -> Dict[str, int]:
+    """Store fetched articles, updating rows that already exist for the same URL.
+
+    Returns {url_hash: article id}. The caller owns the transaction and must commit.
+    """
+    now = datetime.utcnow()
+    rows = {}
+    for article in articles:
+        if not article.get("url") or not article.get("title"):
+            continue
+        key = url_hash(article["url"])
+        rows[key] = {
+            "url_hash": key,
+            "title": article["title"][:500],
+            "url": article["url"],
+            "source": ((article.get("source") or {}).get("name") or "")[:100] or None,
+            "category": category,
+            "description": article.get("description"),
+            "original_content": article.get("content"),
+            "published_at": _parse_published_at(article.get("publishedAt")),
+            "created_at": now,
+            "last_seen_at": now,
+        }
+    if not rows:
+        return {}
+
+    insert = _upsert_statement(db)
+    statement = insert(NewsArticle).values(list(rows.values()))
+    statement = statement.on_conflict_do_update(
+        index_elements=[NewsArticle.url_hash],
+        set_={
+            "title": statement.excluded.title,
+            "description": statement.excluded.description,
+            "original_content": statement.excluded.original_content,
+            "last_seen_at": statement.excluded.last_seen_at,
+        },
+    )
+    db.execute(statement)
+    return article_ids(db, rows.keys())
+
+
+def article_ids(db: Session, url_hashes) -> Dict[str, int]:
+    url_hashes = list(url_hashes)
+    if not url_hashes:
+        return {}
+    rows = db.query(NewsArticle.url_hash, NewsArticle.id).filter(NewsArticle.url_hash.in_(url_hashes)).all()
+    return {row.url_hash: row.id for row in rows}
+
+
+def _resolve_article_ids(db: Session, newsletters: List[Dict]) -> Dict[str, int]:
+    """{url_hash: article id} for every article in the given articles_by_category dicts, upserting missing ones."""
+    ids = article_ids(db, {
+        url_hash(a.get("url")) for articles_by_category in newsletters
+        for articles in articles_by_category.values() for a in articles
+    })
+    for articles_by_category in newsletters:
+        for category, articles in articles_by_category.items():
+            missing = [a for a in articles if a.get("url") and url_hash(a["url"]) not in ids]
+            if missing:
+                ids.update(upsert_articles(db, category, missing))
+    return ids
+
+
+def _build_newsletter(user_id: int, subject: str, articles_by_category: Dict, ids: Dict[str, int],
+                      email_status: str) -> Newsletter:
+    newsletter = Newsletter(user_id=user_id, subject=subject, email_status=email_status)
+    linked = set()
+    for category, articles in articles_by_category.items():
+        for article in articles:
+            article_id = ids.get(url_hash(article.get("url")))
+            # An article can be listed under several categories; link it once
+            if article_id is None or article_id in linked:
+                continue
+            newsletter.article_links.append(
+                NewsletterArticle(article_id=article_id, category=category, position=len(linked))
+            )
+            linked.add(article_id)
+    return newsletter
+
+
+def record_newsletter(db: Session, user_id: int, subject: str, articles_by_category: Dict,
+                      email_status: str = "sent") -> Newsletter:
+    """Record a sent newsletter as links to stored articles instead of a copy of its HTML.
+
+    Articles that are not in the store yet are upserted first. The caller owns
+    the transaction and must commit.
+    """
+    ids = _resolve_article_ids(db, [articles_by_category])
+    newsletter = _build_newsletter(user_id, subject, articles_by_category, ids, email_status)
+    db.add(newsletter)
+    return newsletter
+
+
+def record_newsletters(db: Session, subject: str, deliveries: List[Tuple[int, Dict]],
+                       email_status: str = "sent") -> int:
+    """record_newsletter for a batch of (user_id, articles_by_category), resolving article ids once.
+
+    The caller owns the transaction and must commit. Returns the number of newsletters recorded.
+    """
+    if not deliveries:
+        return 0
+    ids = _resolve_article_ids(db, [articles_by_category for _, articles_by_category in deliveries])
+    db.add_all([
+        _build_newsletter(user_id, subject, articles_by_category, ids, email_status)
+        for user_id, articles_by_category in deliveries
+    ])
+    return len(deliveries)
+
+
+def delivered_article_ids(db: Session, user_ids: List[int], candidate_ids: Iterable[int]) -> Dict[int, Set[int]]:
+    """Which of candidate_ids each user has already been sent, as {user_id: {article id}}.
+
+    One set-based query for the whole batch of users: newsletter_articles joined
+    to their newsletters, restricted to the candidates, so its cost follows the
+    size of the current edition rather than of each user's history.
+    """
+    candidate_ids = list(candidate_ids)
+    if not user_ids or not candidate_ids:
+        return {}
+    rows = (
+        db.query(Newsletter.user_id, NewsletterArticle.article_id)
+        .join(NewsletterArticle, NewsletterArticle.newsletter_id == Newsletter.id)
+        .filter(
+            Newsletter.user_id.in_(user_ids),
+            Newsletter.email_status == "sent",
+            NewsletterArticle.article_id.in_(candidate_ids),
+        )
+        .distinct()
+        .all()
+    )
+    delivered: Dict[int, Set[int]] = {}
+    for row in rows:
+        delivered.setdefault(row.user_id, set()).add(row.article_id)
+    return delivered
+
+
+def newsletter_articles(newsletter: Newsletter) -> Dict[str, List[dict]]:
+    """Rebuild a newsletter's articles_by_category from its stored articles."""
+    articles_by_category: Dict[str, List[dict]] = {}
+    for link in newsletter.article_links:
+        articles_by_category.setdefault(link.category, []).append(link.article.to_dict())
+    return articles_by_category
@@ -0,0 +1,150 @@
+"""Near-duplicate detection cost: MinHash signatures and LSH candidate comparisons.
+
+    python benchmarks/bench_dedup.py --sizes 1000,2000,4000,8000 --duplicate-rate 0.3
+
+Builds synthetic corpora where a share of the stories is filed again under
+other categories, either verbatim or with a word changed, and runs dedup on
+each. Reports signature and clustering time, the comparisons LSH made next to
+the n(n-1)/2 an all-pairs check needs, and precision/recall against the known
+duplicates. The smallest corpus is also checked all-pairs (vectorized) and
+signed with a pure-Python MinHash loop, for reference.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup import _A, _B, _PRIME, DEDUP_THRESHOLD, lsh_clusters, minhash_signatures, shingle_hashes
+
+VOCABULARY = [f"word{i}" for i in range(5000)]
+
+
+def corpus(size: int, duplicate_rate: float, seed: int = 0):
+    """(texts, story of each text); a story's later texts are its duplicates."""
+    rng = random.Random(seed)
+    texts, stories = [], []
+    story = 0
+    while len(texts) < size:
+        words = rng.sample(VOCABULARY, 35)
+        texts.append(" ".join(words))
+        stories.append(story)
+        while len(texts) < size and rng.random() < duplicate_rate:
+            copy = list(words)
+            if rng.random() < 0.5:
+                copy[rng.randrange(len(copy))] = rng.choice(VOCABULARY)  # Edited copy
+            texts.append(" ".join(copy))
+            stories.append(story)
+        story += 1
+    # Interleave stories, as categories are fetched one after another
+    order = list(range(size))
+    rng.shuffle(order)
+    return [texts[i] for i in order], [stories[i] for i in order]
+
+
+def quality(duplicate_of: list, stories: list) -> dict:
+    first = {}
+    for index, story in enumerate(stories):
+        first.setdefault(story, index)
+    expected = {index for index, story in enumerate(stories) if first[story] != index}
+    flagged = {index for index, original in enumerate(duplicate_of) if original != index}
+    correct = {index for index in flagged if stories[duplicate_of[index]] == stories[index]}
+    return {
+        "duplicates": len(expected),
+        "flagged": len(flagged),
+        "precision": round(len(correct) / len(flagged), 4) if flagged else 1.0,
+        "recall": round(len(correct & expected) / len(expected), 4) if expected else 1.0,
+    }
+
+
+def python_signatures(texts: list) -> list:
+    """The same MinHash, one shingle and one permutation at a time."""
+    a, b, prime = [int(x) for x in _A], [int(x) for x in _B], _PRIME
+    signatures = []
+    for text in texts:
+        shingles = [int(x) for x in shingle_hashes(text)]
+        signatures.append([min((ai * x + bi) % prime for x in shingles) for ai, bi in zip(a, b)])
+    return signatures
+
+
+def all_pairs(signatures: np.ndarray, threshold: float) -> int:
+    """Pairs at or above threshold, comparing every pair of signatures."""
+    pairs = 0
+    for row in range(len(signatures) - 1):
+        agreement = (signatures[row + 1:] == signatures[row]).mean(axis=1)
+        pairs += int(np.count_nonzero(agreement >= threshold))
+    return pairs
+
+
+def bench_size(size: int, duplicate_rate: float) -> dict:
+    texts, stories = corpus(size, duplicate_rate)
+    started = time.perf_counter()
+    signatures, has_words = minhash_signatures(texts)
+    signature_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    duplicate_of, comparisons = lsh_clusters(signatures, has_words)
+    cluster_seconds = time.perf_counter() - started
+    total_pairs = size * (size - 1) // 2
+    return {
+        "articles": size,
+        "signature_seconds": round(signature_seconds, 4),
+        "cluster_seconds": round(cluster_seconds, 4),
+        "articles_per_sec": round(size / (signature_seconds + cluster_seconds)),
+        "comparisons": comparisons,
+        "all_pairs": total_pairs,
+        "comparisons_per_article": round(comparisons / size, 3),
+        "share_of_all_pairs": round(comparisons / total_pairs, 6),
+        **quality(duplicate_of, stories),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,2000,4000,8000", help="Comma-separated corpus sizes")
+    parser.add_argument("--duplicate-rate", type=float, default=0.3)
+    parser.add_argument("--python-sample", type=int, default=200, help="Texts signed with the pure-Python loop")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    runs = [bench_size(size, args.duplicate_rate) for size in sizes]
+
+    texts, _ = corpus(sizes[0], args.duplicate_rate)
+    signatures, _ = minhash_signatures(texts)
+    started = time.perf_counter()
+    similar_pairs = all_pairs(signatures, DEDUP_THRESHOLD)
+    all_pairs_seconds = time.perf_counter() - started
+    sample = texts[:args.python_sample]
+    started = time.perf_counter()
+    python_signatures(sample)
+    python_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    minhash_signatures(sample)
+    numpy_seconds = time.perf_counter() - started
+
+    print(json.dumps({
+        "benchmark": "dedup",
+        "threshold": DEDUP_THRESHOLD,
+        "duplicate_rate": args.duplicate_rate,
+        "runs": runs,
+        "all_pairs_reference": {
+            "articles": sizes[0],
+            "seconds": round(all_pairs_seconds, 4),
+            "similar_pairs": similar_pairs,
+            "lsh_cluster_seconds": runs[0]["cluster_seconds"],
+        },
+        "signatures": {
+            "texts": len(sample),
+            "python_seconds": round(python_seconds, 4),
+            "numpy_seconds": round(numpy_seconds, 4),
+            "speedup": round(python_seconds / numpy_seconds, 1),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
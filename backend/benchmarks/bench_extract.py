@@ -0,0 +1,107 @@
+"""Article extraction against the local article stub: cold fetches, cache hits and the byte cap.
+
+    python benchmarks/bench_extract.py --articles 200 --per-host 4 --latency-ms 50
+
+Extracts the same article URLs twice with a fresh cache file. The first pass
+downloads every page with at most --per-host requests in flight (all stub
+pages share one host); the second must be served from the cache without a
+download. A last pass fetches --large pages of 5 MB that are only bounded by
+--max-bytes. Reports throughput, downloads, peak concurrency at the stub, bytes
+sent per large page and how much text was extracted compared with NewsAPI's
+truncated content.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The article stub runs on localhost
+os.environ.setdefault("ARTICLE_ALLOW_PRIVATE_HOSTS", "true")
+
+from article_extractor import ArticleTextCache, extract_articles
+from http_client import close_http_session
+from stubs import StubConfig, Stubs
+
+CATEGORIES = ["business", "technology", "science", "health"]
+# NewsAPI cuts content off after 200 characters
+NEWSAPI_CONTENT_CHARS = 200
+
+
+async def extract_pass(urls: list, cache: ArticleTextCache, stubs: Stubs, args) -> dict:
+    stats = stubs.stats["articles"]
+    requests, bytes_sent = stats.requests, stats.bytes_sent
+    started = time.perf_counter()
+    texts = await extract_articles(
+        urls, cache=cache, concurrency=args.concurrency, per_host=args.per_host, max_bytes=args.max_bytes
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        "seconds": round(elapsed, 3),
+        "articles_per_sec": round(len(urls) / elapsed, 1),
+        "downloads": stats.requests - requests,
+        "bytes_sent": stats.bytes_sent - bytes_sent,
+        "extracted": len(texts),
+        "avg_text_chars": round(sum(map(len, texts.values())) / len(texts)) if texts else 0,
+        "max_text_chars": max(map(len, texts.values()), default=0),
+        "boilerplate_leaked": any("Copyright" in text or "Most read" in text for text in texts.values()),
+    }
+
+
+async def run(args) -> dict:
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate)
+    stubs = Stubs(config, StubConfig(), StubConfig(), articles=config)
+    await stubs.start()
+    cache = ArticleTextCache(os.path.join(tempfile.mkdtemp(prefix="newsletter-articles-"), "articles.db"))
+    base_url = stubs.article_base_url
+    urls = [f"{base_url}/{CATEGORIES[i % len(CATEGORIES)]}/{i}" for i in range(args.articles)]
+    large = [f"{base_url}/large/{i}" for i in range(args.large)]
+    try:
+        cold = await extract_pass(urls, cache, stubs, args)
+        warm = await extract_pass(urls, cache, stubs, args)
+        capped = await extract_pass(large, cache, stubs, args) if large else None
+    finally:
+        await close_http_session()
+        await stubs.stop()
+
+    result = {
+        "benchmark": "article_extraction",
+        "articles": args.articles,
+        "per_host": args.per_host,
+        "latency_ms": args.latency_ms,
+        "cold": cold,
+        "warm": warm,
+        "max_in_flight_at_stub": stubs.stats["articles"].max_in_flight,
+        "newsapi_content_chars": NEWSAPI_CONTENT_CHARS,
+    }
+    if capped:
+        # The stub also counts what it wrote into socket buffers before the client hung up
+        result["large_pages"] = {
+            "pages": len(large),
+            "page_bytes": 5_000_000,
+            "max_bytes": args.max_bytes,
+            "bytes_sent_per_page": capped["bytes_sent"] // len(large),
+            "max_text_chars": capped["max_text_chars"],
+            "seconds": capped["seconds"],
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--large", type=int, default=4, help="5 MB pages that only the byte cap bounds")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--per-host", type=int, default=4)
+    parser.add_argument("--max-bytes", type=int, default=1_000_000)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
+
+
+if __name__ == "__main__":
+    main()
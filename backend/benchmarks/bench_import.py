@@ -0,0 +1,108 @@
+"""Startup cost of the API: import time of main, checked against a budget.
+
+    python benchmarks/bench_import.py --runs 5 --budget-ms 1500
+
+Imports main in fresh interpreters under `python -X importtime` and reports the
+median cumulative import time, the slowest modules main imports directly and
+the repo's own modules. Exits non-zero when the median is over --budget-ms,
+when a module in --forbid is imported (aiohttp, created with the HTTP session
+in the lifespan handler, and numpy, which only dedup needs, by default), or
+when importing main touched the database (the schema is created by
+`python migrations.py`, not on import).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_MODULES = {name[:-3] for name in os.listdir(BACKEND_DIR) if name.endswith(".py")}
+
+
+def parse_importtime(stderr: str) -> list:
+    """(module, self us, cumulative us, depth) for every line of -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_part, cumulative_us, name = line.split("|")
+        self_us = int(self_part.split(":")[1])
+        indent = len(name) - len(name.lstrip(" "))
+        entries.append((name.strip(), self_us, int(cumulative_us), (indent - 1) // 2))
+    return entries
+
+
+def import_once(module: str, forbid: list) -> dict:
+    db_path = os.path.join(tempfile.mkdtemp(prefix="newsletter-import-"), "import.db")
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}"}
+    check = f"import sys, {module}; print(','.join(m for m in {forbid!r} if m in sys.modules))"
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    wall_seconds = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    entries = parse_importtime(result.stderr)
+    index = next(i for i, entry in enumerate(entries) if entry[0] == module and entry[3] == 0)
+    # Modules imported directly by main are the depth 1 lines since the previous top-level import
+    start = max((i for i in range(index) if entries[i][3] == 0), default=-1) + 1
+    return {
+        "import_ms": entries[index][2] / 1000,
+        "wall_ms": wall_seconds * 1000,
+        "direct": {name: cumulative / 1000 for name, _, cumulative, depth in entries[start:index] if depth == 1},
+        "repo": {name: cumulative / 1000 for name, _, cumulative, _ in entries[start:index] if name in REPO_MODULES},
+        "forbidden": [name for name in result.stdout.strip().split(",") if name],
+        "database_touched": os.path.exists(db_path),
+    }
+
+
+def slowest(runs: list, key: str, limit: int) -> dict:
+    names = set().union(*(run[key] for run in runs))
+    medians = {name: statistics.median(run[key].get(name, 0) for run in runs) for name in names}
+    return {name: round(ms, 1) for name, ms in sorted(medians.items(), key=lambda item: -item[1])[:limit]}
+
+
+def bench(module: str, runs: int, budget_ms: float, forbid: list) -> dict:
+    import_once(module, forbid)  # Warm the bytecode cache
+    results = [import_once(module, forbid) for _ in range(runs)]
+    import_ms = statistics.median(run["import_ms"] for run in results)
+    forbidden = sorted(set().union(*(run["forbidden"] for run in results)))
+    database_touched = any(run["database_touched"] for run in results)
+    return {
+        "benchmark": "import",
+        "module": module,
+        "runs": runs,
+        "import_ms": round(import_ms, 1),
+        "import_ms_min": round(min(run["import_ms"] for run in results), 1),
+        "process_wall_ms": round(statistics.median(run["wall_ms"] for run in results), 1),
+        "budget_ms": budget_ms,
+        "slowest_direct_imports_ms": slowest(results, "direct", 10),
+        "repo_modules_ms": slowest(results, "repo", 10),
+        "forbidden_imports": forbidden,
+        "database_touched": database_touched,
+        "passed": import_ms <= budget_ms and not forbidden and not database_touched,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--forbid", nargs="*", default=["aiohttp", "numpy"])
+    args = parser.parse_args()
+    result = bench(args.module, args.runs, args.budget_ms, args.forbid)
+    print(json.dumps(result, indent=2))
+    if not result["passed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
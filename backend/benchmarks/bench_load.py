@@ -0,0 +1,209 @@
+"""Load test of the API against local NewsAPI, Gemini and SMTP stubs.
+
+    python benchmarks/bench_load.py --concurrency 1,8,32,64 --requests 500 --workers 1
+    python benchmarks/bench_load.py --latency-ms 200 --error-rate 0.05 > run.json
+
+Starts the stubs in this process, the API (and optionally job workers) as
+subprocesses against a throwaway SQLite database, then drives /categories,
+/register, /users/{user_id} and /unsubscribe/{token} at each concurrency
+level. Prints one JSON document with RPS and latency percentiles per
+endpoint and level, so runs can be diffed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import add_stub_arguments, stubs_from_args
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATEGORIES = ["technology", "business", "sports", "health", "entertainment", "science", "politics"]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def drive(session: aiohttp.ClientSession, base_url: str, requests: List[Tuple[str, str, Optional[dict]]],
+                concurrency: int, expected_status: int) -> dict:
+    """Send requests with `concurrency` in flight and summarize their latency."""
+    latencies: List[float] = []
+    errors = 0
+    position = 0
+
+    async def client():
+        nonlocal position, errors
+        while position < len(requests):
+            method, path, body = requests[position]
+            position += 1
+            started = time.perf_counter()
+            try:
+                async with session.request(method, base_url + path, json=body) as response:
+                    await response.read()
+                    if response.status != expected_status:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(requests),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "rps": round(len(requests) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def read_users(db_path: str) -> List[Tuple[int, str]]:
+    """Users still subscribed; earlier levels unsubscribed some, and /users/{id} is a 404 for them."""
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(
+            "SELECT id, unsubscribe_token FROM users WHERE NOT EXISTS "
+            "(SELECT 1 FROM unsubscribe_tombstones WHERE unsubscribe_tombstones.user_id = users.id) ORDER BY id"
+        ).fetchall()
+
+
+async def wait_until_healthy(session: aiohttp.ClientSession, base_url: str, process: subprocess.Popen):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API exited with status {process.returncode}")
+        try:
+            async with session.get(base_url + "/health") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("API did not become healthy within 30s")
+
+
+async def run(args) -> dict:
+    stubs = stubs_from_args(args)
+    await stubs.start()
+    workdir = tempfile.mkdtemp(prefix="newsletter-bench-")
+    db_path = os.path.join(workdir, "bench.db")
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        **stubs.app_env(),
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "BASE_URL": base_url,
+        # Measure the app, not our plan quotas
+        "NEWS_API_RATE_PER_MINUTE": "1000000",
+        "GEMINI_RATE_PER_MINUTE": "1000000",
+        "SMTP_RATE_PER_MINUTE": "1000000",
+        # Stored tokens, so the unsubscribe scenario can read them from the database
+        "UNSUBSCRIBE_SIGNING_KEYS": "",
+    }
+
+    subprocess.run([sys.executable, "migrations.py"], cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, check=True)
+    processes = [subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env,
+    )]
+    if args.workers:
+        processes.append(subprocess.Popen(
+            [sys.executable, "worker.py", "--processes", str(args.workers), "--concurrency", "8"],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+        ))
+
+    results = []
+    try:
+        connector = aiohttp.TCPConnector(limit=max(args.concurrency) * 2)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await wait_until_healthy(session, base_url, processes[0])
+            for concurrency in args.concurrency:
+                run_id = uuid.uuid4().hex[:8]
+                scenarios = [
+                    ("categories", [("GET", "/categories", None)] * args.requests, 200),
+                    ("register", [
+                        ("POST", "/register", {
+                            "name": f"Bench {i}",
+                            "email": f"bench-{run_id}-{i}@example.com",
+                            "categories": random.sample(CATEGORIES, 2),
+                        })
+                        for i in range(args.requests)
+                    ], 202),
+                ]
+                for endpoint, requests, expected_status in scenarios:
+                    result = await drive(session, base_url, requests, concurrency, expected_status)
+                    results.append({"endpoint": endpoint, "concurrency": concurrency, **result})
+
+                users = await asyncio.to_thread(read_users, db_path)
+                user_requests = [("GET", f"/users/{random.choice(users)[0]}", None) for _ in range(args.requests)]
+                result = await drive(session, base_url, user_requests, concurrency, 200)
+                results.append({"endpoint": "users", "concurrency": concurrency, **result})
+
+                tokens = [token for _, token in users[-args.requests:]]
+                unsubscribe_requests = [("GET", f"/unsubscribe/{token}", None) for token in tokens]
+                result = await drive(session, base_url, unsubscribe_requests, concurrency, 200)
+                results.append({"endpoint": "unsubscribe", "concurrency": concurrency, **result})
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        await stubs.stop()
+
+    return {
+        "benchmark": "api_load",
+        "config": {
+            "concurrency": args.concurrency,
+            "requests_per_endpoint": args.requests,
+            "workers": args.workers,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+        },
+        "results": results,
+        "upstream_requests": stubs.stats_dict(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=lambda value: [int(v) for v in value.split(",")], default=[1, 8, 32, 64],
+                        help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint and level")
+    parser.add_argument("--workers", type=int, default=1, help="Job worker processes; 0 to leave jobs queued")
+    add_stub_arguments(parser)
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Micro-benchmarks for hot helpers: generate_newsletter_html and validate_email.
+
+    python benchmarks/bench_micro.py --repeat 5
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep main away from the real database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from email_templates import generate_newsletter_html
+from main import validate_email
+
+EMAILS = [
+    "reader@example.com",
+    "first.last+news@sub.example.co.uk",
+    "not-an-email",
+    "missing@tld",
+    "x" * 64 + "@" + "y" * 180 + ".com",
+]
+
+
+def sample_articles(categories: int = 4, per_category: int = 3) -> dict:
+    return {
+        f"category{c}": [
+            {
+                "title": f"Headline {c}-{i} about something that happened this week",
+                "url": f"https://news.example.com/{c}/{i}",
+                "description": "A short description of the article. " * 6,
+            }
+            for i in range(per_category)
+        ]
+        for c in range(categories)
+    }
+
+
+def measure(func, number: int, repeat: int) -> dict:
+    """Best-of-repeat timing, reported per call."""
+    timings = timeit.repeat(func, number=number, repeat=repeat)
+    best = min(timings) / number
+    return {"calls": number, "repeat": repeat, "best_us_per_call": round(best * 1e6, 3), "calls_per_sec": round(1 / best)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--render-calls", type=int, default=2000)
+    parser.add_argument("--validate-calls", type=int, default=100000)
+    args = parser.parse_args()
+
+    articles = sample_articles()
+    emails = itertools.cycle(EMAILS)
+    results = {
+        "benchmark": "micro",
+        "generate_newsletter_html": measure(
+            lambda: generate_newsletter_html("Reader", articles, "https://example.com/unsubscribe/token"),
+            args.render_calls, args.repeat,
+        ),
+        "validate_email": measure(
+            lambda: validate_email(next(emails)),
+            args.validate_calls, args.repeat,
+        ),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
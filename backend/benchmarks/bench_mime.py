@@ -0,0 +1,102 @@
+"""Message building cost per recipient: MIMEMultipart.as_string vs. pre-encoded chunks.
+
+    python benchmarks/bench_mime.py --recipients 2000 --categories 4
+
+Builds the same newsletter for every recipient both ways and reports messages
+per second and bytes allocated per message (tracemalloc peak over one message).
+The legacy path only had the HTML part; the chunked path also carries the
+plain-text alternative, so its messages are larger.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_templates import CompiledNewsletter
+from mime_builder import NewsletterMessage
+
+SENDER = "newsletter@example.com"
+SUBJECT = "Your Weekly AI Newsletter 📰"
+
+
+def sample_articles(categories: int, per_category: int = 3) -> dict:
+    return {
+        f"category{c}": [
+            {
+                "title": f"Headline {c}-{i} about something that happened this week",
+                "url": f"https://news.example.com/{c}/{i}",
+                "summary": "A two sentence summary of the article, written for the newsletter. " * 3,
+            }
+            for i in range(per_category)
+        ]
+        for c in range(categories)
+    }
+
+
+def legacy_message(newsletter: CompiledNewsletter, email: str, name: str, url: str) -> str:
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = SUBJECT
+    msg['From'] = SENDER
+    msg['To'] = email
+    msg.attach(MIMEText(newsletter.render(name, url), 'html'))
+    return msg.as_string()
+
+
+def chunked_message(message: NewsletterMessage, email: str, name: str, url: str) -> list:
+    return message.chunks(email, SUBJECT, name, url)
+
+
+def peak_allocation(build, *args) -> int:
+    tracemalloc.start()
+    build(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def bench(recipients: int, categories: int) -> dict:
+    newsletter = CompiledNewsletter(sample_articles(categories))
+    users = [(f"reader{i}@example.com", f"Reader {i}", f"https://example.com/unsubscribe/token{i}")
+             for i in range(recipients)]
+
+    started = time.perf_counter()
+    for email, name, url in users:
+        legacy_size = len(legacy_message(newsletter, email, name, url))
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    message = NewsletterMessage(newsletter, SENDER)
+    for email, name, url in users:
+        chunked_size = sum(map(len, chunked_message(message, email, name, url)))
+    chunked_seconds = time.perf_counter() - started
+
+    return {
+        "benchmark": "mime_build",
+        "recipients": recipients,
+        "categories": categories,
+        "legacy_messages_per_sec": round(recipients / legacy_seconds),
+        "chunked_messages_per_sec": round(recipients / chunked_seconds),
+        "speedup": round(legacy_seconds / chunked_seconds, 2),
+        "legacy_bytes_allocated_per_message": peak_allocation(legacy_message, newsletter, *users[0]),
+        "chunked_bytes_allocated_per_message": peak_allocation(chunked_message, message, *users[0]),
+        "legacy_message_bytes": legacy_size,
+        "chunked_message_bytes": chunked_size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, default=2000)
+    parser.add_argument("--categories", type=int, default=4)
+    args = parser.parse_args()
+    print(json.dumps(bench(args.recipients, args.categories), indent=2))
+
+
+if __name__ == "__main__":
+    main()
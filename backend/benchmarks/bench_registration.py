@@ -0,0 +1,191 @@
+"""Signup throughput: lookup-then-insert registration vs. insert-or-conflict.
+
+    python benchmarks/bench_registration.py --signups 2000 --concurrency 32 --duplicate-rate 0.1
+
+Runs both registration paths against a throwaway SQLite database with the same
+concurrent signups (a share of them re-using an email already registered) and
+reports signups per second, latency percentiles and SQL statements per signup.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep main away from the real database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from fastapi import HTTPException
+from sqlalchemy import event, select
+
+from database import AsyncSessionLocal, async_engine
+from job_queue import WELCOME_NEWSLETTER, enqueue_job
+from main import UserRegistration, generate_unsubscribe_token, register_user
+from migrations import create_schema
+from models import User, UserCategory
+from validators import AVAILABLE_CATEGORIES, invalid_categories, validate_email
+
+statements = 0
+
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    global statements
+    statements += 1
+
+
+def legacy_validate_email(email: str) -> bool:
+    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    return re.match(pattern, email) is not None
+
+
+async def legacy_register(user_data: UserRegistration, db):
+    """The registration path before the fast path: validate, look the email up, insert, refresh."""
+    if not legacy_validate_email(user_data.email):
+        raise HTTPException(status_code=400, detail="Invalid email format")
+    result = await db.execute(select(User).filter(User.email == user_data.email))
+    if result.scalars().first():
+        raise HTTPException(status_code=400, detail="Email already registered")
+    invalid = [cat for cat in user_data.categories if cat not in AVAILABLE_CATEGORIES]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid categories: {invalid}")
+    db_user = User(
+        name=user_data.name,
+        email=user_data.email,
+        categories=",".join(user_data.categories),
+        newsletter_sent=False,
+        unsubscribe_token=generate_unsubscribe_token(),
+        subscriptions=[UserCategory(category=category) for category in dict.fromkeys(user_data.categories)]
+    )
+    try:
+        db.add(db_user)
+        await db.flush()
+        enqueue_job(db, WELCOME_NEWSLETTER, {"user_id": db_user.id})
+        await db.commit()
+        await db.refresh(db_user)
+        return db_user
+    except Exception as e:
+        # A concurrent duplicate that passed the lookup ends up here
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
+
+
+def signups(prefix: str, count: int, duplicate_rate: float):
+    emails = []
+    for i in range(count):
+        if emails and random.random() < duplicate_rate:
+            emails.append(random.choice(emails))
+        else:
+            emails.append(f"{prefix}-{i}@example.com")
+    return [
+        UserRegistration(name=f"Reader {i}", email=email, categories=random.sample(AVAILABLE_CATEGORIES, 2))
+        for i, email in enumerate(emails)
+    ]
+
+
+async def run_path(name: str, handler, requests, concurrency: int) -> dict:
+    global statements
+    statements = 0
+    latencies = []
+    rejected = 0
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def signup(user_data):
+        nonlocal rejected, errors
+        async with semaphore:
+            started = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                try:
+                    await handler(user_data, db)
+                except HTTPException as e:
+                    if e.status_code == 400:
+                        rejected += 1
+                    else:
+                        errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(signup(user_data) for user_data in requests))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def percentile(fraction):
+        return round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000, 3)
+
+    return {
+        "path": name,
+        "signups": len(requests),
+        "rejected_duplicates": rejected,
+        "server_errors": errors,
+        "signups_per_sec": round(len(requests) / elapsed, 1),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "sql_statements_per_signup": round(statements / len(requests), 2),
+    }
+
+
+def validation_micro(calls: int) -> dict:
+    emails = ["reader@example.com", "not-an-email", "first.last+news@sub.example.co.uk"]
+    categories = ["science", "politics"]
+    legacy = min(timeit.repeat(
+        lambda: [legacy_validate_email(e) for e in emails] and [c for c in categories if c not in AVAILABLE_CATEGORIES],
+        number=calls, repeat=3))
+    fast = min(timeit.repeat(
+        lambda: [validate_email(e) for e in emails] and invalid_categories(categories),
+        number=calls, repeat=3))
+    return {
+        "calls": calls,
+        "legacy_us_per_call": round(legacy / calls * 1e6, 3),
+        "fast_us_per_call": round(fast / calls * 1e6, 3),
+        "speedup": round(legacy / fast, 2),
+    }
+
+
+async def run(args) -> dict:
+    create_schema()
+    results = []
+    # Alternate the order so neither path always runs against the larger table
+    for round_number in range(args.rounds):
+        paths = [("lookup_then_insert", legacy_register), ("insert_or_conflict", register_user)]
+        if round_number % 2:
+            paths.reverse()
+        for name, handler in paths:
+            requests = signups(f"{name}-{round_number}", args.signups, args.duplicate_rate)
+            results.append(await run_path(name, handler, requests, args.concurrency))
+    await async_engine.dispose()
+
+    def best(name):
+        return max((r for r in results if r["path"] == name), key=lambda r: r["signups_per_sec"])
+
+    legacy, fast = best("lookup_then_insert"), best("insert_or_conflict")
+    return {
+        "benchmark": "registration",
+        "concurrency": args.concurrency,
+        "duplicate_rate": args.duplicate_rate,
+        "runs": results,
+        "speedup": round(fast["signups_per_sec"] / legacy["signups_per_sec"], 2),
+        "validation": validation_micro(args.validation_calls),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signups", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--validation-calls", type=int, default=100000)
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
+
+
+if __name__ == "__main__":
+    main()
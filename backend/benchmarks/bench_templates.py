@@ -0,0 +1,64 @@
+"""Newsletter rendering throughput: full render per recipient vs. compiled template.
+
+    python benchmarks/bench_templates.py --recipients 5000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_templates import CompiledNewsletter, generate_newsletter_html
+
+
+def sample_articles(categories: int, per_category: int = 3) -> dict:
+    return {
+        f"category{c}": [
+            {
+                "title": f"Headline {c}-{i} about something that happened this week",
+                "url": f"https://news.example.com/{c}/{i}",
+                "description": "A short description of the article. " * 6,
+            }
+            for i in range(per_category)
+        ]
+        for c in range(categories)
+    }
+
+
+def bench(recipients: int, categories: int) -> dict:
+    articles = sample_articles(categories)
+    users = [(f"Reader {i}" if i % 3 else None, f"https://example.com/unsubscribe/token{i}") for i in range(recipients)]
+
+    started = time.perf_counter()
+    for name, url in users:
+        generate_newsletter_html(name, articles, url).encode("utf-8")
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    newsletter = CompiledNewsletter(articles)
+    for name, url in users:
+        newsletter.render_bytes(name, url)
+    compiled_seconds = time.perf_counter() - started
+
+    return {
+        "benchmark": "newsletter_render",
+        "recipients": recipients,
+        "categories": categories,
+        "generate_newsletter_html_renders_per_sec": recipients / legacy_seconds,
+        "compiled_renders_per_sec": recipients / compiled_seconds,
+        "speedup": legacy_seconds / compiled_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, default=5000)
+    parser.add_argument("--categories", type=int, default=4)
+    args = parser.parse_args()
+    print(json.dumps(bench(args.recipients, args.categories), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""Local stand-ins for NewsAPI, Gemini, news sites and an SMTP server, for benchmarks.
+
+    python benchmarks/stubs.py --latency-ms 50 --error-rate 0.01
+
+Each stub adds a fixed latency plus a little jitter to every request and fails
+a configurable share of them (HTTP 500 for the APIs and article pages, a 451
+reply for SMTP). The article URLs NewsAPI returns point at the article stub.
+"""
+import argparse
+import asyncio
+import json
+import random
+from typing import Optional
+
+from aiohttp import web
+
+
+class StubConfig:
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+
+    async def delay(self):
+        seconds = (self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+class Stats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+
+    def to_dict(self) -> dict:
+        return {"requests": self.requests, "errors": self.errors}
+
+
+class ArticleStats(Stats):
+    """Also tracks concurrent requests and bytes written, to check client limits."""
+
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.bytes_sent = 0
+
+    def start(self):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finish(self):
+        self.in_flight -= 1
+
+    def to_dict(self) -> dict:
+        return {**super().to_dict(), "max_in_flight": self.max_in_flight, "bytes_sent": self.bytes_sent}
+
+
+def article_page(category: str, number: str, paragraphs: int = 8) -> str:
+    """A news article page with the clutter extraction has to skip."""
+    body = "\n".join(
+        f"<p>Paragraph {n} of {category} story {number}: what happened, who said what and why it matters.</p>"
+        for n in range(1, paragraphs + 1)
+    )
+    return f"""<!DOCTYPE html>
+<html><head><title>{category} story {number}</title><script>var tracking = "{'x' * 2000}";</script></head>
+<body><header><nav><p>Home | World | Business | Technology | Science | Sports | Health</p></nav></header>
+<article><h1>{category.title()} headline {number}</h1><p>By A Reporter</p>
+{body}
+<figure><figcaption>A photo caption that is long enough to look like a paragraph.</figcaption></figure>
+</article>
+<aside><p>Most read: ten other stories you may have missed this week, in one list.</p></aside>
+<footer><p>Copyright Example News. All rights reserved. Terms, privacy and cookies.</p></footer>
+</body></html>"""
+
+
+def article_app(config: StubConfig, stats: ArticleStats) -> web.Application:
+    """GET /articles/{category}/{number} article pages; /articles/large/{number} streams megabytes of HTML."""
+    async def article(request: web.Request) -> web.StreamResponse:
+        stats.start()
+        try:
+            await config.delay()
+            if config.should_fail():
+                stats.errors += 1
+                return web.Response(status=500, text="error")
+            category, number = request.match_info["category"], request.match_info["number"]
+            if category != "large":
+                text = article_page(category, number)
+                stats.bytes_sent += len(text)
+                return web.Response(text=text, content_type="text/html")
+            # Trickled out like a slow server, so only a byte cap on the client keeps this bounded
+            response = web.StreamResponse(headers={"Content-Type": "text/html; charset=utf-8"})
+            await response.prepare(request)
+            chunk = ("<p>" + "Filler text in a very large page. " * 30 + "</p>\n").encode("utf-8") * 16
+            try:
+                for _ in range(5_000_000 // len(chunk)):
+                    await response.write(chunk)
+                    stats.bytes_sent += len(chunk)
+                    await asyncio.sleep(0.001)
+            except (ConnectionError, RuntimeError):
+                pass  # The client stopped reading
+            return response
+        finally:
+            stats.finish()
+
+    app = web.Application()
+    app.router.add_get("/articles/{category}/{number}", article)
+    return app
+
+
+def news_api_app(config: StubConfig, stats: Stats, article_base_url: str = "https://news.example.com") -> web.Application:
+    """GET /v2/top-headlines returning five articles for the requested category."""
+    async def top_headlines(request: web.Request) -> web.Response:
+        stats.requests += 1
+        await config.delay()
+        if config.should_fail():
+            stats.errors += 1
+            return web.json_response({"status": "error"}, status=500)
+        category = request.query.get("category", "general")
+        articles = [
+            {
+                "title": f"{category.title()} headline {i}",
+                "url": f"{article_base_url}/{category}/{i}",
+                "description": f"What happened in {category} today, part {i}.",
+                "content": f"Full text of {category} story {i}. " * 20,
+                "source": {"name": "Example News"},
+                "publishedAt": "2024-01-01T00:00:00Z",
+            }
+            for i in range(5)
+        ]
+        return web.json_response({"status": "ok", "totalResults": len(articles), "articles": articles})
+
+    app = web.Application()
+    app.router.add_get("/v2/top-headlines", top_headlines)
+    return app
+
+
+def gemini_app(config: StubConfig, stats: Stats) -> web.Application:
+    """POST /generateContent answering batched ([[n]] markers) and single-article prompts."""
+    async def generate_content(request: web.Request) -> web.Response:
+        stats.requests += 1
+        body = await request.json()
+        await config.delay()
+        if config.should_fail():
+            stats.errors += 1
+            return web.json_response({"error": {"code": 500}}, status=500)
+        prompt = body["contents"][0]["parts"][0]["text"]
+        markers = prompt.count("[[") - 1  # The instructions mention [[1]] once
+        if markers > 0:
+            text = "\n".join(f"[[{n}]] Stub summary of article {n}." for n in range(1, markers + 1))
+        else:
+            text = "Stub summary of the article."
+        return web.json_response({
+            "candidates": [{"content": {"parts": [{"text": text}]}}],
+            "usageMetadata": {"totalTokenCount": len(prompt) // 4},
+        })
+
+    app = web.Application()
+    app.router.add_post("/generateContent", generate_content)
+    return app
+
+
+class SMTPSink(asyncio.Protocol):
+    """Just enough SMTP to accept and discard messages from smtplib."""
+
+    def __init__(self, config: StubConfig, stats: Stats):
+        self.config = config
+        self.stats = stats
+        self.transport: Optional[asyncio.Transport] = None
+        self.buffer = b""
+        self.in_data = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.write(b"220 stub ESMTP ready\r\n")
+
+    def data_received(self, data: bytes):
+        self.buffer += data
+        if self.in_data:
+            end = self.buffer.find(b"\r\n.\r\n")
+            if end == -1:
+                return
+            self.buffer = self.buffer[end + 5:]
+            self.in_data = False
+            asyncio.ensure_future(self._finish_message())
+        while not self.in_data and b"\r\n" in self.buffer:
+            line, self.buffer = self.buffer.split(b"\r\n", 1)
+            self._command(line.decode("ascii", "replace"))
+
+    def _command(self, line: str):
+        verb = line[:4].upper()
+        if verb == "EHLO":
+            self.transport.write(b"250-stub\r\n250-8BITMIME\r\n250 SIZE 52428800\r\n")
+        elif verb == "DATA":
+            self.in_data = True
+            self.transport.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            # The message may already be in the buffer
+            if self.buffer:
+                self.data_received(b"")
+        elif verb == "QUIT":
+            self.transport.write(b"221 Bye\r\n")
+            self.transport.close()
+        elif verb in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+            self.transport.write(b"250 OK\r\n")
+        else:
+            self.transport.write(b"502 Command not implemented\r\n")
+
+    async def _finish_message(self):
+        self.stats.requests += 1
+        await self.config.delay()
+        if self.transport.is_closing():
+            return
+        if self.config.should_fail():
+            self.stats.errors += 1
+            self.transport.write(b"451 Temporary failure\r\n")
+        else:
+            self.transport.write(b"250 Queued\r\n")
+
+
+class Stubs:
+    """Runs the stubs on localhost ports in the current event loop."""
+
+    def __init__(self, news: StubConfig, gemini: StubConfig, smtp: StubConfig, host: str = "127.0.0.1",
+                 articles: Optional[StubConfig] = None):
+        self.host = host
+        self.configs = {"articles": articles or news, "newsapi": news, "gemini": gemini, "smtp": smtp}
+        self.stats = {name: ArticleStats() if name == "articles" else Stats() for name in self.configs}
+        self._runners = []
+        self._smtp_server = None
+        self.ports = {}
+
+    async def start(self):
+        await self._start_app("articles", article_app(self.configs["articles"], self.stats["articles"]))
+        await self._start_app("newsapi", news_api_app(self.configs["newsapi"], self.stats["newsapi"], self.article_base_url))
+        await self._start_app("gemini", gemini_app(self.configs["gemini"], self.stats["gemini"]))
+        loop = asyncio.get_running_loop()
+        self._smtp_server = await loop.create_server(
+            lambda: SMTPSink(self.configs["smtp"], self.stats["smtp"]), self.host, 0
+        )
+        self.ports["smtp"] = self._smtp_server.sockets[0].getsockname()[1]
+
+    async def _start_app(self, name: str, app: web.Application):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, self.host, 0)
+        await site.start()
+        self._runners.append(runner)
+        self.ports[name] = runner.addresses[0][1]
+
+    @property
+    def article_base_url(self) -> str:
+        return f"http://{self.host}:{self.ports['articles']}/articles"
+
+    def app_env(self) -> dict:
+        """Environment pointing the app at the stubs."""
+        return {
+            "NEWS_API_URL": f"http://{self.host}:{self.ports['newsapi']}/v2/top-headlines",
+            "GEMINI_API_URL": f"http://{self.host}:{self.ports['gemini']}/generateContent",
+            "SMTP_HOST": self.host,
+            "SMTP_PORT": str(self.ports["smtp"]),
+            "SMTP_USE_SSL": "false",
+            "SMTP_STARTTLS": "false",
+            "GMAIL_USER": "bench@example.com",
+            "GMAIL_PASSWORD": "",
+            # Article pages are served from this host
+            "ARTICLE_ALLOW_PRIVATE_HOSTS": "true",
+        }
+
+    def stats_dict(self) -> dict:
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
+
+    async def stop(self):
+        for runner in self._runners:
+            await runner.cleanup()
+        if self._smtp_server is not None:
+            self._smtp_server.close()
+            await self._smtp_server.wait_closed()
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=20, help="Latency added by every stub")
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub requests that fail")
+    parser.add_argument("--news-latency-ms", type=float, help="Override --latency-ms for NewsAPI")
+    parser.add_argument("--gemini-latency-ms", type=float, help="Override --latency-ms for Gemini")
+    parser.add_argument("--smtp-latency-ms", type=float, help="Override --latency-ms for SMTP")
+
+
+def stubs_from_args(args) -> Stubs:
+    def config(latency_ms):
+        return StubConfig(args.latency_ms if latency_ms is None else latency_ms, args.jitter_ms, args.error_rate)
+    return Stubs(config(args.news_latency_ms), config(args.gemini_latency_ms), config(args.smtp_latency_ms))
+
+
+async def _serve(args):
+    stubs = stubs_from_args(args)
+    await stubs.start()
+    print(json.dumps(stubs.app_env(), indent=2), flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stubs.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_stub_arguments(parser)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
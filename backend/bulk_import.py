@@ -0,0 +1,255 @@
+# backend/bulk_import.py
+"""Import subscribers in bulk from a CSV or NDJSON file.
+
+    python bulk_import.py partners.csv --send-welcome
+    python bulk_import.py partners.ndjson --format ndjson --batch-size 5000
+
+CSV files need an `email` column and may have `name` and `categories`
+columns; categories are separated by `;`, `|` or `,`. NDJSON lines are objects
+with the same keys, where `categories` may also be a list.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from job_queue import Job, WELCOME_NEWSLETTER
+from main import count_category_subscribers, generate_unsubscribe_token
+from models import User, UserCategory
+from validators import CATEGORY_SET, valid_emails
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "2000"))
+
+CATEGORY_SEPARATOR = re.compile(r"[;|,]")
+
+
+class ImportReport:
+    """Running totals for an import, reported after every batch"""
+
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.batches = 0
+        self.started = time.monotonic()
+        self.errors: List[str] = []  # First few validation errors, for display
+        self.categories = set()  # Categories of the imported subscribers
+        self.subscribers_by_category = {}  # Their subscriber totals once the import is done
+
+    def add_error(self, line_number: int, message: str):
+        self.invalid += 1
+        if len(self.errors) < 20:
+            self.errors.append(f"line {line_number}: {message}")
+
+    def to_dict(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "processed": self.processed,
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "batches": self.batches,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": self.processed / elapsed if elapsed else 0.0,
+            "errors": self.errors,
+            "subscribers_by_category": self.subscribers_by_category,
+        }
+
+
+def detect_format(filename: Optional[str]) -> str:
+    if filename and filename.lower().endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson"
+    return "csv"
+
+
+def iter_records(stream: TextIO, fmt: str) -> Iterator[dict]:
+    """Yield raw records from a text stream one line at a time."""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "ndjson":
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield record if isinstance(record, dict) else {}
+    else:
+        raise ValueError(f"Unsupported import format '{fmt}'")
+
+
+def _batches(records: Iterable[dict], batch_size: int) -> Iterator[List[dict]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _normalize_categories(raw) -> Optional[List[str]]:
+    """Lowercased categories without blanks or repeats, or None when raw is neither text nor a list."""
+    if isinstance(raw, str):
+        raw = CATEGORY_SEPARATOR.split(raw)
+    elif not isinstance(raw, list):
+        return None
+    return list(dict.fromkeys(str(c).strip().lower() for c in raw if str(c).strip()))
+
+
+def _validate_batch(batch: List[dict], first_line: int, report: ImportReport) -> dict:
+    """Normalize and validate a batch, returning {email: (name, categories)} with in-batch duplicates removed.
+
+    Each column is checked for the whole batch at once: emails with one regex
+    scan of the joined column, categories by normalizing each distinct value
+    once and taking one set difference against CATEGORY_SET. Only rows that
+    fail are looked at again, to report them.
+    """
+    # NDJSON values can be of any JSON type; anything but text is an invalid value
+    emails = [email.strip() if isinstance(email, str) else "" for email in (r.get("email") or "" for r in batch)]
+    valid = valid_emails(emails)
+
+    raw_categories = [record.get("categories") or [] for record in batch]
+    normalized = {raw: _normalize_categories(raw) for raw in {raw for raw in raw_categories if isinstance(raw, str)}}
+    categories = [normalized[raw] if isinstance(raw, str) else _normalize_categories(raw) for raw in raw_categories]
+    unknown = set().union(*(c for c in categories if c)) - CATEGORY_SET
+
+    accepted = {}
+    for offset, (record, email, record_categories) in enumerate(zip(batch, emails, categories)):
+        line_number = first_line + offset
+        if email not in valid:
+            report.add_error(line_number, f"invalid email {record.get('email') or ''!r}")
+            continue
+        if record_categories is None:
+            report.add_error(line_number, f"invalid categories {record.get('categories')!r}")
+            continue
+        if not record_categories:
+            report.add_error(line_number, "no categories")
+            continue
+        if unknown and not unknown.isdisjoint(record_categories):
+            report.add_error(line_number, f"invalid categories {sorted(unknown.intersection(record_categories))}")
+            continue
+
+        name = record.get("name") or ""
+        if not isinstance(name, str):
+            report.add_error(line_number, f"invalid name {name!r}")
+            continue
+
+        if email in accepted:
+            report.duplicates += 1
+            continue
+        accepted[email] = (name.strip() or None, record_categories)
+    return accepted
+
+
+def _insert_batch(db, valid: dict, send_welcome: bool, report: ImportReport):
+    """Insert one validated batch in a single transaction, skipping emails already registered."""
+    for attempt in range(3):
+        existing = set(db.execute(select(User.email).where(User.email.in_(list(valid)))).scalars())
+        new_users = [(email, name, categories) for email, (name, categories) in valid.items() if email not in existing]
+        if not new_users:
+            report.duplicates += len(valid)
+            return
+        try:
+            rows = db.execute(
+                insert(User).returning(User.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "name": name,
+                        "email": email,
+                        "categories": ",".join(categories),
+                        "newsletter_sent": False,
+                        "unsubscribe_token": generate_unsubscribe_token(),
+                    }
+                    for email, name, categories in new_users
+                ],
+            ).all()
+            user_ids = [row.id for row in rows]
+            db.execute(
+                insert(UserCategory),
+                [
+                    {"user_id": user_id, "category": category}
+                    for user_id, (_, _, categories) in zip(user_ids, new_users)
+                    for category in categories
+                ],
+            )
+            if send_welcome:
+                db.execute(
+                    insert(Job),
+                    [{"kind": WELCOME_NEWSLETTER, "payload": json.dumps({"user_id": user_id})} for user_id in user_ids],
+                )
+            db.commit()
+        except IntegrityError:
+            # Someone registered one of these emails since we checked; look again
+            db.rollback()
+            if attempt == 2:
+                raise
+            continue
+        report.imported += len(new_users)
+        report.categories.update(category for _, _, categories in new_users for category in categories)
+        report.duplicates += len(valid) - len(new_users)
+        return
+
+
+def import_subscribers(stream: TextIO, fmt: str = "csv", send_welcome: bool = False,
+                       batch_size: int = IMPORT_BATCH_SIZE,
+                       progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """Import subscribers from a text stream, holding at most one batch in memory.
+
+    Each batch is validated, checked against existing emails with one query and
+    inserted with executemany in its own transaction, so a failure only loses
+    the current batch. Welcome newsletters are queued when send_welcome is set.
+    """
+    report = ImportReport()
+    db = SessionLocal()
+    # Line 1 of a CSV file is the header
+    line_number = 2 if fmt == "csv" else 1
+    try:
+        for batch in _batches(iter_records(stream, fmt), batch_size):
+            valid = _validate_batch(batch, line_number, report)
+            if valid:
+                _insert_batch(db, valid, send_welcome, report)
+            report.processed += len(batch)
+            report.batches += 1
+            line_number += len(batch)
+            if progress is not None:
+                progress(report.to_dict())
+        if report.categories:
+            report.subscribers_by_category = count_category_subscribers(db, sorted(report.categories))
+    finally:
+        db.close()
+    return report.to_dict()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--send-welcome", action="store_true", help="Queue a welcome newsletter for each new subscriber")
+    args = parser.parse_args()
+
+    def print_progress(report: dict):
+        print(f"{report['processed']} rows: {report['imported']} imported, {report['duplicates']} duplicates, "
+              f"{report['invalid']} invalid, {report['rows_per_second']:.0f} rows/s")
+
+    with io.open(args.path, encoding="utf-8-sig", newline="") as stream:
+        report = import_subscribers(stream, args.format or detect_format(args.path), args.send_welcome,
+                                    args.batch_size, print_progress)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+# backend/campaign.py
+"""Send a newsletter campaign to every subscriber.
+
+    python campaign.py --name "Weekly digest" --batch-size 500 --concurrency 16
+    python campaign.py --name "Daily update" --incremental
+    python campaign.py --name "Tech weekly" --category technology
+    python campaign.py --resume 3
+
+Every delivered newsletter is recorded per user. Users a run failed to send
+to are recorded too, and --resume retries them before continuing from the
+checkpoint. An --incremental campaign
+only sends each subscriber the articles they have not received before, and
+skips subscribers with nothing new. A --category campaign only goes to that
+category's subscribers, with that category's articles.
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import or_, update
+
+from database import SessionLocal
+from main import (
+    GMAIL_USER, count_category_subscribers, get_newsletter_articles, read_latest_edition, send_message, smtp_pool,
+    smtp_upstream, stream_category_subscribers, unsubscribe_url
+)
+from models import Campaign, CampaignFailure, User, UserCategory
+from article_store import article_ids, delivered_article_ids, record_newsletters, url_hash
+from email_templates import CompiledNewsletter
+from mime_builder import NewsletterMessage
+from metrics import STAGE_SECONDS
+from http_client import close_http_session
+from resilience import usage
+from unsubscribe import not_unsubscribed
+from validators import CATEGORY_SET
+
+CAMPAIGN_BATCH_SIZE = int(os.getenv("CAMPAIGN_BATCH_SIZE", "500"))
+CAMPAIGN_CONCURRENCY = int(os.getenv("CAMPAIGN_CONCURRENCY", "16"))
+CAMPAIGN_SUBJECT = "Your Weekly AI Newsletter 📰"
+# A running campaign without a checkpoint for this long is taken to have lost its process
+CAMPAIGN_STALE_SECONDS = float(os.getenv("CAMPAIGN_STALE_SECONDS", "600"))
+
+
+class CampaignAlreadyRunning(Exception):
+    """Raised when another process is running the campaign."""
+
+
+def create_campaign(name: str, subject: str = CAMPAIGN_SUBJECT, incremental: bool = False,
+                    category: Optional[str] = None) -> int:
+    db = SessionLocal()
+    try:
+        campaign = Campaign(name=name, subject=subject, status="pending", incremental=incremental, category=category)
+        db.add(campaign)
+        db.commit()
+        return campaign.id
+    finally:
+        db.close()
+
+
+def get_campaign(campaign_id: int) -> Optional[Campaign]:
+    db = SessionLocal()
+    try:
+        campaign = db.get(Campaign, campaign_id)
+        if campaign is not None:
+            db.expunge(campaign)
+        return campaign
+    finally:
+        db.close()
+
+
+def claim_campaign(campaign_id: int, stale_seconds: float = CAMPAIGN_STALE_SECONDS) -> bool:
+    """Mark campaign_id running unless another process is running it; True if this caller got it.
+
+    A single conditional UPDATE, so of several processes claiming at once only
+    one succeeds. A run whose checkpoints stopped stale_seconds ago can be
+    claimed again, as with the scheduler's lease.
+    """
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(Campaign)
+            .where(
+                Campaign.id == campaign_id,
+                or_(Campaign.status != "running", Campaign.updated_at < now - timedelta(seconds=stale_seconds)),
+            )
+            .values(status="running", last_error=None, updated_at=now)
+        )
+        db.commit()
+        return result.rowcount == 1
+    finally:
+        db.close()
+
+
+class _Recipient(NamedTuple):
+    id: int
+    name: Optional[str]
+    email: str
+    unsubscribe_token: Optional[str]
+    categories: Tuple[str, ...]  # Sorted, so users with the same subscriptions share content
+
+
+def _recipients(db, users: List[Tuple]) -> List[_Recipient]:
+    """Attach each user's subscriptions from user_categories, in one query for all of them.
+
+    Users without subscription rows (not migrated yet) fall back to the
+    comma-separated users.categories column, as User.category_list does.
+    """
+    subscriptions = defaultdict(set)
+    if users:
+        rows = db.query(UserCategory.user_id, UserCategory.category).filter(
+            UserCategory.user_id.in_([user.id for user in users])
+        )
+        for user_id, category in rows:
+            subscriptions[user_id].add(category)
+    return [
+        _Recipient(user.id, user.name, user.email, user.unsubscribe_token,
+                   tuple(sorted(subscriptions.get(user.id) or set(user.categories.split(",")))))
+        for user in users
+    ]
+
+
+def _load_batch(after_user_id: int, batch_size: int, category: Optional[str] = None) -> List[_Recipient]:
+    """Next page of subscribers by primary key (keyset pagination, no OFFSET scans), minus pending unsubscribes.
+
+    With a category, only that category's subscribers, each getting just that category.
+    """
+    db = SessionLocal()
+    try:
+        if category is not None:
+            users = next(stream_category_subscribers(db, category, batch_size, after_user_id), [])
+            return [_Recipient(user.id, user.name, user.email, user.unsubscribe_token, (category,)) for user in users]
+        users = (
+            db.query(User.id, User.name, User.email, User.categories, User.unsubscribe_token)
+            .filter(User.id > after_user_id, not_unsubscribed())
+            .order_by(User.id)
+            .limit(batch_size)
+            .all()
+        )
+        return _recipients(db, users)
+    finally:
+        db.close()
+
+
+def _load_users(user_ids: List[int], category: Optional[str] = None) -> List[_Recipient]:
+    """_load_batch recipients for user_ids, minus users who have unsubscribed since."""
+    db = SessionLocal()
+    try:
+        users = (
+            db.query(User.id, User.name, User.email, User.categories, User.unsubscribe_token)
+            .filter(User.id.in_(user_ids), not_unsubscribed())
+            .order_by(User.id)
+            .all()
+        )
+        if category is not None:
+            return [_Recipient(user.id, user.name, user.email, user.unsubscribe_token, (category,)) for user in users]
+        return _recipients(db, users)
+    finally:
+        db.close()
+
+
+def _audience(category: Optional[str]) -> Optional[int]:
+    """Subscribers a category campaign will reach, or None for a campaign to everyone."""
+    if category is None:
+        return None
+    db = SessionLocal()
+    try:
+        return count_category_subscribers(db, [category]).get(category, 0)
+    finally:
+        db.close()
+
+
+def _failed_user_ids(campaign_id: int) -> List[int]:
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(CampaignFailure.user_id)
+            .filter(CampaignFailure.campaign_id == campaign_id)
+            .order_by(CampaignFailure.user_id)
+            .all()
+        )
+        return [user_id for user_id, in rows]
+    finally:
+        db.close()
+
+
+def _stored_article_ids(urls: List[str]) -> Dict[str, int]:
+    """{url: article id} for the urls already in the article store."""
+    db = SessionLocal()
+    try:
+        ids = article_ids(db, (url_hash(url) for url in urls))
+        return {url: ids[url_hash(url)] for url in urls if url_hash(url) in ids}
+    finally:
+        db.close()
+
+
+def _delivered(user_ids: List[int], candidate_ids: List[int]) -> Dict[int, set]:
+    db = SessionLocal()
+    try:
+        return delivered_article_ids(db, user_ids, candidate_ids)
+    finally:
+        db.close()
+
+
+def _checkpoint(campaign_id: int, subject: str, deliveries: List[Tuple[int, Dict]],
+                failed_user_ids: List[int], retried_user_ids: List[int] = (), **values):
+    """Record the batch's delivered newsletters and failed users and advance the checkpoint in one transaction.
+
+    retried_user_ids are earlier failures this batch retried; their records
+    are replaced by the batch's outcome.
+    """
+    db = SessionLocal()
+    try:
+        record_newsletters(db, subject, deliveries)
+        if retried_user_ids:
+            db.query(CampaignFailure).filter(
+                CampaignFailure.campaign_id == campaign_id, CampaignFailure.user_id.in_(retried_user_ids)
+            ).delete(synchronize_session=False)
+        db.add_all(CampaignFailure(campaign_id=campaign_id, user_id=user_id) for user_id in failed_user_ids)
+        db.query(Campaign).filter(Campaign.id == campaign_id).update(
+            {**values, "updated_at": datetime.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _update_campaign(campaign_id: int, **values):
+    db = SessionLocal()
+    try:
+        db.query(Campaign).filter(Campaign.id == campaign_id).update(
+            {**values, "updated_at": datetime.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+class _ContentCache:
+    """Articles and encoded newsletter messages, shared by every recipient with the same content."""
+
+    def __init__(self, edition: dict):
+        self._edition = edition
+        self._articles: Dict[Tuple[str, ...], Dict] = {}
+        self._messages: Dict[Tuple, NewsletterMessage] = {}
+        self._sections: Dict = {}
+        self.article_ids: Dict[str, int] = {}  # url -> stored article id
+
+    async def articles_for(self, categories: Tuple[str, ...]) -> Dict:
+        articles_by_category = self._articles.get(categories)
+        if articles_by_category is None:
+            articles_by_category = await get_newsletter_articles(list(categories), self._edition)
+            articles_by_category = self._articles.setdefault(categories, articles_by_category)
+            urls = [a["url"] for articles in articles_by_category.values() for a in articles
+                    if a.get("url") and a["url"] not in self.article_ids]
+            if urls:
+                self.article_ids.update(await asyncio.to_thread(_stored_article_ids, urls))
+        return articles_by_category
+
+    def message_for(self, articles_by_category: Dict) -> NewsletterMessage:
+        # Keyed by the articles themselves, so users with the same history share a message
+        key = tuple((category, tuple(a.get("url") for a in articles)) for category, articles in articles_by_category.items())
+        message = self._messages.get(key)
+        if message is None:
+            message = self._messages.setdefault(
+                key, NewsletterMessage(CompiledNewsletter(articles_by_category, self._sections), GMAIL_USER)
+            )
+        return message
+
+    def unseen(self, articles_by_category: Dict, delivered: set) -> Dict:
+        """articles_by_category without the articles in delivered, dropping categories left empty."""
+        unseen = {}
+        for category, articles in articles_by_category.items():
+            fresh = [a for a in articles if self.article_ids.get(a.get("url")) not in delivered]
+            if fresh:
+                unseen[category] = fresh
+        return unseen
+
+
+async def run_campaign(campaign_id: int, batch_size: int = CAMPAIGN_BATCH_SIZE,
+                       concurrency: int = CAMPAIGN_CONCURRENCY, claimed: bool = False) -> Campaign:
+    """Send campaign_id to every user after its checkpoint, resuming where a previous run stopped.
+
+    Delivery is at-least-once: users in a batch that was interrupted before its
+    checkpoint was written are sent again on resume, as are the users earlier
+    runs failed to send to. Each batch's deliveries are recorded with its
+    checkpoint, which is what incremental campaigns read back. A run that is
+    cancelled or raises leaves the campaign "failed", ready to be resumed.
+
+    Raises CampaignAlreadyRunning when another process is running the
+    campaign; pass claimed=True if the caller already claimed it with
+    claim_campaign.
+    """
+    if not claimed and not await asyncio.to_thread(claim_campaign, campaign_id):
+        if await asyncio.to_thread(get_campaign, campaign_id) is None:
+            raise ValueError(f"Campaign {campaign_id} not found")
+        raise CampaignAlreadyRunning(f"Campaign {campaign_id} is already running")
+    campaign = await asyncio.to_thread(get_campaign, campaign_id)
+    if campaign is None:
+        raise ValueError(f"Campaign {campaign_id} not found")
+
+    last_user_id = campaign.last_user_id
+    sent = campaign.sent
+    failed = campaign.failed
+    skipped = campaign.skipped
+    previous_elapsed = campaign.elapsed_seconds
+    started = time.monotonic()
+    audience = await asyncio.to_thread(_audience, campaign.category)
+    if audience is not None:
+        print(f"Campaign {campaign_id}: {audience} subscribers to {campaign.category}")
+
+    # One edition for the whole run so every recipient gets the same articles
+    edition = await asyncio.to_thread(read_latest_edition) or {}
+    content = _ContentCache(edition)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def deliver(user, delivered: Dict[int, set]) -> Tuple[str, Dict]:
+        """("sent", articles), ("failed", articles) or ("skipped", {}) when there is nothing new for user."""
+        async with semaphore:
+            articles_by_category = await content.articles_for(user.categories)
+            if campaign.incremental:
+                articles_by_category = content.unseen(articles_by_category, delivered.get(user.id, set()))
+                if not articles_by_category:
+                    return "skipped", {}
+            message = content.message_for(articles_by_category)
+            chunks = message.chunks(
+                user.email, campaign.subject, user.name, unsubscribe_url(user.id, user.unsubscribe_token)
+            )
+            status = "sent" if await send_message(user.email, chunks) else "failed"
+            return status, articles_by_category
+
+    async def send_batch(users: List[_Recipient], retried_user_ids: List[int] = (), **values):
+        """Deliver to users and checkpoint the outcome along with values."""
+        nonlocal sent, failed, skipped
+        # Wait out an open SMTP circuit instead of failing the whole batch fast
+        retry_after = smtp_upstream.breaker.retry_after()
+        if retry_after:
+            print(f"Campaign {campaign_id}: SMTP circuit open, pausing {retry_after:.0f}s")
+            await asyncio.sleep(retry_after)
+
+        delivered = {}
+        if campaign.incremental:
+            # What this batch has already received, in one query for all of its users
+            for categories in {user.categories for user in users}:
+                await content.articles_for(categories)
+            delivered = await asyncio.to_thread(
+                _delivered, [user.id for user in users], list(content.article_ids.values())
+            )
+
+        # Timed per batch rather than per recipient, off the per-message path
+        batch_started = time.perf_counter()
+        results = await asyncio.gather(*(deliver(user, delivered) for user in users))
+        STAGE_SECONDS.observe(time.perf_counter() - batch_started, stage="campaign_batch")
+        deliveries = [(user.id, articles) for user, (status, articles) in zip(users, results) if status == "sent"]
+        failed_user_ids = [user.id for user, (status, _) in zip(users, results) if status == "failed"]
+        sent += len(deliveries)
+        failed += len(failed_user_ids) - len(retried_user_ids)
+        skipped += sum(1 for status, _ in results if status == "skipped")
+
+        elapsed = previous_elapsed + (time.monotonic() - started)
+        await asyncio.to_thread(
+            _checkpoint, campaign_id, campaign.subject, deliveries, failed_user_ids, retried_user_ids,
+            sent=sent, failed=failed, skipped=skipped, elapsed_seconds=elapsed, **values
+        )
+        rate = sent / elapsed if elapsed else float(sent)
+        print(f"Campaign {campaign_id}: {sent} sent, {failed} failed, {skipped} skipped, "
+              f"checkpoint user {last_user_id}, {rate:.1f} msg/s")
+
+    try:
+        # Users earlier runs failed to send to, before continuing from the checkpoint
+        retry_ids = await asyncio.to_thread(_failed_user_ids, campaign_id)
+        for start in range(0, len(retry_ids), batch_size):
+            batch_ids = retry_ids[start:start + batch_size]
+            await send_batch(await asyncio.to_thread(_load_users, batch_ids, campaign.category), batch_ids)
+
+        while True:
+            users = await asyncio.to_thread(_load_batch, last_user_id, batch_size, campaign.category)
+            if not users:
+                break
+            last_user_id = users[-1].id
+            await send_batch(users, last_user_id=last_user_id)
+    except asyncio.CancelledError:
+        await asyncio.to_thread(_update_campaign, campaign_id, status="failed", last_error="Cancelled")
+        raise
+    except Exception as e:
+        await asyncio.to_thread(_update_campaign, campaign_id, status="failed", last_error=str(e))
+        raise
+
+    await asyncio.to_thread(
+        _update_campaign, campaign_id,
+        status="completed",
+        elapsed_seconds=previous_elapsed + (time.monotonic() - started),
+        finished_at=datetime.utcnow()
+    )
+    return await asyncio.to_thread(get_campaign, campaign_id)
+
+
+async def _run_cli(args):
+    campaign_id = args.resume or await asyncio.to_thread(
+        create_campaign, args.name, args.subject, args.incremental, args.category
+    )
+    try:
+        campaign = await run_campaign(campaign_id, args.batch_size, args.concurrency)
+    except CampaignAlreadyRunning as e:
+        print(e)
+        raise SystemExit(1)
+    finally:
+        await close_http_session()
+        await asyncio.to_thread(smtp_pool.close)
+        await asyncio.to_thread(usage.flush)
+    print(f"Campaign {campaign.id} {campaign.status}: {campaign.sent} sent, {campaign.failed} failed, "
+          f"{campaign.skipped} skipped, {campaign.messages_per_second:.1f} msg/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a newsletter to every subscriber")
+    parser.add_argument("--name", default=f"Campaign {datetime.utcnow():%Y-%m-%d %H:%M}")
+    parser.add_argument("--subject", default=CAMPAIGN_SUBJECT)
+    parser.add_argument("--incremental", action="store_true",
+                        help="Send each subscriber only the articles they have not received yet")
+    parser.add_argument("--category", choices=sorted(CATEGORY_SET),
+                        help="Send only to this category's subscribers, with only its articles")
+    parser.add_argument("--resume", type=int, help="ID of a campaign to continue from its checkpoint")
+    parser.add_argument("--batch-size", type=int, default=CAMPAIGN_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CAMPAIGN_CONCURRENCY)
+    asyncio.run(_run_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# backend/dedup.py
+"""Near-duplicate articles across categories, found with MinHash and LSH.
+
+NewsAPI often files the same story under several categories. Every article is
+reduced to a MinHash signature of its word shingles (title and description),
+computed for all articles at once with NumPy. Locality-sensitive hashing splits
+each signature into bands and only compares articles that share a band, so
+the cost grows with the number of likely duplicates rather than with every
+pair of articles. Articles whose signatures agree on at least DEDUP_THRESHOLD
+of their hashes (their estimated Jaccard similarity) are duplicates of the
+earliest one.
+
+Importing this module imports numpy, so main imports it where it is used and
+only when DEDUP_ENABLED.
+"""
+import os
+import re
+import zlib
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.7"))
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "128"))
+DEDUP_SHINGLE_WORDS = int(os.getenv("DEDUP_SHINGLE_WORDS", "3"))
+
+_PRIME = (1 << 31) - 1  # Hash values stay below 2^31, so a * x + b fits in 64 bits
+_MAX_BLOCK_SHINGLES = 16384  # Bounds the (permutations x shingles) matrix to 16 MB
+_WORD = re.compile(r"\w+")
+
+_rng = np.random.default_rng(1)  # Fixed, so signatures are comparable between runs
+_A = _rng.integers(1, _PRIME, size=DEDUP_NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, size=DEDUP_NUM_PERM, dtype=np.uint64)
+_SHINGLE_MULTIPLIERS = _rng.integers(1, 1 << 32, size=DEDUP_SHINGLE_WORDS, dtype=np.uint64)
+
+
+def article_text(article: dict) -> str:
+    return f"{article.get('title') or ''} {article.get('description') or ''}"
+
+
+def shingle_hashes(text: str, words: int = DEDUP_SHINGLE_WORDS) -> np.ndarray:
+    """Distinct hashes (below 2^31) of the runs of `words` consecutive words in text."""
+    tokens = np.array([zlib.crc32(word.encode("utf-8")) for word in _WORD.findall(text.lower())], dtype=np.uint64)
+    if len(tokens) == 0:
+        return tokens
+    words = min(words, len(tokens))
+    count = len(tokens) - words + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(words):
+        hashes += tokens[offset:offset + count] * _SHINGLE_MULTIPLIERS[offset]  # Wraps mod 2^64
+    return np.unique(hashes % np.uint64(_PRIME))
+
+
+def minhash_signatures(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(signatures, has_words): one row of DEDUP_NUM_PERM minimum hashes per text.
+
+    Rows for texts without any words are meaningless and flagged in has_words.
+    """
+    shingles = [shingle_hashes(text) for text in texts]
+    has_words = np.array([len(s) > 0 for s in shingles], dtype=bool)
+    signatures = np.full((len(texts), DEDUP_NUM_PERM), _PRIME, dtype=np.uint64)
+    rows = np.flatnonzero(has_words)
+    start = 0
+    while start < len(rows):
+        # As many texts as fit in one block (at least one)
+        end, size = start, 0
+        while end < len(rows) and (end == start or size + len(shingles[rows[end]]) <= _MAX_BLOCK_SHINGLES):
+            size += len(shingles[rows[end]])
+            end += 1
+        block = [shingles[row] for row in rows[start:end]]
+        values = np.concatenate(block)
+        offsets = np.cumsum([0] + [len(s) for s in block[:-1]])
+        hashed = (_A[:, None] * values[None, :] + _B[:, None]) % np.uint64(_PRIME)
+        signatures[rows[start:end]] = np.minimum.reduceat(hashed, offsets, axis=1).T
+        start = end
+    return signatures.astype(np.uint32), has_words
+
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """(bands, rows per band) dividing num_perm whose S-curve midpoint (1/bands)^(1/rows) is nearest threshold."""
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    return min(options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - threshold))
+
+
+def lsh_clusters(signatures: np.ndarray, has_words: np.ndarray,
+                 threshold: float = DEDUP_THRESHOLD) -> Tuple[List[int], int]:
+    """(duplicate_of, comparisons): for each row the earliest row it duplicates (itself if none).
+
+    Rows sharing a band bucket are compared with the first row of that bucket,
+    so a bucket of n rows costs n - 1 comparisons.
+    """
+    count, num_perm = signatures.shape
+    parent = list(range(count))
+
+    def find(row: int) -> int:
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return row
+
+    bands, rows = lsh_bands(num_perm, threshold)
+    candidates = np.flatnonzero(has_words)
+    multipliers = np.random.default_rng(2).integers(1, 1 << 63, size=rows, dtype=np.uint64)
+    compared = set()
+    comparisons = 0
+    for band in range(bands):
+        # One 64-bit key per row; colliding keys are only candidates, the comparison decides
+        keys = (signatures[candidates, band * rows:(band + 1) * rows].astype(np.uint64) * multipliers).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        for bucket_start, bucket_end in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+            members = candidates[order[bucket_start:bucket_end]]
+            first = members[0]  # Earliest row, thanks to the stable sort
+            for member in members[1:]:
+                pair = (first, member)
+                if pair in compared or find(first) == find(member):
+                    continue
+                compared.add(pair)
+                comparisons += 1
+                if np.count_nonzero(signatures[first] == signatures[member]) >= threshold * num_perm:
+                    low, high = sorted((find(first), find(member)))
+                    parent[high] = low
+    return [find(row) for row in range(count)], comparisons
+
+
+def find_duplicates(texts: Sequence[str], threshold: float = DEDUP_THRESHOLD) -> List[int]:
+    """For each text, the index of the earliest text it is a near-duplicate of (its own index if none)."""
+    if len(texts) < 2:
+        return list(range(len(texts)))
+    signatures, has_words = minhash_signatures(texts)
+    return lsh_clusters(signatures, has_words, threshold)[0]
+
+
+def collapse_duplicates(articles_by_category: Dict[str, List[dict]],
+                        threshold: float = DEDUP_THRESHOLD) -> Dict[str, List[dict]]:
+    """Drop articles that repeat one earlier in the (category, position) order."""
+    flat = [article for articles in articles_by_category.values() for article in articles]
+    duplicate_of = find_duplicates([article_text(article) for article in flat], threshold)
+    keep = iter([index == original for index, original in enumerate(duplicate_of)])
+    return {
+        category: [article for article in articles if next(keep)]
+        for category, articles in articles_by_category.items()
+    }
@@ -1,17 +1,15 @@
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 
-def generate_newsletter_html(user_name: Optional[str], articles_by_category: Dict, unsubscribe_url: str) -> str:
-    """Generate HTML newsletter content with unsubscribe link."""
-    greeting = f"Hello {user_name}," if user_name else "Hello,"
-    
-    html_content = f'''<!DOCTYPE html>
+from metrics import observe_latency
+
+_NEWSLETTER_HEAD = '''<!DOCTYPE html>
 <html>
 <head>
     <meta charset="utf-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Your Personalized Newsletter</title>
     <style>
-        body {{ 
+        body { 
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; 
             line-height: 1.6; 
             color: #333; 
@@ -19,155 +17,133 @@ def generate_newsletter_html(user_name: Optional[str], articles_by_category: Dic
             margin: 0 auto; 
             padding: 20px; 
             background-color: #f8fafc;
-        }}
-        .container {{
+        }
+        .container {
             background-color: white;
             border-radius: 12px;
             overflow: hidden;
             box-shadow: 0 4px 6px rgba(0, 0, 0, 0.07);
-        }}
-        .header {{ 
+        }
+        .header { 
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
             color: white; 
             padding: 40px 30px; 
             text-align: center; 
-        }}
-        .header h1 {{
+        }
+        .header h1 {
             margin: 0 0 10px 0;
             font-size: 28px;
             font-weight: 700;
-        }}
-        .header p {{
+        }
+        .header p {
             margin: 5px 0;
             font-size: 16px;
             opacity: 0.9;
-        }}
-        .content {{
+        }
+        .content {
             padding: 30px;
-        }}
-        .category {{ 
+        }
+        .category { 
             margin: 35px 0; 
-        }}
-        .category:first-child {{
+        }
+        .category:first-child {
             margin-top: 0;
-        }}
-        .category h2 {{ 
+        }
+        .category h2 { 
             color: #667eea; 
             border-bottom: 3px solid #667eea; 
             padding-bottom: 12px; 
             text-transform: capitalize; 
             font-size: 24px;
             margin: 0 0 20px 0;
-        }}
-        .article {{ 
+        }
+        .article { 
             background: #f8fafc; 
             padding: 25px; 
             margin: 20px 0; 
             border-radius: 10px; 
             border-left: 5px solid #667eea;
             transition: transform 0.2s ease;
-        }}
-        .article:hover {{
+        }
+        .article:hover {
             transform: translateY(-2px);
-        }}
-        .article h3 {{ 
+        }
+        .article h3 { 
             margin: 0 0 12px 0; 
             color: #1a202c; 
             font-size: 18px;
             line-height: 1.4;
-        }}
-        .article a {{ 
+        }
+        .article a { 
             color: #667eea; 
             text-decoration: none; 
             font-weight: 600; 
-        }}
-        .article a:hover {{ 
+        }
+        .article a:hover { 
             text-decoration: underline; 
             color: #5a67d8;
-        }}
-        .summary {{ 
+        }
+        .summary { 
             color: #4a5568; 
             margin: 12px 0 0 0; 
             font-size: 14px;
             line-height: 1.5;
-        }}
-        .footer {{ 
+        }
+        .footer { 
             text-align: center; 
             margin-top: 40px; 
             padding: 30px; 
             background: linear-gradient(135deg, #f7fafc 0%, #edf2f7 100%); 
             border-radius: 10px; 
-        }}
-        .footer h3 {{
+        }
+        .footer h3 {
             color: #2d3748;
             margin: 0 0 15px 0;
             font-size: 20px;
-        }}
-        .footer p {{
+        }
+        .footer p {
             margin: 10px 0;
             color: #4a5568;
-        }}
-        .unsubscribe {{
+        }
+        .unsubscribe {
             margin-top: 25px;
             padding-top: 20px;
             border-top: 1px solid #cbd5e0;
-        }}
-        .unsubscribe a {{
+        }
+        .unsubscribe a {
             color: #718096;
             text-decoration: none;
             font-size: 12px;
-        }}
-        .unsubscribe a:hover {{
+        }
+        .unsubscribe a:hover {
             text-decoration: underline;
             color: #4a5568;
-        }}
-        .powered-by {{
+        }
+        .powered-by {
             font-size: 11px;
             color: #a0aec0;
             margin-top: 15px;
-        }}
-        @media (max-width: 600px) {{
-            body {{ padding: 10px; }}
-            .header {{ padding: 25px 20px; }}
-            .content {{ padding: 20px; }}
-            .article {{ padding: 20px; }}
-        }}
+        }
+        @media (max-width: 600px) {
+            body { padding: 10px; }
+            .header { padding: 25px 20px; }
+            .content { padding: 20px; }
+            .article { padding: 20px; }
+        }
     </style>
 </head>
 <body>
     <div class="container">
         <div class="header">
             <h1>🗞️ Your AI-Powered Newsletter</h1>
-            <p>{greeting}</p>
-            <p>Here's your personalized news digest from the past week!</p>
+'''
+
+_NEWSLETTER_INTRO = '''            <p>Here's your personalized news digest from the past week!</p>
         </div>
         
         <div class="content">'''
 
-    # Add articles by category
-    for category, articles in articles_by_category.items():
-        if not articles:
-            continue
-            
-        html_content += f'''
-            <div class="category">
-                <h2>{category.title()}</h2>'''
-        
-        for article in articles:
-            title = article.get("title", "No title")
-            url = article.get("url", "#")
-            description = article.get("description", "")
-            
-            html_content += f'''
-                <div class="article">
-                    <h3><a href="{url}" target="_blank">{title}</a></h3>
-                    <div class="summary">{description}</div>
-                </div>'''
-        
-        html_content += '''
-            </div>'''
-
-    html_content += f'''
+_NEWSLETTER_FOOTER = '''
         </div>
         
         <div class="footer">
@@ -176,8 +152,9 @@ def generate_newsletter_html(user_name: Optional[str], articles_by_category: Dic
             <p>Our AI curated the latest news from your selected categories and created personalized summaries just for you.</p>
             
             <div class="unsubscribe">
-                <p><a href="{unsubscribe_url}" target="_blank">Click here to unsubscribe and remove your data</a></p>
-            </div>
+'''
+
+_NEWSLETTER_END = '''            </div>
             
             <div class="powered-by">
                 <p>This newsletter was generated using AI and the latest news APIs.</p>
@@ -187,11 +164,116 @@ def generate_newsletter_html(user_name: Optional[str], articles_by_category: Dic
 </body>
 </html>'''
 
-    return html_content
+# Static parts of the newsletter, encoded once at import
+_NEWSLETTER_HEAD_BYTES = _NEWSLETTER_HEAD.encode("utf-8")
+_NEWSLETTER_INTRO_BYTES = _NEWSLETTER_INTRO.encode("utf-8")
+_NEWSLETTER_FOOTER_BYTES = _NEWSLETTER_FOOTER.encode("utf-8")
+_NEWSLETTER_END_BYTES = _NEWSLETTER_END.encode("utf-8")
+
+
+def _greeting_line(user_name: Optional[str]) -> str:
+    greeting = f"Hello {user_name}," if user_name else "Hello,"
+    return f"            <p>{greeting}</p>\n"
+
+
+def _unsubscribe_line(unsubscribe_url: str) -> str:
+    return f'''                <p><a href="{unsubscribe_url}" target="_blank">Click here to unsubscribe and remove your data</a></p>\n'''
+
+
+def render_category_section(category: str, articles: List[Dict]) -> str:
+    """Render the HTML block for one category and its articles."""
+    parts = [f'''
+            <div class="category">
+                <h2>{category.title()}</h2>''']
+    
+    for article in articles:
+        title = article.get("title", "No title")
+        url = article.get("url", "#")
+        # Prefer the AI summary when the article carries one
+        description = article.get("summary") or article.get("description", "")
+        
+        parts.append(f'''
+                <div class="article">
+                    <h3><a href="{url}" target="_blank">{title}</a></h3>
+                    <div class="summary">{description}</div>
+                </div>''')
+    
+    parts.append('''
+            </div>''')
+    return "".join(parts)
+
+
+def generate_newsletter_html(user_name: Optional[str], articles_by_category: Dict, unsubscribe_url: str) -> str:
+    """Generate HTML newsletter content with unsubscribe link."""
+    sections = "".join(
+        render_category_section(category, articles)
+        for category, articles in articles_by_category.items()
+        if articles
+    )
+    return "".join((
+        _NEWSLETTER_HEAD,
+        _greeting_line(user_name),
+        _NEWSLETTER_INTRO,
+        sections,
+        _NEWSLETTER_FOOTER,
+        _unsubscribe_line(unsubscribe_url),
+        _NEWSLETTER_END,
+    ))
+
+
+class CompiledNewsletter:
+    """Newsletter rendered once for a content snapshot and reused for every recipient.
+
+    The document shell and category sections are rendered and UTF-8 encoded when
+    the object is built; per recipient only the greeting and unsubscribe lines are
+    rendered and joined with the cached fragments. Both per-recipient fragments
+    are whole lines, so the shared fragments can also be transfer-encoded once.
+    Pass the same `section_cache` dict to several compilations to share category
+    sections between newsletters built from the same articles.
+    """
+
+    @observe_latency("render_newsletter")
+    def __init__(self, articles_by_category: Dict, section_cache: Optional[Dict] = None):
+        sections = []
+        for category, articles in articles_by_category.items():
+            if not articles:
+                continue
+            key = (category, tuple((a.get("title"), a.get("url"), a.get("summary"), a.get("description")) for a in articles))
+            section = section_cache.get(key) if section_cache is not None else None
+            if section is None:
+                section = render_category_section(category, articles).encode("utf-8")
+                if section_cache is not None:
+                    section_cache[key] = section
+            sections.append(section)
+        
+        self.head = _NEWSLETTER_HEAD_BYTES
+        self.body = b"".join([_NEWSLETTER_INTRO_BYTES, *sections, _NEWSLETTER_FOOTER_BYTES])
+        self.tail = _NEWSLETTER_END_BYTES
+
+    def fragments(self, user_name: Optional[str], unsubscribe_url: str) -> Tuple[bytes, ...]:
+        """The newsletter for one recipient as a sequence of byte fragments."""
+        return (
+            self.head,
+            _greeting_line(user_name).encode("utf-8"),
+            self.body,
+            _unsubscribe_line(unsubscribe_url).encode("utf-8"),
+            self.tail,
+        )
+
+    def render_bytes(self, user_name: Optional[str], unsubscribe_url: str) -> bytes:
+        return b"".join(self.fragments(user_name, unsubscribe_url))
+
+    def render(self, user_name: Optional[str], unsubscribe_url: str) -> str:
+        return self.render_bytes(user_name, unsubscribe_url).decode("utf-8")
+
 
+def generate_unsubscribe_success_html(user_email: Optional[str] = None) -> str:
+    """Generate HTML for successful unsubscribe confirmation.
 
-def generate_unsubscribe_success_html(user_email: str) -> str:
-    """Generate HTML for successful unsubscribe confirmation."""
+    Signed unsubscribe links are handled without reading the user, so the email may be unknown.
+    """
+    email_line = f'''
+        <div class="email">{user_email}</div>''' if user_email else ""
     return f'''<!DOCTYPE html>
 <html>
 <head>
@@ -260,9 +342,8 @@ def generate_unsubscribe_success_html(user_email: str) -> str:
     <div class="container">
         <div class="success-icon">✓</div>
         <h1>Successfully Unsubscribed</h1>
-        <p>Your email address has been successfully removed from our newsletter service.</p>
-        <div class="email">{user_email}</div>
-        <p>All your data has been permanently deleted from our database.</p>
+        <p>Your email address has been successfully removed from our newsletter service.</p>{email_line}
+        <p>You will not receive any more emails, and all your data is being permanently deleted from our database.</p>
         <div class="note">
             <p>Thank you for trying our AI-Powered Newsletter Service. If you change your mind, you can always register again on our homepage.</p>
         </div>
@@ -0,0 +1,120 @@
+# backend/frontend.py
+"""Serves the built React app (frontend/dist) from the API process.
+
+`npm run build` writes the Vite output plus .br and .gz copies of every
+compressible file (frontend/scripts/compress.js), so responses are never
+compressed per request: the best variant the client accepts is sent as a file.
+Vite fingerprints everything under assets/, so those files are cached as
+immutable for a year; index.html and other unhashed files are revalidated with
+an ETag. index.html is held in memory, and paths that are not files fall back
+to it for client-side routing.
+"""
+import mimetypes
+import os
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from http_cache import etag_matches, make_etag
+
+FRONTEND_DIST_DIR = os.getenv(
+    "FRONTEND_DIST_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend", "dist"),
+)
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+HASHED_ASSETS_PREFIX = "assets/"
+
+# Preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class _StaticFile:
+    def __init__(self, path: str, relative_path: str):
+        self.path = path
+        self.stat = os.stat(path)
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.cache_control = (
+            IMMUTABLE_CACHE_CONTROL if relative_path.startswith(HASHED_ASSETS_PREFIX) else REVALIDATE_CACHE_CONTROL
+        )
+        with open(path, "rb") as f:
+            self.etag = make_etag(f.read())
+        self.variants: Dict[str, Tuple[str, os.stat_result]] = {
+            encoding: (path + suffix, os.stat(path + suffix))
+            for encoding, suffix in ENCODINGS
+            if os.path.isfile(path + suffix)
+        }
+        self.body: Optional[Dict[Optional[str], bytes]] = None  # Set for files served from memory
+
+    def load(self):
+        """Keep this file and its variants in memory."""
+        self.body = {}
+        for encoding, path in [(None, self.path), *((e, v[0]) for e, v in self.variants.items())]:
+            with open(path, "rb") as f:
+                self.body[encoding] = f.read()
+
+
+def _accepted_encodings(accept_encoding: str) -> set:
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class FrontendFiles:
+    """The files of a Vite build, indexed once at startup."""
+
+    def __init__(self, dist_dir: str):
+        self.dist_dir = dist_dir
+        self.files: Dict[str, _StaticFile] = {}
+        variant_suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        for root, _, names in os.walk(dist_dir):
+            for name in names:
+                if name.endswith(variant_suffixes):
+                    continue
+                path = os.path.join(root, name)
+                relative_path = os.path.relpath(path, dist_dir).replace(os.sep, "/")
+                self.files[relative_path] = _StaticFile(path, relative_path)
+        self.index = self.files["index.html"]
+        self.index.load()
+
+    def response(self, request: Request, path: str) -> Response:
+        entry = self.files.get(path)
+        if entry is None:
+            # Missing files are 404s; anything else is a client-side route
+            if path.startswith(HASHED_ASSETS_PREFIX) or "." in path.rsplit("/", 1)[-1]:
+                return PlainTextResponse("Not Found", status_code=404)
+            entry = self.index
+
+        headers = {"Cache-Control": entry.cache_control, "ETag": entry.etag, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+
+        accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next((e for e, _ in ENCODINGS if e in entry.variants and e in accepted), None)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+
+        if entry.body is not None:
+            return Response(content=entry.body[encoding], media_type=entry.media_type, headers=headers)
+        # FileResponse streams from disk, or hands the path to the server when it supports
+        # zero-copy sends (the ASGI pathsend extension)
+        file_path, stat = entry.variants[encoding] if encoding else (entry.path, entry.stat)
+        return FileResponse(file_path, stat_result=stat, media_type=entry.media_type, headers=headers)
+
+
+def load_frontend(dist_dir: str = FRONTEND_DIST_DIR) -> Optional[FrontendFiles]:
+    """The built frontend, or None when there is no build to serve."""
+    if not dist_dir or not os.path.isfile(os.path.join(dist_dir, "index.html")):
+        return None
+    return FrontendFiles(dist_dir)
@@ -0,0 +1,29 @@
+# backend/gunicorn.conf.py
+"""Multi-process API server: gunicorn -c gunicorn.conf.py main:app
+
+Runs one uvicorn worker per core by default (WEB_CONCURRENCY to override).
+Set CACHE_BACKEND=sqlite (one host) or redis (several hosts) so workers share
+the headline cache and upstream rate limits instead of each keeping their own.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+keepalive = int(os.getenv("HTTP_KEEPALIVE_SECONDS", "30"))
+timeout = 60
+graceful_timeout = 30
+max_requests = 10000  # Recycle workers now and then; jitter keeps them from restarting together
+max_requests_jitter = 1000
+
+
+def on_starting(server):
+    """Create the schema and migrate once in the master instead of racing in every worker."""
+    from database import engine
+    from migrations import init_db
+
+    init_db()
+    engine.dispose()
+    if os.getenv("CACHE_BACKEND", "memory") == "memory" and workers > 1:
+        print("CACHE_BACKEND=memory: each worker keeps its own headline cache and rate limits")
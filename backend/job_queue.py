@@ -0,0 +1,184 @@
+# backend/job_queue.py
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index, func
+from sqlalchemy.orm import Session
+
+from database import Base
+
+# Retry policy
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "30"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "3600"))
+# Running jobs whose lock is older than this are assumed to belong to a dead worker
+JOB_LOCK_TIMEOUT_SECONDS = float(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", "600"))
+
+WELCOME_NEWSLETTER = "welcome_newsletter"
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class Job(Base):
+    """Durable background job processed by worker.py"""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON object
+    status = Column(String(20), nullable=False, default=QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=JOB_MAX_ATTEMPTS)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = Column(String(100), nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (Index("ix_jobs_status_run_at", "status", "run_at"),)
+
+    @property
+    def data(self) -> dict:
+        return json.loads(self.payload)
+
+    def __repr__(self):
+        return f"<Job(id={self.id}, kind='{self.kind}', status='{self.status}', attempts={self.attempts})>"
+
+
+def enqueue_job(db: Session, kind: str, payload: dict, delay_seconds: float = 0) -> Job:
+    """Add a job to the queue. The caller owns the transaction and must commit."""
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload),
+        status=QUEUED,
+        run_at=datetime.utcnow() + timedelta(seconds=delay_seconds),
+    )
+    db.add(job)
+    return job
+
+
+def claim_job(db: Session, worker_id: str) -> Optional[Job]:
+    """Atomically claim the next due job for worker_id, or return None if the queue is idle.
+
+    The claim is a conditional UPDATE on status, so any number of worker
+    processes can poll the same table without taking the same job twice.
+    """
+    for _ in range(5):
+        now = datetime.utcnow()
+        candidate = (
+            db.query(Job.id)
+            .filter(Job.status == QUEUED, Job.run_at <= now)
+            .order_by(Job.run_at, Job.id)
+            .first()
+        )
+        if candidate is None:
+            return None
+
+        claimed = (
+            db.query(Job)
+            .filter(Job.id == candidate.id, Job.status == QUEUED)
+            .update(
+                {
+                    Job.status: RUNNING,
+                    Job.locked_by: worker_id,
+                    Job.locked_at: now,
+                    Job.attempts: Job.attempts + 1,
+                    Job.updated_at: now,
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if claimed:
+            return db.get(Job, candidate.id)
+    return None
+
+
+def complete_job(db: Session, job: Job):
+    job.status = SUCCEEDED
+    job.locked_by = None
+    job.locked_at = None
+    job.last_error = None
+    db.commit()
+
+
+def retry_delay_seconds(attempts: int) -> float:
+    """Exponential backoff with jitter for the given number of attempts so far."""
+    delay = min(JOB_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), JOB_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def fail_job(db: Session, job: Job, error: str):
+    """Record a failed attempt and reschedule the job, or mark it failed once attempts run out."""
+    job.last_error = error
+    job.locked_by = None
+    job.locked_at = None
+    if job.attempts >= job.max_attempts:
+        job.status = FAILED
+    else:
+        job.status = QUEUED
+        job.run_at = datetime.utcnow() + timedelta(seconds=retry_delay_seconds(job.attempts))
+    db.commit()
+
+
+def requeue_stale_jobs(db: Session, lock_timeout_seconds: float = JOB_LOCK_TIMEOUT_SECONDS) -> Tuple[int, int]:
+    """Put jobs whose worker died mid-run back on the queue, or mark them failed once attempts run out.
+
+    Returns (requeued, failed). A job that keeps killing its worker is
+    therefore retried max_attempts times, like a job that raises.
+    """
+    now = datetime.utcnow()
+    stale = (Job.status == RUNNING, Job.locked_at < now - timedelta(seconds=lock_timeout_seconds))
+    failed = (
+        db.query(Job)
+        .filter(*stale, Job.attempts >= Job.max_attempts)
+        .update(
+            {
+                Job.status: FAILED,
+                Job.locked_by: None,
+                Job.locked_at: None,
+                Job.last_error: "Worker stopped before finishing the job",
+                Job.updated_at: now,
+            },
+            synchronize_session=False,
+        )
+    )
+    requeued = (
+        db.query(Job)
+        .filter(*stale, Job.attempts < Job.max_attempts)
+        .update(
+            {Job.status: QUEUED, Job.locked_by: None, Job.locked_at: None, Job.run_at: now, Job.updated_at: now},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return requeued, failed
+
+
+def get_job(db: Session, job_id: int) -> Optional[Job]:
+    return db.query(Job).filter(Job.id == job_id).first()
+
+
+def queue_stats(db: Session) -> dict:
+    """Job counts by status plus how long the oldest due job has been waiting."""
+    counts = dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+    now = datetime.utcnow()
+    oldest_due = (
+        db.query(func.min(Job.run_at))
+        .filter(Job.status == QUEUED, Job.run_at <= now)
+        .scalar()
+    )
+    return {
+        "queued": counts.get(QUEUED, 0),
+        "running": counts.get(RUNNING, 0),
+        "succeeded": counts.get(SUCCEEDED, 0),
+        "failed": counts.get(FAILED, 0),
+        "oldest_due_seconds": (now - oldest_due).total_seconds() if oldest_due else 0.0,
+    }
@@ -1,46 +1,58 @@
 # backend/main.py
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Header, UploadFile, File
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import io
+import json
 import os
+import time
 from datetime import datetime, timedelta
-import requests
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import requests
 from dotenv import load_dotenv
 import re
 import hashlib
 import secrets
-from email_templates import generate_newsletter_html, generate_unsubscribe_success_html, generate_unsubscribe_error_html
-
-load_dotenv()
+from email_templates import CompiledNewsletter, generate_unsubscribe_success_html, generate_unsubscribe_error_html
+from mime_builder import NewsletterMessage
+from news_cache import HeadlineCache
+from shared_cache import MemoryBackend, create_backend, run_backend
+from http_cache import cached_json_response
+from frontend import load_frontend
+from http_client import get_http_session, close_http_session
+from article_extractor import ARTICLE_EXTRACTION_ENABLED, extract_articles
+from smtp_pool import RECOVERABLE_SMTP_ERRORS, SMTPPool
+from resilience import Upstream, UpstreamUnavailable, flush_usage_periodically
+from summary_cache import summary_key, lookup_summaries, store_summaries, cache_stats as summary_cache_stats
+from database import SessionLocal, engine, async_engine, get_db, get_async_db
+from models import Edition, User, UserCategory
+from unsubscribe import add_tombstone, is_signed_token, not_unsubscribed, sign_token, signed_tokens_enabled, verify_token
+from validators import AVAILABLE_CATEGORIES, CATEGORY_SET, invalid_categories, validate_email
+from article_store import record_newsletter, upsert_articles
+from job_queue import WELCOME_NEWSLETTER, enqueue_job, get_job, queue_stats
+from metrics import (
+    REGISTRY, CACHE_HIT_RATIO, CACHE_LOOKUPS, HTTP_REQUEST_SECONDS, QUEUE_JOBS, QUEUE_LAG, SMTP_POOL,
+    instrument_engine, observe_latency, record_upstream_error, render_metrics
+)
 
-# Database setup
-SQLALCHEMY_DATABASE_URL = "sqlite:///./newsletter.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # Optional; responses are gzipped instead
+    BrotliMiddleware = None
 
-# Database Models
-class User(Base):
-    __tablename__ = "users"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=True)
-    email = Column(String, unique=True, index=True, nullable=False)
-    categories = Column(Text, nullable=False)  # JSON string
-    newsletter_sent = Column(Boolean, default=False)
-    unsubscribe_token = Column(String, unique=True, nullable=False)  # New field for unsubscribe
-    created_at = Column(DateTime, default=datetime.utcnow)
+load_dotenv()
 
-Base.metadata.create_all(bind=engine)
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
 
 # Pydantic models
 class UserRegistration(BaseModel):
@@ -55,161 +67,578 @@ class UserResponse(BaseModel):
     categories: List[str]
     newsletter_sent: bool
     created_at: datetime
+    job_id: Optional[int] = None
 
-# FastAPI app
-app = FastAPI(title="AI Newsletter Service")
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, specify your frontend domain
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+class CampaignRequest(BaseModel):
+    name: Optional[str] = None
+    subject: Optional[str] = None
+    resume_id: Optional[int] = None
+    incremental: bool = False  # Only send each subscriber articles they have not received; ignored on resume
+    batch_size: Optional[int] = None
+    concurrency: Optional[int] = None
 
-# Dependency to get DB session
-def get_db():
-    db = SessionLocal()
+class CampaignResponse(BaseModel):
+    id: int
+    name: str
+    subject: str
+    status: str
+    incremental: bool
+    last_user_id: int
+    sent: int
+    failed: int
+    skipped: int
+    messages_per_second: float
+    created_at: datetime
+    finished_at: Optional[datetime]
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str
+    attempts: int
+    last_error: Optional[str]
+    run_at: datetime
+    created_at: datetime
+    updated_at: datetime
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Upstream clients are created here rather than at import, so importing main stays cheap
+    get_http_session()
+    usage_flusher = asyncio.create_task(flush_usage_periodically(API_USAGE_FLUSH_SECONDS))
+    yield
+    usage_flusher.cancel()
     try:
-        yield db
-    finally:
-        db.close()
+        await usage_flusher
+    except asyncio.CancelledError:
+        pass
+    # Release pooled upstream connections on shutdown
+    await close_http_session()
+    await asyncio.to_thread(smtp_pool.close)
+    await async_engine.dispose()
+
+# FastAPI app
+app = FastAPI(title="AI Newsletter Service", lifespan=lifespan)
+
+# Built frontend served by this app (see frontend.py), or None when there is no build
+frontend = load_frontend()
+
+# CORS middleware, for a frontend served from another origin. Comma-separated
+# origins; empty when the frontend is served from here, which needs no CORS.
+CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "" if frontend else "*").split(",") if origin.strip()]
+if CORS_ORIGINS:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+# Compress larger responses such as the unsubscribe pages
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1000"))
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE)
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code
+    )
+    return response
 
 # Configuration
 NEWS_API_KEY = os.getenv("NEWS_API_KEY", "your_news_api_key")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "your_gemini_api_key")
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY", "your_sendgrid_api_key")
 BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")  # For unsubscribe links
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")  # Admin endpoints are disabled when unset
 
 GMAIL_USER = os.getenv("GMAIL_USER")
 GMAIL_PASSWORD = os.getenv("GMAIL_PASSWORD")
 
-# Available categories
-AVAILABLE_CATEGORIES = [
-    "technology", "business", "sports", "health", 
-    "entertainment", "science", "politics"
-]
+# Outgoing mail: pooled, persistent SMTP sessions (defaults to Gmail over SSL)
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_USE_SSL = os.getenv("SMTP_USE_SSL", "true").lower() == "true"
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "false").lower() == "true"
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+smtp_pool = SMTPPool(
+    SMTP_HOST,
+    SMTP_PORT,
+    username=GMAIL_USER,
+    password=GMAIL_PASSWORD,
+    use_ssl=SMTP_USE_SSL,
+    starttls=SMTP_STARTTLS,
+    size=SMTP_POOL_SIZE,
+    max_messages_per_connection=SMTP_MAX_MESSAGES_PER_CONNECTION
+)
+
+# Cache and rate-limit state; CACHE_BACKEND=sqlite or redis shares it between worker processes
+cache_backend = create_backend()
+
+# /users/{user_id} responses, invalidated on unsubscribe; the TTL bounds staleness from
+# changes made by other processes when the cache backend is not shared
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+user_cache = cache_backend if cache_backend.shared else MemoryBackend(USER_CACHE_MAX_ENTRIES)
+user_cache_stats = {"hits": 0, "misses": 0}
+
+# HTTP caching: categories only change with a deploy; user details must be revalidated
+CATEGORIES_CACHE_CONTROL = "public, max-age=3600"
+USER_CACHE_CONTROL = "private, no-cache"
+
+# NewsAPI fetch limits: per-request timeout, categories in flight per call, overall deadline per call
+NEWS_API_TIMEOUT_SECONDS = float(os.getenv("NEWS_API_TIMEOUT_SECONDS", "10"))
+NEWS_FETCH_CONCURRENCY = int(os.getenv("NEWS_FETCH_CONCURRENCY", "4"))
+NEWS_FETCH_DEADLINE_SECONDS = float(os.getenv("NEWS_FETCH_DEADLINE_SECONDS", "8"))
+
+# Headline cache shared by every request (and, with a shared backend, every worker)
+NEWS_API_URL = os.getenv("NEWS_API_URL", "https://newsapi.org/v2/top-headlines")
+NEWS_CACHE_TTL_SECONDS = float(os.getenv("NEWS_CACHE_TTL_SECONDS", "900"))
+NEWS_CACHE_MAX_ENTRIES = int(os.getenv("NEWS_CACHE_MAX_ENTRIES", "64"))
+headline_cache = HeadlineCache(
+    ttl_seconds=NEWS_CACHE_TTL_SECONDS,
+    max_entries=NEWS_CACHE_MAX_ENTRIES,
+    backend=cache_backend if cache_backend.shared else None,  # Otherwise its own LRU of max_entries
+    fetch_lock_seconds=NEWS_API_TIMEOUT_SECONDS
+)
+
+# Gemini summaries: bump the prompt version whenever the prompt changes to invalidate cached summaries
+GEMINI_API_URL = os.getenv("GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent")
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "30"))
+SUMMARY_PROMPT_VERSION = "v1"
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "5"))
+
+# Collapse near-duplicate articles (the same story in several categories) with dedup.py
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+
+# Editions older than this are ignored and news is fetched live instead
+EDITION_MAX_AGE_SECONDS = float(os.getenv("EDITION_MAX_AGE_SECONDS", "7200"))
+# Readiness: report not ready when due jobs have waited longer than this
+READINESS_MAX_QUEUE_LAG_SECONDS = float(os.getenv("READINESS_MAX_QUEUE_LAG_SECONDS", "300"))
+
+# Upstream protection. Rate limits are per process unless CACHE_BACKEND shares them.
+# Timeouts adapt to observed latency between the floor and the configured timeout above.
+NEWS_API_RATE_PER_MINUTE = float(os.getenv("NEWS_API_RATE_PER_MINUTE", "30"))
+GEMINI_RATE_PER_MINUTE = float(os.getenv("GEMINI_RATE_PER_MINUTE", "60"))
+SMTP_RATE_PER_MINUTE = float(os.getenv("SMTP_RATE_PER_MINUTE", "600"))
+UPSTREAM_MAX_WAIT_SECONDS = float(os.getenv("UPSTREAM_MAX_WAIT_SECONDS", "2"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+API_USAGE_FLUSH_SECONDS = float(os.getenv("API_USAGE_FLUSH_SECONDS", "60"))
+newsapi_upstream = Upstream(
+    "newsapi", "top-headlines", NEWS_API_RATE_PER_MINUTE, burst=len(AVAILABLE_CATEGORIES),
+    min_timeout_seconds=1, max_timeout_seconds=NEWS_API_TIMEOUT_SECONDS,
+    max_wait_seconds=UPSTREAM_MAX_WAIT_SECONDS,
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS,
+    backend=cache_backend
+)
+gemini_upstream = Upstream(
+    "gemini", "generateContent", GEMINI_RATE_PER_MINUTE, burst=SUMMARY_BATCH_SIZE,
+    min_timeout_seconds=5, max_timeout_seconds=GEMINI_TIMEOUT_SECONDS,
+    max_wait_seconds=UPSTREAM_MAX_WAIT_SECONDS,
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS,
+    backend=cache_backend
+)
+smtp_upstream = Upstream(
+    "smtp", "sendmail", SMTP_RATE_PER_MINUTE, burst=SMTP_POOL_SIZE,
+    min_timeout_seconds=smtp_pool.timeout, max_timeout_seconds=smtp_pool.timeout,
+    max_wait_seconds=UPSTREAM_MAX_WAIT_SECONDS * 5,
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS,
+    ignored_errors=RECOVERABLE_SMTP_ERRORS,  # A refused recipient says nothing about the server
+    backend=cache_backend
+)
+
+def require_admin(x_admin_key: Optional[str] = Header(None)):
+    """Reject requests without the admin API key."""
+    if not ADMIN_API_KEY or not secrets.compare_digest(x_admin_key or "", ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+def count_category_subscribers(db: Session, categories: Optional[List[str]] = None) -> dict:
+    """Number of subscribers per category (only the given ones if set), without pending unsubscribes.
+
+    Answered from the (category, user_id) index, so the cost follows the
+    subscription rows counted rather than the size of users.
+    """
+    query = db.query(UserCategory.category, func.count(UserCategory.user_id)).filter(
+        not_unsubscribed(UserCategory.user_id)
+    )
+    if categories is not None:
+        query = query.filter(UserCategory.category.in_(categories))
+    return {category: count for category, count in query.group_by(UserCategory.category).all()}
+
+def stream_category_subscribers(db: Session, category: str, batch_size: int = 1000, after_user_id: int = 0):
+    """Yield pages of a category's subscribers after after_user_id, in user id order.
+
+    Each page is one keyset range scan of the (category, user_id) index; users
+    with a pending unsubscribe are left out. Rows have id, name, email,
+    categories and unsubscribe_token.
+    """
+    last_user_id = after_user_id
+    while True:
+        users = (
+            db.query(User.id, User.name, User.email, User.categories, User.unsubscribe_token)
+            .join(UserCategory, UserCategory.user_id == User.id)
+            .filter(UserCategory.category == category, UserCategory.user_id > last_user_id,
+                    not_unsubscribed(UserCategory.user_id))
+            .order_by(UserCategory.user_id)
+            .limit(batch_size)
+            .all()
+        )
+        if not users:
+            return
+        yield users
+        last_user_id = users[-1].id
 
-def generate_unsubscribe_token() -> str:
-    """Generate a secure unsubscribe token."""
+async def invalidate_user_cache(user_id: int):
+    try:
+        await run_backend(user_cache.delete, f"user:{user_id}")
+    except Exception as e:
+        print(f"Error invalidating cached user {user_id}: {e}")
+
+def generate_unsubscribe_token() -> Optional[str]:
+    """Generate a secure unsubscribe token to store on a new user; None when links are signed instead."""
+    if signed_tokens_enabled():
+        return None
     return secrets.token_urlsafe(32)
 
-def validate_email(email: str) -> bool:
-    """Simple email validation"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+def unsubscribe_url(user_id: int, stored_token: Optional[str]) -> str:
+    """Unsubscribe link for a user: a freshly signed token, or the stored one without signing keys."""
+    token = sign_token(user_id) if signed_tokens_enabled() else stored_token
+    return f"{BASE_URL}/unsubscribe/{token}"
 
-async def fetch_news_articles(categories: List[str], days_back: int = 7) -> dict:
-    """Fetch news articles from NewsAPI"""
-    articles_by_category = {}
+def store_fetched_articles(category: str, articles: List[dict]):
+    """Upsert fetched articles into the deduplicated article store."""
+    db = SessionLocal()
+    try:
+        upsert_articles(db, category, articles)
+        db.commit()
+    finally:
+        db.close()
+
+async def fetch_category_headlines(category: str, from_date: datetime, to_date: datetime) -> List[dict]:
+    """Fetch top headlines for a single category from NewsAPI."""
+    params = {
+        "apiKey": NEWS_API_KEY,
+        "category": category,
+        "language": "en",
+        "country": "us",
+        "from": from_date.strftime("%Y-%m-%d"),
+        "to": to_date.strftime("%Y-%m-%d"),
+        "pageSize": 5
+    }
+    session = get_http_session()
+    import aiohttp  # Loaded with the session; kept off the import path of main
+    # Fails fast while NewsAPI is unhealthy; the headline cache then serves its stale copy
+    async with newsapi_upstream.guard() as call:
+        timeout = aiohttp.ClientTimeout(total=call.timeout)
+        try:
+            async with session.get(NEWS_API_URL, params=params, timeout=timeout) as response:
+                if response.status != 200:
+                    record_upstream_error("newsapi", kind="status")
+                    raise RuntimeError(f"NewsAPI returned {response.status}")
+                data = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            record_upstream_error("newsapi", e)
+            raise
+    articles = data.get("articles", [])[:3]  # Top 3 articles per category
     
+    # Keep the article store current; a storage failure must not fail the fetch
+    try:
+        await asyncio.to_thread(store_fetched_articles, category, articles)
+    except Exception as e:
+        print(f"Error storing articles for {category}: {e}")
+    return articles
+
+@observe_latency("fetch_news_articles")
+async def fetch_news_articles(categories: List[str], days_back: int = 7, refresh: bool = False) -> dict:
+    """Fetch news articles from NewsAPI concurrently, served from the shared headline cache when fresh.
+
+    With refresh, every category is fetched from NewsAPI even if it is cached,
+    and the cache is updated with the result. Categories still in flight when
+    the deadline expires come back as empty lists.
+    """
     # Calculate date range
     to_date = datetime.now()
     from_date = to_date - timedelta(days=days_back)
     
-    for category in categories:
-        if category not in AVAILABLE_CATEGORIES:
-            continue
-            
-        url = "https://newsapi.org/v2/top-headlines"
-        params = {
-            "apiKey": NEWS_API_KEY,
-            "category": category,
-            "language": "en",
-            "country": "us",
-            "from": from_date.strftime("%Y-%m-%d"),
-            "to": to_date.strftime("%Y-%m-%d"),
-            "pageSize": 5
-        }
-        
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                articles = data.get("articles", [])[:3]  # Top 3 articles per category
-                articles_by_category[category] = articles
-        except Exception as e:
-            print(f"Error fetching news for {category}: {e}")
+    semaphore = asyncio.Semaphore(NEWS_FETCH_CONCURRENCY)
+    
+    async def fetch_category(category: str) -> List[dict]:
+        async with semaphore:
+            return await headline_cache.get_or_fetch(
+                f"{category}:{days_back}",
+                lambda: fetch_category_headlines(category, from_date, to_date),
+                refresh=refresh
+            )
+    
+    tasks = {
+        asyncio.create_task(fetch_category(category)): category
+        for category in dict.fromkeys(categories)
+        if category in CATEGORY_SET
+    }
+    if not tasks:
+        return {}
+    
+    done, pending = await asyncio.wait(tasks, timeout=NEWS_FETCH_DEADLINE_SECONDS)
+    for task in pending:
+        task.cancel()
+    
+    articles_by_category = {}
+    for task, category in tasks.items():
+        if task in pending:
+            print(f"Timed out fetching news for {category}")
             articles_by_category[category] = []
+        elif task.exception() is not None:
+            print(f"Error fetching news for {category}: {task.exception()}")
+            articles_by_category[category] = []
+        else:
+            articles_by_category[category] = task.result()
     
     return articles_by_category
 
-async def summarize_article(title: str, content: str) -> str:
-    """Summarize article using Gemini API."""
-    # Truncate content if too long
-    max_content_length = 2000
+def read_latest_edition() -> Optional[dict]:
+    """Articles by category from the newest edition, or None when there is none recent enough.
+
+    An edition is as recent as the last time the scheduler built or re-checked it.
+    """
+    db = SessionLocal()
     try:
-        if len(content) > max_content_length:
-            content = content[:max_content_length] + "..."
+        row = db.execute(
+            select(Edition.content, Edition.created_at, Edition.checked_at).order_by(Edition.id.desc()).limit(1)
+        ).first()
+    finally:
+        db.close()
+    if row is None:
+        return None
+    if datetime.utcnow() - (row.checked_at or row.created_at) > timedelta(seconds=EDITION_MAX_AGE_SECONDS):
+        return None
+    return json.loads(row.content)
+
+async def get_newsletter_articles(categories: List[str], edition: Optional[dict] = None) -> dict:
+    """Articles for a newsletter, read from the latest edition and fetched live for anything it lacks.
+
+    A story filed under several of the categories is only kept in the first.
+    Pass edition (as returned by read_latest_edition, or {} for none) to reuse one across many newsletters.
+    """
+    if edition is None:
+        try:
+            edition = await asyncio.to_thread(read_latest_edition) or {}
+        except Exception as e:
+            print(f"Error reading latest edition: {e}")
+            edition = {}
+    categories = [category for category in dict.fromkeys(categories) if category in CATEGORY_SET]
+    missing = [category for category in categories if not edition.get(category)]
+    fetched = await fetch_news_articles(missing) if missing else {}
+    articles_by_category = {category: edition.get(category) or fetched.get(category, []) for category in categories}
+    if len(categories) > 1 and DEDUP_ENABLED:
+        from dedup import collapse_duplicates  # numpy; kept off the import path of main
+        articles_by_category = collapse_duplicates(articles_by_category)
+    return articles_by_category
+
+def truncate_content(content: str, max_content_length: int = 2000) -> str:
+    """Truncate article content to what we send to the model."""
+    content = content or ""
+    if len(content) > max_content_length:
+        content = content[:max_content_length] + "..."
+    return content
 
+async def call_gemini(prompt: str) -> Optional[str]:
+    """Send a prompt to Gemini and return the generated text, or None on an API error."""
+    session = get_http_session()
+    import aiohttp  # Loaded with the session; kept off the import path of main
+    data = {
+        "contents": [
+            {"parts": [{"text": prompt}]}
+        ]
+    }
+    try:
+        async with gemini_upstream.guard() as call:
+            timeout = aiohttp.ClientTimeout(total=call.timeout)
+            try:
+                async with session.post(GEMINI_API_URL, params={"key": GEMINI_API_KEY}, json=data, timeout=timeout) as response:
+                    if response.status != 200:
+                        record_upstream_error("gemini", kind="status")
+                        raise RuntimeError(f"Gemini API error: {response.status} {await response.text()}")
+                    result = await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                record_upstream_error("gemini", e)
+                raise
+            call.tokens = result.get("usageMetadata", {}).get("totalTokenCount") or 0
+    except (UpstreamUnavailable, RuntimeError) as e:
+        # Callers fall back to a placeholder summary
+        print(e)
+        return None
+    return result["candidates"][0]["content"]["parts"][0]["text"].strip()
+
+async def request_summary(title: str, content: str, key: str) -> str:
+    """Summarize one already-truncated article with Gemini and cache the result under key."""
+    try:
         prompt = f"""
 Please provide a concise 3-4 sentence summary of the following news article.\n\nTitle: {title}\nContent: {content}\n\nSummary:"""
 
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent?key={GEMINI_API_KEY}"
-        headers = {"Content-Type": "application/json"}
-        data = {
-            "contents": [
-                {"parts": [{"text": prompt}]}
-            ]
-        }
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        if response.status_code == 200:
-            result = response.json()
-            summary = result["candidates"][0]["content"]["parts"][0]["text"]
-            return summary.strip()
-        else:
-            print(f"Gemini API error: {response.status_code} {response.text}")
+        summary = await call_gemini(prompt)
+        if summary is None:
             return f"Summary unavailable. {title}"
+        await asyncio.to_thread(store_summaries, {key: summary}, SUMMARY_PROMPT_VERSION, {key: title})
+        return summary
     except Exception as e:
         print(f"Error summarizing article: {e}")
         return f"Summary unavailable. {title}"
 
-async def send_email(to_email: str, subject: str, html_content: str):
-    """Send email using Gmail SMTP."""
-    try:
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = GMAIL_USER
-        msg['To'] = to_email
+@observe_latency("summarize_articles")
+async def summarize_articles(articles: List[dict]) -> List[str]:
+    """Summarize many articles; near-duplicates (see dedup) share the summary of the first."""
+    if len(articles) < 2 or not DEDUP_ENABLED:
+        return await summarize_distinct_articles(articles)
+    from dedup import article_text, find_duplicates  # numpy; kept off the import path of main
+    duplicate_of = find_duplicates([article_text(article) for article in articles])
+    distinct = sorted(set(duplicate_of))
+    summaries = dict(zip(distinct, await summarize_distinct_articles([articles[index] for index in distinct])))
+    return [summaries[index] for index in duplicate_of]
 
-        html_part = MIMEText(html_content, 'html')
-        msg.attach(html_part)
+async def summarize_distinct_articles(articles: List[dict]) -> List[str]:
+    """Summarize many articles, serving cached summaries and batching the rest.
 
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(GMAIL_USER, GMAIL_PASSWORD)
-            server.sendmail(GMAIL_USER, to_email, msg.as_string())
+    The model is given the full article text (see article_extractor) where it
+    could be fetched, and NewsAPI's truncated content otherwise. Uncached
+    articles are sent SUMMARY_BATCH_SIZE at a time in a single model request;
+    any article missing from a batched answer falls back to its own request.
+    """
+    texts = {}
+    if ARTICLE_EXTRACTION_ENABLED:
+        try:
+            texts = await extract_articles(article.get("url") for article in articles)
+        except Exception as e:
+            print(f"Error extracting article text: {e}")
+    inputs = []
+    for article in articles:
+        title = article.get("title") or ""
+        content = truncate_content(
+            texts.get(article.get("url")) or article.get("content") or article.get("description") or ""
+        )
+        inputs.append((title, content, summary_key(title, content, SUMMARY_PROMPT_VERSION)))
+    
+    summaries = await asyncio.to_thread(lookup_summaries, [key for _, _, key in inputs])
+    pending = list({key: (title, content, key) for title, content, key in inputs if key not in summaries}.values())
+    
+    for start in range(0, len(pending), SUMMARY_BATCH_SIZE):
+        batch = pending[start:start + SUMMARY_BATCH_SIZE]
+        batch_summaries = {}
+        if len(batch) > 1:
+            articles_text = "\n\n".join(
+                f"[[{number}]]\nTitle: {title}\nContent: {content}"
+                for number, (title, content, _) in enumerate(batch, 1)
+            )
+            prompt = f"""
+Please provide a concise 3-4 sentence summary of each of the following news articles.
+Start each summary on a new line with the marker of its article, for example [[1]].\n\n{articles_text}\n\nSummaries:"""
+            try:
+                text = await call_gemini(prompt)
+            except Exception as e:
+                print(f"Error summarizing article batch: {e}")
+                text = None
+            if text:
+                parts = re.split(r"\[\[(\d+)\]\]", text)
+                for number, summary in zip(parts[1::2], parts[2::2]):
+                    index = int(number) - 1
+                    if 0 <= index < len(batch) and summary.strip():
+                        batch_summaries[batch[index][2]] = summary.strip()
+            if batch_summaries:
+                titles = {key: title for title, _, key in batch}
+                await asyncio.to_thread(store_summaries, batch_summaries, SUMMARY_PROMPT_VERSION, titles)
+        summaries.update(batch_summaries)
+        
+        for title, content, key in batch:
+            if key not in summaries:
+                summaries[key] = await request_summary(title, content, key)
+    
+    return [summaries[key] for _, _, key in inputs]
+
+@observe_latency("send_message")
+async def send_message(to_email: str, chunks: List[bytes]) -> bool:
+    """Send a message built by mime_builder over a pooled SMTP session."""
+    try:
+        async with smtp_upstream.guard():
+            await smtp_pool.send(GMAIL_USER, [to_email], chunks)
         return True
     except Exception as smtp_error:
+        record_upstream_error("smtp", smtp_error)
         print(f"SMTP failed: {smtp_error}")
         return False
 
 @app.get("/")
-async def root():
+async def root(request: Request):
+    if frontend is not None:
+        return frontend.response(request, "index.html")
     return {"message": "AI Newsletter Service API"}
 
 @app.get("/categories")
-async def get_categories():
+async def get_categories(request: Request):
     """Get available news categories."""
-    return {"categories": AVAILABLE_CATEGORIES}
+    return cached_json_response(request, {"categories": AVAILABLE_CATEGORIES}, CATEGORIES_CACHE_CONTROL)
+
+async def send_welcome_newsletter(user_id: int, db: Session) -> Optional[bool]:
+    """Fetch news, render and send the welcome newsletter for a stored user.
+
+    Returns None if the user no longer exists, otherwise whether the email was sent.
+    """
+    user = db.query(User).filter(User.id == user_id, not_unsubscribed()).first()
+    if not user:
+        # User unsubscribed before the job ran; nothing to send
+        return None
+    
+    # Read the precomputed edition, fetching live only what it lacks
+    articles_by_category = await get_newsletter_articles(user.category_list)
+    
+    # Create unsubscribe URL
+    user_unsubscribe_url = unsubscribe_url(user.id, user.unsubscribe_token)
+    
+    # Build the newsletter message (HTML plus plain-text alternative)
+    message = NewsletterMessage(CompiledNewsletter(articles_by_category), GMAIL_USER)
+    
+    # Send email
+    subject = "Your Personalized AI Newsletter 📰"
+    email_sent = await send_message(user.email, message.chunks(user.email, subject, user.name, user_unsubscribe_url))
+    
+    if email_sent:
+        # Mark as sent and record which stored articles went out
+        user.newsletter_sent = True
+        record_newsletter(db, user.id, subject, articles_by_category)
+        try:
+            db.commit()
+        except StaleDataError:
+            # The user unsubscribed while we were sending; nothing left to record
+            db.rollback()
+        await invalidate_user_cache(user_id)
+    return email_sent
 
-@app.post("/register", response_model=UserResponse)
-async def register_user(user_data: UserRegistration, db: Session = Depends(get_db)):
-    """Register a new user and send newsletter."""
+@app.post("/register", response_model=UserResponse, status_code=202)
+async def register_user(user_data: UserRegistration, db: AsyncSession = Depends(get_async_db)):
+    """Register a new user and queue their welcome newsletter.
+
+    Duplicate emails are caught by the unique index on insert rather than by a
+    lookup first, so a signup costs one round trip for the user and one commit.
+    """
     
     # Validate email
     if not validate_email(user_data.email):
         raise HTTPException(status_code=400, detail="Invalid email format")
     
-    # Check if email already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
     # Validate categories
-    invalid_categories = [cat for cat in user_data.categories if cat not in AVAILABLE_CATEGORIES]
-    if invalid_categories:
-        raise HTTPException(status_code=400, detail=f"Invalid categories: {invalid_categories}")
+    invalid = invalid_categories(user_data.categories)
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid categories: {invalid}")
     
     if not user_data.categories:
         raise HTTPException(status_code=400, detail="At least one category must be selected")
@@ -224,29 +653,19 @@ async def register_user(user_data: UserRegistration, db: Session = Depends(get_d
             email=user_data.email,
             categories=",".join(user_data.categories),
             newsletter_sent=False,
-            unsubscribe_token=unsubscribe_token
+            unsubscribe_token=unsubscribe_token,
+            subscriptions=[UserCategory(category=category) for category in dict.fromkeys(user_data.categories)]
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
-        
-        # Fetch news and generate newsletter
-        articles_by_category = await fetch_news_articles(user_data.categories)
-        
-        # Create unsubscribe URL
-        unsubscribe_url = f"{BASE_URL}/unsubscribe/{unsubscribe_token}"
-        
-        # Generate newsletter HTML using template
-        html_content = generate_newsletter_html(user_data.name, articles_by_category, unsubscribe_url)
-        
-        # Send email
-        subject = "Your Personalized AI Newsletter 📰"
-        email_sent = await send_email(user_data.email, subject, html_content)
+        try:
+            await db.flush()
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(status_code=400, detail="Email already registered")
         
-        if email_sent:
-            # Mark as sent
-            db_user.newsletter_sent = True
-            db.commit()
+        # Queue the welcome newsletter in the same transaction as the user row
+        job = enqueue_job(db, WELCOME_NEWSLETTER, {"user_id": db_user.id})
+        await db.commit()
         
         return UserResponse(
             id=db_user.id,
@@ -254,62 +673,275 @@ async def register_user(user_data: UserRegistration, db: Session = Depends(get_d
             email=db_user.email,
             categories=user_data.categories,
             newsletter_sent=db_user.newsletter_sent,
-            created_at=db_user.created_at
+            created_at=db_user.created_at,
+            job_id=job.id
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job_status(job_id: int, db: Session = Depends(get_db)):
+    """Get the status of a background job."""
+    job = get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return JobResponse(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        attempts=job.attempts,
+        last_error=job.last_error,
+        run_at=job.run_at,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
 @app.get("/users/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int, db: Session = Depends(get_db)):
-    """Get user details."""
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_user(user_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Get user details, served from the user cache when possible."""
+    key = f"user:{user_id}"
+    content = await run_backend(user_cache.get, key)
+    if content is not None:
+        user_cache_stats["hits"] += 1
+        return cached_json_response(request, content, USER_CACHE_CONTROL)
+    
+    user_cache_stats["misses"] += 1
+    result = await db.execute(select(User).filter(User.id == user_id, not_unsubscribed()))
+    user = result.scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return UserResponse(
+    content = jsonable_encoder(UserResponse(
         id=user.id,
         name=user.name,
         email=user.email,
-        categories=user.categories.split(","),
+        categories=user.category_list,
         newsletter_sent=user.newsletter_sent,
         created_at=user.created_at
-    )
+    ))
+    await run_backend(user_cache.set, key, content, USER_CACHE_TTL_SECONDS)
+    return cached_json_response(request, content, USER_CACHE_CONTROL)
 
-@app.get("/unsubscribe/{token}", response_class=HTMLResponse)
-async def unsubscribe_user(token: str, db: Session = Depends(get_db)):
-    """Unsubscribe user and delete their data."""
+async def process_unsubscribe(token: str, db: AsyncSession) -> HTMLResponse:
+    """Stop mail to the token's user at once and queue their data for deletion.
+
+    Signed tokens are verified without reading the database; older stored
+    tokens are looked up. Either way the request only writes a tombstone, and
+    the unsubscribe worker deletes the user's rows in batches.
+    """
     try:
-        # Find user by unsubscribe token
-        user = db.query(User).filter(User.unsubscribe_token == token).first()
+        user_email = None
+        if is_signed_token(token):
+            verified = verify_token(token)
+            user_id = verified[0] if verified else None
+            # A user created after the link was issued is a different user with a reused id
+            created_before = datetime.utcfromtimestamp(verified[1] + 1) if verified else None
+        else:
+            result = await db.execute(select(User.id, User.email).filter(User.unsubscribe_token == token))
+            row = result.first()
+            user_id = row.id if row else None
+            user_email = row.email if row else None
+            created_before = datetime.utcnow()
         
-        if not user:
-            # User not found - show error page
+        if user_id is None:
+            # Unknown token - show error page
             error_html = generate_unsubscribe_error_html("Invalid or expired unsubscribe link.")
             return HTMLResponse(content=error_html, status_code=404)
         
-        # Store email for confirmation page
-        user_email = user.email
+        await add_tombstone(db, user_id, created_before)
+        await invalidate_user_cache(user_id)
         
-        # Delete user data
-        db.delete(user)
-        db.commit()
-        
-        # Show success page
+        # Show success page; never cache the result of a state-changing link
         success_html = generate_unsubscribe_success_html(user_email)
-        return HTMLResponse(content=success_html, status_code=200)
+        return HTMLResponse(content=success_html, status_code=200, headers={"Cache-Control": "no-store"})
         
     except Exception as e:
         print(f"Error during unsubscribe: {e}")
-        db.rollback()
+        await db.rollback()
         error_html = generate_unsubscribe_error_html("An error occurred while processing your request.")
         return HTMLResponse(content=error_html, status_code=500)
 
+@app.get("/unsubscribe/{token}", response_class=HTMLResponse)
+async def unsubscribe_user(token: str, db: AsyncSession = Depends(get_async_db)):
+    """Unsubscribe user and delete their data."""
+    return await process_unsubscribe(token, db)
+
+@app.post("/unsubscribe/{token}", response_class=HTMLResponse)
+async def one_click_unsubscribe(token: str, db: AsyncSession = Depends(get_async_db)):
+    """RFC 8058 one-click unsubscribe, POSTed by mail clients from the List-Unsubscribe header.
+
+    The body (List-Unsubscribe=One-Click) carries nothing beyond the token in the URL.
+    """
+    return await process_unsubscribe(token, db)
+
+# Tasks of campaigns started from this process, kept referenced until they finish;
+# which campaigns are running is claimed in the database (see campaign.claim_campaign)
+running_campaigns = {}
+
+def campaign_response(campaign) -> CampaignResponse:
+    return CampaignResponse(
+        id=campaign.id,
+        name=campaign.name,
+        subject=campaign.subject,
+        status=campaign.status,
+        incremental=campaign.incremental,
+        last_user_id=campaign.last_user_id,
+        sent=campaign.sent,
+        failed=campaign.failed,
+        skipped=campaign.skipped,
+        messages_per_second=campaign.messages_per_second,
+        created_at=campaign.created_at,
+        finished_at=campaign.finished_at
+    )
+
+@app.post("/admin/campaigns", response_model=CampaignResponse, status_code=202, dependencies=[Depends(require_admin)])
+async def start_campaign(request: CampaignRequest):
+    """Start (or resume) a newsletter campaign to all subscribers in the background."""
+    from campaign import (
+        CAMPAIGN_BATCH_SIZE, CAMPAIGN_CONCURRENCY, CAMPAIGN_SUBJECT, claim_campaign, create_campaign, get_campaign,
+        run_campaign
+    )
+    
+    if request.resume_id is not None:
+        campaign_id = request.resume_id
+        if await asyncio.to_thread(get_campaign, campaign_id) is None:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+    else:
+        name = request.name or f"Campaign {datetime.utcnow():%Y-%m-%d %H:%M}"
+        campaign_id = await asyncio.to_thread(
+            create_campaign, name, request.subject or CAMPAIGN_SUBJECT, request.incremental
+        )
+    
+    # Claimed before answering, so a second request (to any worker) gets a 409
+    if not await asyncio.to_thread(claim_campaign, campaign_id):
+        raise HTTPException(status_code=409, detail="Campaign is already running")
+    
+    task = asyncio.create_task(run_campaign(
+        campaign_id,
+        batch_size=request.batch_size or CAMPAIGN_BATCH_SIZE,
+        concurrency=request.concurrency or CAMPAIGN_CONCURRENCY,
+        claimed=True
+    ))
+    running_campaigns[campaign_id] = task
+    task.add_done_callback(lambda t: running_campaigns.pop(campaign_id, None))
+    
+    return campaign_response(await asyncio.to_thread(get_campaign, campaign_id))
+
+@app.get("/admin/campaigns/{campaign_id}", response_model=CampaignResponse, dependencies=[Depends(require_admin)])
+def get_campaign_status(campaign_id: int):
+    """Get progress of a newsletter campaign."""
+    from campaign import get_campaign
+    
+    campaign = get_campaign(campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign_response(campaign)
+
+@app.post("/admin/import", dependencies=[Depends(require_admin)])
+async def import_users(file: UploadFile = File(...), format: Optional[str] = None, send_welcome: bool = False):
+    """Bulk import subscribers from an uploaded CSV or NDJSON file."""
+    from bulk_import import detect_format, import_subscribers
+    
+    fmt = format or detect_format(file.filename)
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Format must be 'csv' or 'ndjson'")
+    
+    # The upload is spooled to disk by the server; read it back line by line, dropping a BOM (Excel adds one)
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        return await asyncio.to_thread(import_subscribers, stream, fmt, send_welcome)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+    finally:
+        stream.detach()
+
+def read_queue_stats() -> dict:
+    db = SessionLocal()
+    try:
+        return queue_stats(db)
+    finally:
+        db.close()
+
+def collect_runtime_metrics():
+    """Refresh gauges and cache counters from caches, the SMTP pool and the job queue before a scrape."""
+    headline = headline_cache.stats()
+    for result in ("hits", "misses", "stale", "coalesced"):
+        CACHE_LOOKUPS.set(headline[result], cache="headline", result=result)
+    CACHE_HIT_RATIO.set(headline["hit_ratio"], cache="headline")
+    
+    summary_lookups = summary_cache_stats["hits"] + summary_cache_stats["misses"]
+    for result in ("hits", "misses"):
+        CACHE_LOOKUPS.set(summary_cache_stats[result], cache="summary", result=result)
+    CACHE_HIT_RATIO.set(summary_cache_stats["hits"] / summary_lookups if summary_lookups else 0.0, cache="summary")
+    
+    user_lookups = user_cache_stats["hits"] + user_cache_stats["misses"]
+    for result in ("hits", "misses"):
+        CACHE_LOOKUPS.set(user_cache_stats[result], cache="user", result=result)
+    CACHE_HIT_RATIO.set(user_cache_stats["hits"] / user_lookups if user_lookups else 0.0, cache="user")
+    
+    for name, value in smtp_pool.stats().items():
+        SMTP_POOL.set(value, stat=name)
+    
+    queue = read_queue_stats()
+    QUEUE_LAG.set(queue.pop("oldest_due_seconds"))
+    for status, value in queue.items():
+        QUEUE_JOBS.set(value, status=status)
+
+REGISTRY.add_collector(collect_runtime_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics."""
+    body = await asyncio.to_thread(render_metrics)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
-async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy", "timestamp": datetime.utcnow()}
+async def health_check(ready: bool = False):
+    """Health check endpoint. With ?ready=true, also check the database and worker saturation."""
+    health = {
+        "status": "healthy",
+        "timestamp": datetime.utcnow(),
+        "headline_cache": await asyncio.to_thread(headline_cache.stats),
+        "smtp_pool": smtp_pool.stats(),
+        "upstreams": {upstream.name: upstream.stats() for upstream in (newsapi_upstream, gemini_upstream, smtp_upstream)}
+    }
+    if not ready:
+        return health
+    
+    checks = {}
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"error: {e}"
+    
+    try:
+        queue = await asyncio.to_thread(read_queue_stats)
+        health["queue"] = queue
+        lagging = queue["oldest_due_seconds"] > READINESS_MAX_QUEUE_LAG_SECONDS
+        checks["workers"] = "saturated" if lagging else "ok"
+    except Exception as e:
+        checks["workers"] = f"error: {e}"
+    
+    smtp = health["smtp_pool"]
+    checks["smtp_pool"] = "saturated" if smtp["in_use"] >= smtp["size"] else "ok"
+    
+    health["checks"] = checks
+    is_ready = all(value == "ok" for value in checks.values())
+    health["status"] = "ready" if is_ready else "not_ready"
+    return JSONResponse(content=jsonable_encoder(health), status_code=200 if is_ready else 503)
+
+if frontend is not None:
+    # Registered last so every API route takes precedence
+    @app.api_route("/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+    async def frontend_file(path: str, request: Request):
+        return frontend.response(request, path)
 
 if __name__ == "__main__":
     import uvicorn
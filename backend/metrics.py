@@ -0,0 +1,276 @@
+# backend/metrics.py
+"""Minimal Prometheus-style metrics: counters, gauges and histograms rendered
+in the text exposition format served by GET /metrics.
+
+Metrics live in the process that records them. The API serves them on its own
+/metrics route; the worker and scheduler processes call start_metrics_server
+to serve theirs on a port of their own."""
+import asyncio
+import functools
+import inspect
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels):
+        """Mirror a running total kept elsewhere; value must never go down."""
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Run collector before every scrape, typically to refresh gauges from live state."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "newsletter_stage_seconds", "Latency of pipeline stages (news fetch, summaries, render, SMTP)"))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "newsletter_stage_errors_total", "Pipeline stage calls that raised"))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    "newsletter_upstream_errors_total", "Failed upstream calls by upstream and kind (timeout, status, error)"))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "newsletter_db_query_seconds", "Latency of database statements",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)))
+DB_ERRORS = REGISTRY.register(Counter(
+    "newsletter_db_errors_total", "Database statements that raised"))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "newsletter_http_request_seconds", "Latency of HTTP requests served by the API"))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "newsletter_cache_lookups_total", "Cache lookups since process start by cache and result"))
+CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    "newsletter_cache_hit_ratio", "Share of cache lookups served without an upstream call"))
+QUEUE_JOBS = REGISTRY.register(Gauge(
+    "newsletter_queue_jobs", "Jobs in the background queue by status"))
+QUEUE_LAG = REGISTRY.register(Gauge(
+    "newsletter_queue_oldest_due_seconds", "How long the oldest due job has been waiting for a worker"))
+SMTP_POOL = REGISTRY.register(Gauge(
+    "newsletter_smtp_pool", "SMTP pool connections and delivery counters"))
+UPSTREAM_SECONDS = REGISTRY.register(Histogram(
+    "newsletter_upstream_seconds", "Latency of upstream calls admitted by the rate limiter and circuit breaker"))
+UPSTREAM_REJECTED = REGISTRY.register(Counter(
+    "newsletter_upstream_rejected_total", "Upstream calls refused locally by reason (circuit_open, rate_limited)"))
+UPSTREAM_CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "newsletter_upstream_circuit_state", "Circuit breaker state per upstream: 0 closed, 1 half-open, 2 open"))
+UPSTREAM_TIMEOUT_SECONDS = REGISTRY.register(Gauge(
+    "newsletter_upstream_timeout_seconds", "Current adaptive timeout per upstream"))
+
+
+def record_upstream_error(upstream: str, error: Optional[BaseException] = None, kind: Optional[str] = None):
+    """Count a failed upstream call, classifying timeouts separately."""
+    if kind is None:
+        timeout_types = (asyncio.TimeoutError, TimeoutError, socket.timeout)
+        kind = "timeout" if isinstance(error, timeout_types) else "error"
+    UPSTREAM_ERRORS.inc(upstream=upstream, kind=kind)
+
+
+def observe_latency(stage: str):
+    """Decorator recording latency and errors of a sync or async function as a pipeline stage."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    STAGE_ERRORS.inc(stage=stage)
+                    raise
+                finally:
+                    STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                STAGE_ERRORS.inc(stage=stage)
+                raise
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+        return wrapper
+    return decorator
+
+
+def instrument_engine(engine, name: str = "default"):
+    """Time every statement executed on a (sync) SQLAlchemy engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        operation = statement.lstrip().split(" ", 1)[0].upper()
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, engine=name, operation=operation)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        stack = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if stack:
+            stack.pop()
+        DB_ERRORS.inc(engine=name)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scraped every few seconds; not worth a log line each time
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """Serve GET /metrics on port from a daemon thread; returns None when port is 0 or already taken."""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"Metrics server not started on port {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
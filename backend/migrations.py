@@ -0,0 +1,143 @@
+# backend/migrations.py
+"""Schema creation and data migrations.
+
+    python migrations.py
+
+Creates missing tables and brings existing databases up to date. This runs
+once per deploy, before the API, worker and scheduler processes start
+(run.sh and gunicorn.conf.py do it), instead of on every import of the
+modules that define tables.
+"""
+from sqlalchemy import MetaData, inspect, insert, text
+from sqlalchemy.schema import CreateTable
+
+from database import Base, SessionLocal, engine
+from models import User, UserCategory
+
+MIGRATION_BATCH_SIZE = 1000
+
+
+def create_schema():
+    """Create every table that does not exist yet."""
+    import job_queue, summary_cache, unsubscribe  # noqa: F401  (register their tables)
+
+    Base.metadata.create_all(bind=engine)
+
+
+def migrate_user_categories(batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """Backfill user_categories from the comma-separated users.categories column.
+
+    Only users without any subscription rows are touched, so the migration can
+    be re-run safely. Returns the number of users migrated.
+    """
+    db = SessionLocal()
+    migrated = 0
+    last_user_id = 0
+    try:
+        while True:
+            users = (
+                db.query(User.id, User.categories)
+                .outerjoin(UserCategory, UserCategory.user_id == User.id)
+                .filter(User.id > last_user_id, UserCategory.user_id.is_(None))
+                .order_by(User.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not users:
+                break
+            rows = [
+                {"user_id": user.id, "category": category}
+                for user in users
+                for category in dict.fromkeys(c.strip() for c in (user.categories or "").split(","))
+                if category
+            ]
+            if rows:
+                db.execute(insert(UserCategory), rows)
+            db.commit()
+            migrated += len(users)
+            last_user_id = users[-1].id
+    finally:
+        db.close()
+    return migrated
+
+
+def add_campaign_columns() -> int:
+    """Add the campaign columns for incremental and per-category digests to an existing campaigns table.
+
+    create_all does not alter tables that already exist. Returns the number of
+    columns added; safe to re-run.
+    """
+    return _add_columns("campaigns", {
+        "incremental": "BOOLEAN NOT NULL DEFAULT FALSE",
+        "skipped": "INTEGER NOT NULL DEFAULT 0",
+        "category": "VARCHAR(50)",
+    })
+
+
+def add_edition_columns() -> int:
+    """Add editions.checked_at, when the scheduler last found an edition still current."""
+    return _add_columns("editions", {"checked_at": "TIMESTAMP"})
+
+
+def _add_columns(table: str, columns: dict) -> int:
+    """ALTER TABLE ADD COLUMN for each {name: definition} the table lacks; returns how many were added."""
+    inspector = inspect(engine)
+    if not inspector.has_table(table):
+        return 0
+    existing = {column["name"] for column in inspector.get_columns(table)}
+    added = 0
+    with engine.begin() as conn:
+        for name, definition in columns.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {definition}"))
+                added += 1
+    return added
+
+
+def make_unsubscribe_token_nullable() -> bool:
+    """Drop NOT NULL from users.unsubscribe_token, so users created with signed tokens store none.
+
+    SQLite cannot alter a column, so there the table is rebuilt from the model.
+    Returns whether anything changed; safe to re-run.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("users"):
+        return False
+    column = next(c for c in inspector.get_columns("users") if c["name"] == "unsubscribe_token")
+    if column["nullable"]:
+        return False
+    with engine.begin() as conn:
+        if engine.dialect.name != "sqlite":
+            conn.execute(text("ALTER TABLE users ALTER COLUMN unsubscribe_token DROP NOT NULL"))
+            return True
+        users = User.__table__
+        rebuilt = users.to_metadata(MetaData(), name="users_rebuilt")
+        columns = ", ".join(c.name for c in users.columns)
+        conn.execute(CreateTable(rebuilt))
+        conn.execute(text(f"INSERT INTO users_rebuilt ({columns}) SELECT {columns} FROM users"))
+        conn.execute(text("DROP TABLE users"))
+        conn.execute(text("ALTER TABLE users_rebuilt RENAME TO users"))
+        for index in users.indexes:
+            index.create(conn)
+    return True
+
+
+def init_db(verbose: bool = False):
+    """Create the schema and apply every migration; safe to re-run."""
+    create_schema()
+    migrated = migrate_user_categories()
+    added = add_campaign_columns() + add_edition_columns()
+    nullable = make_unsubscribe_token_nullable()
+    if verbose:
+        print(f"Migrated categories for {migrated} users")
+        print(f"Added {added} campaign and edition columns")
+        if nullable:
+            print("Made users.unsubscribe_token nullable")
+
+
+def main():
+    init_db(verbose=True)
+
+
+if __name__ == "__main__":
+    main()
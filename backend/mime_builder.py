@@ -0,0 +1,183 @@
+# backend/mime_builder.py
+"""Newsletter MIME messages built from pre-encoded parts.
+
+A NewsletterMessage wraps a CompiledNewsletter and transfer-encodes everything
+recipients share once: the quoted-printable HTML fragments, a plain-text
+alternative generated from the HTML, the part headers and the MIME boundary.
+Per recipient only the top-level headers, the greeting and the unsubscribe
+line are encoded. `chunks` returns the message as CRLF, dot-stuffed byte
+chunks that SMTPPool writes straight to the DATA stream without joining them.
+"""
+import re
+import secrets
+import socket
+from email import quoprimime
+from email.header import Header
+from email.utils import formatdate, make_msgid
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import List, Optional
+
+from email_templates import CompiledNewsletter
+from metrics import observe_latency
+
+_BLOCK_TAGS = {"p", "div", "h1", "h2", "h3", "br", "li", "tr"}
+_SKIPPED_TAGS = {"style", "script", "title"}
+_LEADING_DOT = re.compile(rb"^\.", re.MULTILINE)
+
+
+class _TextExtractor(HTMLParser):
+    """Collects readable text from HTML, with links written out after their text."""
+
+    def __init__(self):
+        super().__init__()
+        self.lines: List[str] = []
+        self._line: List[str] = []
+        self._skip = 0
+        self._href: Optional[str] = None
+        self._link_text: List[str] = []
+
+    def _break(self):
+        if self._line:
+            self.lines.append(" ".join(self._line))
+            self._line = []
+        elif self.lines and self.lines[-1]:
+            self.lines.append("")
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skip += 1
+        elif tag in _BLOCK_TAGS:
+            self._break()
+        elif tag == "a":
+            self._href = dict(attrs).get("href")
+            self._link_text = []
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _BLOCK_TAGS:
+            self._break()
+        elif tag == "a" and self._href:
+            if self._href != "#" and self._href != " ".join(self._link_text):
+                self._line.append(f"({self._href})")
+            self._href = None
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        words = data.split()
+        if words:
+            self._line.append(" ".join(words))
+            if self._href:
+                self._link_text.append(" ".join(words))
+
+    def text(self) -> str:
+        self.close()
+        self._break()
+        return "\n".join(self.lines).strip()
+
+
+def html_to_text(html: str) -> str:
+    """Plain-text rendering of an HTML document or fragment, for the text/plain alternative."""
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    return extractor.text()
+
+
+def _paragraph(text: str) -> str:
+    return text + "\n\n" if text else ""
+
+
+def encode_part(data: bytes) -> bytes:
+    """Quoted-printable encode whole lines of UTF-8 text, with CRLF endings and leading dots doubled for SMTP."""
+    # quoprimime works on one character per byte; latin-1 maps bytes to characters one to one
+    encoded = quoprimime.body_encode(data.decode("latin-1"), eol="\r\n").encode("ascii")
+    return _LEADING_DOT.sub(b"..", encoded)
+
+
+@lru_cache(maxsize=64)
+def _encode_subject(subject: str) -> bytes:
+    if subject.isascii():
+        return subject.encode("ascii")
+    return Header(subject, "utf-8").encode().replace("\n", "\r\n").encode("ascii")
+
+
+def _new_boundary() -> bytes:
+    # '==' never occurs in quoted-printable output, so the boundary cannot collide with the body
+    return ("===============" + secrets.token_hex(12) + "==").encode("ascii")
+
+
+def _message_headers(sender: str, to_email: str, subject: str, msgid_domain: str, boundary: bytes,
+                     unsubscribe_url: Optional[str] = None) -> bytes:
+    # RFC 8058 one-click unsubscribe: mail clients POST to the List-Unsubscribe URL
+    unsubscribe = (b"\r\nList-Unsubscribe: <" + unsubscribe_url.encode("ascii") + b">"
+                   b"\r\nList-Unsubscribe-Post: List-Unsubscribe=One-Click") if unsubscribe_url else b""
+    return b"".join((
+        b"From: ", sender.encode("utf-8"),
+        b"\r\nTo: ", to_email.encode("utf-8"),
+        b"\r\nSubject: ", _encode_subject(subject),
+        b"\r\nDate: ", formatdate(usegmt=True).encode("ascii"),
+        b"\r\nMessage-ID: ", make_msgid(domain=msgid_domain).encode("ascii"),
+        unsubscribe,
+        b'\r\nMIME-Version: 1.0\r\nContent-Type: multipart/alternative; boundary="', boundary,
+        b'"\r\n\r\n',
+    ))
+
+
+@lru_cache(maxsize=1)
+def _local_domain() -> str:
+    return socket.getfqdn() or "localhost"
+
+
+def _msgid_domain(sender: Optional[str]) -> str:
+    # make_msgid looks up the host name on every call unless given a domain;
+    # without a sender (GMAIL_USER unset) fall back to this host's name, looked up once
+    return (sender or "").rpartition("@")[2] or _local_domain()
+
+
+def _part_headers(boundary: bytes, content_type: bytes) -> bytes:
+    return (b"--" + boundary + b"\r\nContent-Type: " + content_type + b'; charset="utf-8"\r\n'
+            b"Content-Transfer-Encoding: quoted-printable\r\n\r\n")
+
+
+class NewsletterMessage:
+    """multipart/alternative message for one compiled newsletter, shared by every recipient."""
+
+    @observe_latency("build_email")
+    def __init__(self, newsletter: CompiledNewsletter, sender: Optional[str]):
+        self.newsletter = newsletter
+        self._msgid_domain = _msgid_domain(sender)
+        self.sender = sender or f"newsletter@{self._msgid_domain}"
+        self._boundary = boundary = _new_boundary()
+
+        head, body, tail = (fragment.decode("utf-8") for fragment in (newsletter.head, newsletter.body, newsletter.tail))
+        text_head, text_body, text_tail = (_paragraph(html_to_text(part)) for part in (head, body, tail))
+
+        self._text_head = _part_headers(boundary, b"text/plain") + encode_part(text_head.encode("utf-8"))
+        self._text_body = encode_part(text_body.encode("utf-8"))
+        self._html_head = (encode_part(text_tail.encode("utf-8")) + b"\r\n"
+                           + _part_headers(boundary, b"text/html") + encode_part(newsletter.head))
+        self._html_body = encode_part(newsletter.body)
+        self._html_tail = encode_part(newsletter.tail) + b"\r\n--" + boundary + b"--\r\n"
+
+    def headers(self, to_email: str, subject: str, unsubscribe_url: Optional[str] = None) -> bytes:
+        return _message_headers(self.sender, to_email, subject, self._msgid_domain, self._boundary, unsubscribe_url)
+
+    def chunks(self, to_email: str, subject: str, user_name: Optional[str], unsubscribe_url: str) -> List[bytes]:
+        """The message for one recipient as byte chunks ready for SMTPPool.send."""
+        _, greeting, _, unsubscribe, _ = self.newsletter.fragments(user_name, unsubscribe_url)
+        text_greeting = f"Hello {user_name},\n\n" if user_name else "Hello,\n\n"
+        text_unsubscribe = f"Unsubscribe and remove your data: {unsubscribe_url}\n\n"
+        return [
+            self.headers(to_email, subject, unsubscribe_url),
+            self._text_head,
+            encode_part(text_greeting.encode("utf-8")),
+            self._text_body,
+            encode_part(text_unsubscribe.encode("utf-8")),
+            self._html_head,
+            encode_part(greeting),
+            self._html_body,
+            encode_part(unsubscribe),
+            self._html_tail,
+        ]
@@ -1,74 +1,136 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from typing import List
 
-Base = declarative_base()
+from database import Base
 
 class User(Base):
     """User model for newsletter subscribers"""
     __tablename__ = "users"
-    
+
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
-    categories = Column(Text, nullable=False)  # Comma-separated list of categories
+    categories = Column(Text, nullable=False)  # Comma-separated copy of subscriptions for older readers
     newsletter_sent = Column(Boolean, default=False)
+    unsubscribe_token = Column(String, unique=True, nullable=True)  # Only without signed tokens (see unsubscribe.py)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
+
     # Relationships
-    newsletters = relationship("Newsletter", back_populates="user")
-    
+    subscriptions = relationship("UserCategory", cascade="all, delete-orphan", lazy="selectin")
+    newsletters = relationship("Newsletter", back_populates="user", cascade="all, delete-orphan")
+
+    @property
+    def category_list(self) -> List[str]:
+        """Subscribed categories, falling back to the text column for rows not yet migrated."""
+        if self.subscriptions:
+            return [subscription.category for subscription in self.subscriptions]
+        return self.categories.split(",")
+
     def __repr__(self):
         return f"<User(id={self.id}, email='{self.email}', categories='{self.categories}')>"
 
 
+class UserCategory(Base):
+    """One row per (user, category) subscription"""
+    __tablename__ = "user_categories"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    category = Column(String(50), primary_key=True)
+
+    # Serves "subscribers of X" lookups as a range scan ordered by user id
+    __table_args__ = (Index("ix_user_categories_category_user_id", "category", "user_id"),)
+
+    def __repr__(self):
+        return f"<UserCategory(user_id={self.user_id}, category='{self.category}')>"
+
+
 class Newsletter(Base):
-    """Newsletter model to store generated newsletters"""
+    """A newsletter sent to a user; its content is the linked stored articles"""
     __tablename__ = "newsletters"
-    
+
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     subject = Column(String(255), nullable=False)
-    html_content = Column(Text, nullable=False)
+    html_content = Column(Text, nullable=True)  # Not stored for newsletters built from stored articles
     sent_at = Column(DateTime, default=datetime.utcnow)
     email_status = Column(String(50), default="sent")  # sent, failed, pending
-    
+
     # Relationships
     user = relationship("User", back_populates="newsletters")
-    articles = relationship("NewsArticle", back_populates="newsletter")
-    
+    article_links = relationship("NewsletterArticle", cascade="all, delete-orphan", order_by="NewsletterArticle.position")
+
     def __repr__(self):
         return f"<Newsletter(id={self.id}, user_id={self.user_id}, subject='{self.subject[:50]}...')>"
 
 
+class NewsletterArticle(Base):
+    """Article included in a newsletter, under the category it was shown in"""
+    __tablename__ = "newsletter_articles"
+
+    newsletter_id = Column(Integer, ForeignKey("newsletters.id", ondelete="CASCADE"), primary_key=True)
+    article_id = Column(Integer, ForeignKey("news_articles.id"), primary_key=True)
+    category = Column(String(50), nullable=False)
+    position = Column(Integer, nullable=False, default=0)
+
+    # Relationships
+    article = relationship("NewsArticle", lazy="joined")
+
+    __table_args__ = (Index("ix_newsletter_articles_article_id", "article_id"),)
+
+
 class NewsArticle(Base):
-    """News article model to store fetched and summarized articles"""
+    """Fetched article, stored once per URL and updated in place on later fetches"""
     __tablename__ = "news_articles"
-    
+
     id = Column(Integer, primary_key=True, index=True)
-    newsletter_id = Column(Integer, ForeignKey("newsletters.id"), nullable=False)
+    url_hash = Column(String(64), nullable=False, unique=True, index=True)  # sha256 of url
     title = Column(String(500), nullable=False)
     url = Column(Text, nullable=False)
     source = Column(String(100), nullable=True)
-    category = Column(String(50), nullable=False)
+    category = Column(String(50), nullable=False)  # Category the article was first fetched for
+    description = Column(Text, nullable=True)
     original_content = Column(Text, nullable=True)
     ai_summary = Column(Text, nullable=True)
     published_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    
-    # Relationships
-    newsletter = relationship("Newsletter", back_populates="articles")
-    
+    last_seen_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self) -> dict:
+        """The article in the NewsAPI shape used by the templates."""
+        return {
+            "title": self.title,
+            "url": self.url,
+            "description": self.description,
+            "content": self.original_content,
+            "source": {"name": self.source},
+            "publishedAt": self.published_at.isoformat() + "Z" if self.published_at else None,
+        }
+
     def __repr__(self):
         return f"<NewsArticle(id={self.id}, title='{self.title[:50]}...', category='{self.category}')>"
 
 
+class Edition(Base):
+    """Precomputed snapshot of summarized headlines for every category"""
+    __tablename__ = "editions"
+
+    id = Column(Integer, primary_key=True, index=True)  # Doubles as the edition version
+    content_hash = Column(String(64), nullable=False)  # sha256 of content
+    content = Column(Text, nullable=False)  # JSON {category: [article, ...]}
+    article_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    checked_at = Column(DateTime, nullable=True)  # Last time the scheduler found the headlines unchanged
+
+    def __repr__(self):
+        return f"<Edition(id={self.id}, articles={self.article_count}, created_at='{self.created_at}')>"
+
+
 class APIUsage(Base):
     """Track API usage for monitoring and billing"""
     __tablename__ = "api_usage"
-    
+
     id = Column(Integer, primary_key=True, index=True)
     service = Column(String(50), nullable=False)  # 'news_api', 'openai', 'sendgrid'
     endpoint = Column(String(100), nullable=True)
@@ -76,6 +138,57 @@ class APIUsage(Base):
     tokens_used = Column(Integer, nullable=True)  # For OpenAI
     cost = Column(String(20), nullable=True)  # Estimated cost
     date = Column(DateTime, default=datetime.utcnow)
-    
+
+    def __repr__(self):
+        return f"<APIUsage(service='{self.service}', requests={self.requests_count}, date='{self.date}')>"
+
+
+class Campaign(Base):
+    """Progress of a newsletter campaign, checkpointed after every batch"""
+    __tablename__ = "campaigns"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, completed, failed
+    incremental = Column(Boolean, nullable=False, default=False)  # Only articles each user has not been sent
+    category = Column(String(50), nullable=True)  # Only this category's subscribers and articles, if set
+    last_user_id = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)  # Users in campaign_failures, retried on resume
+    skipped = Column(Integer, nullable=False, default=0)  # Incremental: users with nothing new
+    elapsed_seconds = Column(Float, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.sent / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def __repr__(self):
+        return f"<Campaign(id={self.id}, name='{self.name}', status='{self.status}', sent={self.sent})>"
+
+
+class CampaignFailure(Base):
+    """A user a campaign could not deliver to, retried when the campaign is resumed"""
+    __tablename__ = "campaign_failures"
+
+    campaign_id = Column(Integer, ForeignKey("campaigns.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+
+    def __repr__(self):
+        return f"<CampaignFailure(campaign_id={self.campaign_id}, user_id={self.user_id})>"
+
+
+class SchedulerLease(Base):
+    """Named lease held by at most one scheduler process until it expires"""
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String(50), primary_key=True)
+    holder = Column(String(255), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
     def __repr__(self):
-        return f"<APIUsage(service='{self.service}', requests={self.requests_count}, date='{self.date}')>"
\ No newline at end of file
+        return f"<SchedulerLease(name='{self.name}', holder='{self.holder}', expires_at='{self.expires_at}')>"
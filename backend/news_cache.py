@@ -0,0 +1,153 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from shared_cache import MemoryBackend, run_backend
+
+
+class HeadlineCache:
+    """Category -> articles cache with TTL, LRU eviction and single-flight fetches.
+
+    Concurrent lookups for the same key while a fetch is in flight wait on that
+    fetch instead of starting their own, so a burst of registrations for one
+    category costs a single upstream request. With a shared backend (see
+    shared_cache) entries and the in-flight lock are shared by every worker
+    process, so other processes wait for the fetching one instead of
+    calling upstream themselves.
+    """
+
+    def __init__(self, ttl_seconds: float = 900, max_entries: int = 64, stale_ttl_seconds: float = 3600,
+                 backend=None, fetch_lock_seconds: float = 10, prefix: str = "headline:"):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stale_ttl_seconds = stale_ttl_seconds
+        self.backend = backend if backend is not None else MemoryBackend(max_entries)
+        self.fetch_lock_seconds = fetch_lock_seconds
+        self.prefix = prefix
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.peer_fetches = 0  # Misses served by another process's fetch
+        self.refreshes = 0  # Fetches forced with refresh=True
+
+    async def _load(self, key: str) -> Optional[dict]:
+        """The stored entry ({"stored_at", "articles"}) for key, fresh or stale."""
+        return await run_backend(self.backend.get, self.prefix + key)
+
+    async def _store(self, key: str, articles: List[dict]):
+        # Kept for the stale window; freshness is judged from stored_at
+        entry = {"stored_at": time.time(), "articles": articles}
+        self.evictions += await run_backend(self.backend.set, self.prefix + key, entry, self.stale_ttl_seconds)
+
+    def _is_fresh(self, entry: Optional[dict]) -> bool:
+        return entry is not None and time.time() - entry["stored_at"] < self.ttl_seconds
+
+    async def peek(self, key: str, allow_stale: bool = False) -> Optional[List[dict]]:
+        """Return cached articles without fetching, or None."""
+        entry = await self._load(key)
+        if entry is None:
+            return None
+        age = time.time() - entry["stored_at"]
+        limit = self.stale_ttl_seconds if allow_stale else self.ttl_seconds
+        if age >= limit:
+            return None
+        return list(entry["articles"])
+
+    async def get_or_fetch(self, key: str, fetcher: Callable[[], Awaitable[List[dict]]],
+                           refresh: bool = False) -> List[dict]:
+        """Return fresh cached articles for key, fetching them at most once concurrently.
+
+        The upstream fetch runs as its own task, so a caller that gives up (for
+        example on a deadline) does not cancel it for the other waiters. If the
+        fetch fails and an expired entry is still within the stale window, the
+        stale articles are returned instead of the error. With refresh, a fresh
+        entry is not used: the fetch always runs and replaces it, but failures
+        still fall back to the cached articles.
+        """
+        entry = await self._load(key)
+        if self._is_fresh(entry) and not refresh:
+            self.hits += 1
+            return list(entry["articles"])
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            if refresh:
+                self.refreshes += 1
+            elif entry is not None:
+                self.stale += 1
+            else:
+                self.misses += 1
+            task = asyncio.ensure_future(self._fill(key, fetcher, entry))
+            # Retrieve the exception even if every waiter has gone away.
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        return list(await asyncio.shield(task))
+
+    async def _wait_for_peer(self, key: str, stored_after: float) -> Tuple[Optional[List[dict]], bool]:
+        """Poll for the entry another process is fetching.
+
+        Returns (articles, False) once a fresh entry stored after stored_after
+        appears, or (None, holds_lock) if the other fetch failed (we take over
+        its lock) or took too long.
+        """
+        deadline = time.monotonic() + self.fetch_lock_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            entry = await self._load(key)
+            if self._is_fresh(entry) and entry["stored_at"] > stored_after:
+                return entry["articles"], False
+            if await run_backend(self.backend.acquire_lock, self.prefix + key, self.fetch_lock_seconds):
+                return None, True
+        return None, False
+
+    async def _fill(self, key: str, fetcher: Callable[[], Awaitable[List[dict]]],
+                    entry: Optional[dict]) -> List[dict]:
+        lock_key = self.prefix + key
+        try:
+            holds_lock = self.backend.shared and await run_backend(
+                self.backend.acquire_lock, lock_key, self.fetch_lock_seconds
+            )
+            if self.backend.shared and not holds_lock:
+                articles, holds_lock = await self._wait_for_peer(key, entry["stored_at"] if entry else 0.0)
+                if articles is not None:
+                    self.peer_fetches += 1
+                    return articles
+            try:
+                articles = await fetcher()
+            finally:
+                if holds_lock:
+                    await run_backend(self.backend.release_lock, lock_key)
+        except Exception:
+            if entry is not None and time.time() - entry["stored_at"] < self.stale_ttl_seconds:
+                return entry["articles"]
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        await self._store(key, articles)
+        return articles
+
+    def invalidate(self, key: Optional[str] = None):
+        """Drop one key, or every entry when key is None."""
+        if key is None:
+            self.backend.delete_prefix(self.prefix)
+        else:
+            self.backend.delete(self.prefix + key)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.stale + self.coalesced
+        return {
+            "entries": self.backend.count(self.prefix),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "peer_fetches": self.peer_fetches,
+            "refreshes": self.refreshes,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
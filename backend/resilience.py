@@ -0,0 +1,268 @@
+# backend/resilience.py
+"""Rate limiting, circuit breaking and adaptive timeouts for upstream services.
+
+Every call to NewsAPI, Gemini or SMTP goes through an Upstream guard:
+
+    async with newsapi_upstream.guard() as call:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=call.timeout)) as response:
+            ...
+
+The guard fails fast with UpstreamUnavailable while the circuit is open or
+the rate limit would make the caller wait too long, so callers can serve cached
+or degraded content instead. Rate limits are shared by every process when
+the upstream is given a shared cache backend (CACHE_BACKEND=sqlite or redis)
+and per process otherwise; circuit breakers are always per process.
+"""
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple, Type
+
+from metrics import UPSTREAM_CIRCUIT_STATE, UPSTREAM_REJECTED, UPSTREAM_SECONDS, UPSTREAM_TIMEOUT_SECONDS
+from shared_cache import MemoryBackend, run_backend
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling an upstream whose circuit is open or whose rate limit is exhausted."""
+
+    def __init__(self, upstream: str, reason: str):
+        super().__init__(f"{upstream} unavailable: {reason}")
+        self.upstream = upstream
+        self.reason = reason
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `capacity`, kept in a cache backend."""
+
+    def __init__(self, rate: float, capacity: float, backend=None, key: str = "bucket"):
+        self.rate = rate
+        self.capacity = capacity
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.key = key
+
+    async def reserve(self, max_wait: float) -> Optional[float]:
+        """Take a token, returning how long to wait before using it, or None if that exceeds max_wait."""
+        return await run_backend(self.backend.take_token, self.key, self.rate, self.capacity, max_wait)
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and lets one trial call through after `reset_seconds`."""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        """Seconds until an open circuit lets a trial call through."""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+
+    def release_trial(self):
+        """Give back a half-open trial call that was admitted but never made."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class AdaptiveTimeout:
+    """Timeout tracking observed latency: smoothed mean plus four deviations, as TCP does for RTO."""
+
+    def __init__(self, min_seconds: float, max_seconds: float, alpha: float = 0.125, beta: float = 0.25):
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.alpha = alpha
+        self.beta = beta
+        self.mean: Optional[float] = None
+        self.deviation = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            if self.mean is None:
+                self.mean = seconds
+                self.deviation = seconds / 2
+            else:
+                self.deviation = (1 - self.beta) * self.deviation + self.beta * abs(seconds - self.mean)
+                self.mean = (1 - self.alpha) * self.mean + self.alpha * seconds
+
+    @property
+    def seconds(self) -> float:
+        if self.mean is None:
+            return self.max_seconds
+        return min(self.max_seconds, max(self.min_seconds, self.mean + 4 * self.deviation))
+
+
+class UsageRecorder:
+    """Counts upstream calls and tokens in memory and writes them to APIUsage in batches."""
+
+    def __init__(self):
+        self._counts: Dict[Tuple[str, str], list] = defaultdict(lambda: [0, 0])  # (service, endpoint) -> [requests, tokens]
+        self._lock = threading.Lock()
+
+    def record(self, service: str, endpoint: str, tokens: int = 0):
+        with self._lock:
+            counts = self._counts[(service, endpoint)]
+            counts[0] += 1
+            counts[1] += tokens
+
+    def flush(self):
+        """Write one APIUsage row per (service, endpoint) seen since the last flush."""
+        with self._lock:
+            counts, self._counts = self._counts, defaultdict(lambda: [0, 0])
+        if not counts:
+            return
+        from database import SessionLocal
+        from models import APIUsage
+
+        db = SessionLocal()
+        try:
+            db.add_all(
+                APIUsage(service=service, endpoint=endpoint, requests_count=requests, tokens_used=tokens or None)
+                for (service, endpoint), (requests, tokens) in counts.items()
+            )
+            db.commit()
+        except Exception as e:
+            print(f"Error recording API usage: {e}")
+        finally:
+            db.close()
+
+
+usage = UsageRecorder()
+
+
+async def flush_usage_periodically(interval_seconds: float):
+    """Flush recorded API usage every interval_seconds until cancelled."""
+    try:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            await asyncio.to_thread(usage.flush)
+    finally:
+        await asyncio.to_thread(usage.flush)
+
+
+class UpstreamCall:
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.tokens = 0  # Set by the caller when the upstream reports token usage
+
+
+class Upstream:
+    """Rate limit, circuit breaker and adaptive timeout for one upstream service."""
+
+    def __init__(self, name: str, endpoint: str, rate_per_minute: float, burst: int,
+                 min_timeout_seconds: float, max_timeout_seconds: float, max_wait_seconds: float = 2,
+                 failure_threshold: int = 5, reset_seconds: float = 30,
+                 ignored_errors: Tuple[Type[BaseException], ...] = (), backend=None):
+        self.name = name
+        self.endpoint = endpoint
+        self.max_wait_seconds = max_wait_seconds
+        self.ignored_errors = ignored_errors  # Errors that say nothing about the upstream's health
+        self.bucket = TokenBucket(rate_per_minute / 60, burst, backend, key=f"ratelimit:{name}")
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.timeout = AdaptiveTimeout(min_timeout_seconds, max_timeout_seconds)
+        self._publish_state()
+
+    def _publish_state(self):
+        UPSTREAM_CIRCUIT_STATE.set(_STATE_VALUES[self.breaker.state], upstream=self.name)
+        UPSTREAM_TIMEOUT_SECONDS.set(self.timeout.seconds, upstream=self.name)
+
+    async def _admit(self) -> float:
+        """Check the breaker and take a token; returns how long to wait before calling."""
+        if not self.breaker.allow():
+            UPSTREAM_REJECTED.inc(upstream=self.name, reason="circuit_open")
+            raise UpstreamUnavailable(self.name, "circuit open")
+        try:
+            wait = await self.bucket.reserve(self.max_wait_seconds)
+        except BaseException:
+            self.breaker.release_trial()
+            raise
+        if wait is None:
+            self.breaker.release_trial()
+            UPSTREAM_REJECTED.inc(upstream=self.name, reason="rate_limited")
+            raise UpstreamUnavailable(self.name, "rate limited")
+        return wait
+
+    def _record(self, started: float, error: Optional[BaseException], tokens: int = 0):
+        elapsed = time.monotonic() - started
+        UPSTREAM_SECONDS.observe(elapsed, upstream=self.name)
+        usage.record(self.name, self.endpoint, tokens)
+        if error is None or isinstance(error, self.ignored_errors):
+            self.breaker.record_success()
+            self.timeout.observe(elapsed)
+        else:
+            self.breaker.record_failure()
+            if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+                # Count a timeout as a slow sample so the next timeout backs off
+                self.timeout.observe(elapsed * 2)
+        self._publish_state()
+
+    @asynccontextmanager
+    async def guard(self):
+        """Admit one call from async code; exceptions raised inside count as upstream failures."""
+        wait = await self._admit()
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # Cancelled before the call was made; a half-open trial must not stay taken
+                self.breaker.release_trial()
+                raise
+        call = UpstreamCall(self.timeout.seconds)
+        started = time.monotonic()
+        try:
+            yield call
+        except asyncio.CancelledError:
+            # The caller gave up (for example a fetch deadline); not the upstream's fault
+            self.breaker.release_trial()
+            raise
+        except BaseException as e:
+            self._record(started, e, call.tokens)
+            raise
+        self._record(started, None, call.tokens)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "retry_after_seconds": round(self.breaker.retry_after(), 3),
+            "timeout_seconds": round(self.timeout.seconds, 3),
+        }
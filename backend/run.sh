@@ -1,3 +1,14 @@
 source path/to/venv/bin/activate
-uvicorn main:app --reload
-
+if [ "${WEB_CONCURRENCY:-1}" -gt 1 ]; then
+    # Several API processes: share caches and rate limits through a local SQLite file
+    export CACHE_BACKEND=${CACHE_BACKEND:-sqlite}
+fi
+# Create and migrate the schema once, before any process uses the database
+python migrations.py
+python scheduler.py run &
+python worker.py --processes ${WORKER_PROCESSES:-1} &
+if [ "${WEB_CONCURRENCY:-1}" -gt 1 ]; then
+    gunicorn -c gunicorn.conf.py main:app
+else
+    uvicorn main:app --reload
+fi
@@ -0,0 +1,232 @@
+# backend/scheduler.py
+"""Prefetch headlines and summaries ahead of time and publish them as editions.
+
+    python scheduler.py run --interval 900
+    python scheduler.py refresh
+
+Every run fetches top headlines for all categories, summarizes articles that
+have no cached summary yet and stores the result as a new Edition row, which
+signups and campaigns read with a single query. A lease row in the database
+keeps scheduler processes (and manual refreshes) from building at the same time.
+`run` serves its metrics on SCHEDULER_METRICS_PORT (0 disables them).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+
+from article_store import url_hash
+from database import SessionLocal
+from http_client import close_http_session
+from main import API_USAGE_FLUSH_SECONDS, AVAILABLE_CATEGORIES, fetch_news_articles, summarize_articles
+from metrics import start_metrics_server
+from models import Edition, NewsArticle, SchedulerLease
+from resilience import flush_usage_periodically
+
+SCHEDULER_INTERVAL_SECONDS = float(os.getenv("SCHEDULER_INTERVAL_SECONDS", "900"))
+SCHEDULER_LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "300"))
+SCHEDULER_METRICS_PORT = int(os.getenv("SCHEDULER_METRICS_PORT", "9100"))
+EDITION_LEASE = "edition"
+
+
+def acquire_lease(name: str, holder: str, ttl_seconds: float = SCHEDULER_LEASE_SECONDS) -> bool:
+    """Take or extend the lease unless another holder has an unexpired one."""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(SchedulerLease)
+            .where(SchedulerLease.name == name)
+            .where(or_(SchedulerLease.expires_at < now, SchedulerLease.holder == holder))
+            .values(holder=holder, expires_at=expires_at)
+        )
+        if result.rowcount == 0:
+            # Either nobody has taken this lease yet or someone else holds it
+            db.add(SchedulerLease(name=name, holder=holder, expires_at=expires_at))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                return False
+            return True
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+def release_lease(name: str, holder: str):
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(SchedulerLease)
+            .where(SchedulerLease.name == name, SchedulerLease.holder == holder)
+            .values(expires_at=datetime.utcnow())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _latest_edition_content() -> Dict[str, List[dict]]:
+    db = SessionLocal()
+    try:
+        content = db.query(Edition.content).order_by(Edition.id.desc()).limit(1).scalar()
+    finally:
+        db.close()
+    return json.loads(content) if content else {}
+
+
+def _store_edition(content: Dict[str, List[dict]]) -> Optional[int]:
+    """Store content as a new edition, or return None when it matches the latest one.
+
+    An unchanged edition has its checked_at bumped instead, so readers keep
+    treating it as fresh.
+    """
+    serialized = json.dumps(content, sort_keys=True)
+    content_hash = hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+    db = SessionLocal()
+    try:
+        latest = db.query(Edition.id, Edition.content_hash).order_by(Edition.id.desc()).limit(1).first()
+        if latest is not None and latest.content_hash == content_hash:
+            db.query(Edition).filter(Edition.id == latest.id).update({Edition.checked_at: datetime.utcnow()})
+            db.commit()
+            return None
+
+        edition = Edition(
+            content_hash=content_hash,
+            content=serialized,
+            article_count=sum(len(articles) for articles in content.values()),
+        )
+        db.add(edition)
+
+        # Keep summaries on the stored articles as well
+        summaries = {url_hash(a["url"]): a["summary"] for articles in content.values() for a in articles if a.get("summary")}
+        if summaries:
+            for article in db.query(NewsArticle).filter(NewsArticle.url_hash.in_(list(summaries))):
+                article.ai_summary = summaries[article.url_hash]
+        db.commit()
+        return edition.id
+    finally:
+        db.close()
+
+
+def _edition_article(article: dict, summary: Optional[str]) -> dict:
+    """The fields the templates need, without the full article content."""
+    return {
+        "title": article.get("title"),
+        "url": article.get("url"),
+        "description": article.get("description"),
+        "summary": summary,
+        "source": {"name": (article.get("source") or {}).get("name")},
+        "publishedAt": article.get("publishedAt"),
+    }
+
+
+async def build_edition() -> Optional[int]:
+    """Fetch and summarize every category and store the result as a new edition.
+
+    Categories that fail to fetch keep their articles from the previous edition.
+    Returns the new edition id, or None when nothing changed.
+    """
+    started = time.monotonic()
+    # Always go to NewsAPI, refreshing the shared headline cache on the way; a
+    # category that fails still falls back to its stale cached articles
+    articles_by_category = await fetch_news_articles(AVAILABLE_CATEGORIES, refresh=True)
+    previous = await asyncio.to_thread(_latest_edition_content)
+
+    fetched = [(category, article) for category, articles in articles_by_category.items() for article in articles]
+    summaries = await summarize_articles([article for _, article in fetched])
+
+    content: Dict[str, List[dict]] = {}
+    for (category, article), summary in zip(fetched, summaries):
+        # request_summary falls back to this placeholder; templates show the description instead
+        if summary == f"Summary unavailable. {article.get('title') or ''}":
+            summary = None
+        content.setdefault(category, []).append(_edition_article(article, summary))
+    for category in AVAILABLE_CATEGORIES:
+        if category not in content and previous.get(category):
+            print(f"No fresh articles for {category}; keeping the previous edition's")
+            content[category] = previous[category]
+
+    edition_id = await asyncio.to_thread(_store_edition, content)
+    elapsed = time.monotonic() - started
+    if edition_id is None:
+        print(f"Edition unchanged after {elapsed:.1f}s")
+    else:
+        print(f"Stored edition {edition_id} with {len(fetched)} fresh articles in {elapsed:.1f}s")
+    return edition_id
+
+
+async def refresh_once(holder: str) -> bool:
+    """Build one edition while holding the lease; returns False if another process holds it."""
+    if not await asyncio.to_thread(acquire_lease, EDITION_LEASE, holder):
+        print("Another scheduler is building an edition; skipping")
+        return False
+
+    async def renew():
+        while True:
+            await asyncio.sleep(SCHEDULER_LEASE_SECONDS / 3)
+            await asyncio.to_thread(acquire_lease, EDITION_LEASE, holder)
+
+    renewer = asyncio.create_task(renew())
+    try:
+        await build_edition()
+    finally:
+        renewer.cancel()
+        await asyncio.to_thread(release_lease, EDITION_LEASE, holder)
+    return True
+
+
+async def run_scheduler(interval_seconds: float = SCHEDULER_INTERVAL_SECONDS):
+    """Build an edition every interval_seconds, measured from the start of each run."""
+    holder = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        started = time.monotonic()
+        try:
+            await refresh_once(holder)
+        except Exception as e:
+            print(f"Edition build failed: {e}")
+        await asyncio.sleep(max(0.0, interval_seconds - (time.monotonic() - started)))
+
+
+async def _run_cli(args):
+    usage_flusher = asyncio.create_task(flush_usage_periodically(API_USAGE_FLUSH_SECONDS))
+    # A one-off refresh exits before anything could scrape it
+    server = start_metrics_server(SCHEDULER_METRICS_PORT) if args.command == "run" else None
+    try:
+        if args.command == "run":
+            await run_scheduler(args.interval)
+        else:
+            holder = f"{socket.gethostname()}:{os.getpid()}"
+            if not await refresh_once(holder):
+                raise SystemExit(1)
+    finally:
+        usage_flusher.cancel()
+        await asyncio.gather(usage_flusher, return_exceptions=True)
+        await close_http_session()
+        if server is not None:
+            server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="Build editions periodically")
+    run_parser.add_argument("--interval", type=float, default=SCHEDULER_INTERVAL_SECONDS,
+                            help="Seconds between edition builds")
+    subparsers.add_parser("refresh", help="Build one edition now")
+    asyncio.run(_run_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+# backend/shared_cache.py
+"""Cache storage that can be shared by several worker processes.
+
+CACHE_BACKEND picks the implementation:
+
+    memory  per-process dictionary (default, single worker)
+    sqlite  a local SQLite file shared by every worker on the host (CACHE_SQLITE_PATH)
+    redis   a Redis server shared across hosts (REDIS_URL, needs the `redis` package)
+
+Besides key/value entries, every backend provides short-lived locks (so one
+process fetches while others wait) and an atomic token bucket for rate limits.
+Values must be JSON-serializable. Backend methods block; async code calls
+them through run_backend.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "./cache.db")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, capacity: float,
+            max_wait: float) -> Tuple[float, Optional[float]]:
+    """Token bucket step shared by the backends: returns (tokens left, wait or None if refused)."""
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+    if wait > max_wait:
+        return tokens, None
+    return tokens - 1, wait
+
+
+class MemoryBackend:
+    """In-process LRU; the behaviour of a single worker."""
+
+    shared = False
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()  # key -> (expires_at, value)
+        self._locks = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> int:
+        """Store value; returns how many entries were evicted to make room."""
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def count(self, prefix: str) -> int:
+        with self._lock:
+            return sum(1 for key in self._entries if key.startswith(prefix))
+
+    def acquire_lock(self, key: str, ttl_seconds: float) -> bool:
+        with self._lock:
+            now = time.time()
+            if self._locks.get(key, 0) > now:
+                return False
+            self._locks[key] = now + ttl_seconds
+            return True
+
+    def release_lock(self, key: str):
+        with self._lock:
+            self._locks.pop(key, None)
+
+    def take_token(self, key: str, rate: float, capacity: float, max_wait: float) -> Optional[float]:
+        with self._lock:
+            now = time.time()
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens, wait = _refill(tokens, updated, now, rate, capacity, max_wait)
+            self._buckets[key] = (tokens, now)
+            return wait
+
+
+class SQLiteBackend:
+    """Cache in a local SQLite file in WAL mode, shared by every process on the host."""
+
+    shared = True
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_cache_entries_expires_at ON cache_entries (expires_at);
+                CREATE TABLE IF NOT EXISTS cache_locks (key TEXT PRIMARY KEY, expires_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL);
+            """)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not cross threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._connection().execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> int:
+        """Store value; returns how many entries were evicted to stay within max_entries.
+
+        Expired entries are dropped first, then the ones closest to expiring:
+        everything at or below the expires_at of the (max_entries + 1)-th
+        newest entry, found on the expires_at index.
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), now + ttl_seconds),
+        )
+        conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+        return conn.execute(
+            "DELETE FROM cache_entries WHERE expires_at <= "
+            "(SELECT expires_at FROM cache_entries ORDER BY expires_at DESC LIMIT 1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix: str):
+        self._connection().execute("DELETE FROM cache_entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def count(self, prefix: str) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE substr(key, 1, ?) = ? AND expires_at > ?",
+            (len(prefix), prefix, time.time()),
+        ).fetchone()[0]
+
+    def acquire_lock(self, key: str, ttl_seconds: float) -> bool:
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT expires_at FROM cache_locks WHERE key = ?", (key,)).fetchone()
+            acquired = not (row and row[0] > now)
+            if acquired:
+                conn.execute("INSERT OR REPLACE INTO cache_locks (key, expires_at) VALUES (?, ?)", (key, now + ttl_seconds))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return acquired
+
+    def release_lock(self, key: str):
+        self._connection().execute("DELETE FROM cache_locks WHERE key = ?", (key,))
+
+    def take_token(self, key: str, rate: float, capacity: float, max_wait: float) -> Optional[float]:
+        now = time.time()
+        conn = self._connection()
+        # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write is atomic across processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens, wait = _refill(tokens, updated, now, rate, capacity, max_wait)
+            conn.execute("INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return wait
+
+
+# Same algorithm as _refill, run atomically inside Redis
+_TAKE_TOKEN_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - updated) * rate)
+local wait = 0
+if tokens < 1 then wait = (1 - tokens) / rate end
+if wait <= max_wait then tokens = tokens - 1 end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+if wait > max_wait then return '' end
+return tostring(wait)
+"""
+
+
+class RedisBackend:
+    """Cache in Redis, shared across hosts."""
+
+    shared = True
+
+    def __init__(self, url: str = REDIS_URL, namespace: str = "newsletter:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis package: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+        self._take_token = self.client.register_script(_TAKE_TOKEN_SCRIPT)
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.client.get(self.namespace + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> int:
+        self.client.set(self.namespace + key, json.dumps(value), px=int(ttl_seconds * 1000))
+        return 0  # Redis evicts on its own (maxmemory-policy)
+
+    def delete(self, key: str):
+        self.client.delete(self.namespace + key)
+
+    def delete_prefix(self, prefix: str):
+        keys = list(self.client.scan_iter(match=self.namespace + prefix + "*", count=500))
+        if keys:
+            self.client.delete(*keys)
+
+    def count(self, prefix: str) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=self.namespace + prefix + "*", count=500))
+
+    def acquire_lock(self, key: str, ttl_seconds: float) -> bool:
+        return bool(self.client.set(self.namespace + "lock:" + key, "1", nx=True, px=int(ttl_seconds * 1000)))
+
+    def release_lock(self, key: str):
+        self.client.delete(self.namespace + "lock:" + key)
+
+    def take_token(self, key: str, rate: float, capacity: float, max_wait: float) -> Optional[float]:
+        result = self._take_token(keys=[self.namespace + "bucket:" + key], args=[rate, capacity, max_wait, time.time()])
+        return float(result) if result else None
+
+
+async def run_backend(method: Callable, *args):
+    """Call a backend method from async code.
+
+    The shared backends wait on disk or network I/O, so their calls run on a
+    thread instead of blocking the event loop; the memory backend is called
+    directly.
+    """
+    if getattr(method.__self__, "shared", True):
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+
+def create_backend(name: str = CACHE_BACKEND):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend()
+    if name == "redis":
+        return RedisBackend()
+    raise ValueError(f"Unknown CACHE_BACKEND '{name}' (expected memory, sqlite or redis)")
@@ -0,0 +1,267 @@
+# backend/smtp_pool.py
+import asyncio
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Union
+
+# Errors after which the SMTP session itself is still usable
+RECOVERABLE_SMTP_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPDataError,
+)
+
+
+# A message is a str/bytes that smtplib encodes for DATA, or pre-encoded chunks streamed to DATA
+Message = Union[str, bytes, Sequence[bytes]]
+
+
+def _reset(server: smtplib.SMTP):
+    """RSET after a refused command; a server that has hung up needs no reset."""
+    try:
+        server.rset()
+    except smtplib.SMTPServerDisconnected:
+        pass
+
+
+def _send_envelope(server: smtplib.SMTP, from_addr: str, to_addrs: Union[str, List[str]]):
+    """MAIL FROM and RCPT TO for one message, as sendmail sends them."""
+    server.ehlo_or_helo_if_needed()
+    code, response = server.mail(from_addr)
+    if code != 250:
+        _reset(server)
+        raise smtplib.SMTPSenderRefused(code, response, from_addr)
+    if isinstance(to_addrs, str):
+        to_addrs = [to_addrs]
+    refused = {}
+    for address in to_addrs:
+        code, response = server.rcpt(address)
+        if code not in (250, 251):
+            refused[address] = (code, response)
+    if len(refused) == len(to_addrs):
+        _reset(server)
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+
+def _send_data(server: smtplib.SMTP, message: Message):
+    """DATA for a message whose envelope has been accepted.
+
+    A list or tuple of CRLF, dot-stuffed byte chunks is written to the socket
+    chunk by chunk, so the shared parts of a bulk message are never copied into
+    one buffer per recipient.
+    """
+    if isinstance(message, (list, tuple)):
+        server.putcmd("data")
+        code, response = server.getreply()
+        if code != 354:
+            _reset(server)
+            raise smtplib.SMTPDataError(code, response)
+        for chunk in message:
+            server.send(chunk)
+        server.send(b".\r\n" if message and message[-1].endswith(b"\r\n") else b"\r\n.\r\n")
+        code, response = server.getreply()
+    else:
+        try:
+            code, response = server.data(message)
+        except smtplib.SMTPDataError:
+            _reset(server)
+            raise
+    if code != 250:
+        _reset(server)
+        raise smtplib.SMTPDataError(code, response)
+
+
+class _PooledConnection:
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+
+
+class SMTPPool:
+    """Pool of long-lived, authenticated SMTP sessions.
+
+    Connections are opened lazily, reused for up to `max_messages_per_connection`
+    messages and discarded on connection-level errors. Blocking smtplib calls
+    run on a dedicated thread pool so `send` can be awaited from the event loop.
+    Point host/port at a local server (for example `python -m aiosmtpd -n -l
+    localhost:8025`) with use_ssl=False and no credentials to run it offline.
+    """
+
+    def __init__(self, host: str, port: int, username: Optional[str] = None, password: Optional[str] = None,
+                 use_ssl: bool = True, starttls: bool = False, size: int = 4,
+                 max_messages_per_connection: int = 100, idle_check_seconds: float = 30, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.starttls = starttls
+        self.size = size
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_check_seconds = idle_check_seconds
+        self.timeout = timeout
+
+        self._idle: "queue.LifoQueue[_PooledConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        self.in_use = 0
+        self.sent = 0
+        self.failed = 0
+        self.bytes_sent = 0
+        self.connections_opened = 0
+        self.connections_recycled = 0
+        self.send_seconds_total = 0.0
+        self._first_send_at: Optional[float] = None
+        self._last_send_at: Optional[float] = None
+
+    def _connect(self) -> _PooledConnection:
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout,
+                                      context=ssl.create_default_context())
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                server.starttls(context=ssl.create_default_context())
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        with self._lock:
+            self.connections_opened += 1
+        return _PooledConnection(server)
+
+    def _checkout(self) -> _PooledConnection:
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - connection.last_used < self.idle_check_seconds:
+                return connection
+            # Idle for a while: make sure the server has not dropped us
+            try:
+                connection.server.noop()
+                return connection
+            except Exception:
+                connection.close()
+
+    def _checkin(self, connection: _PooledConnection, healthy: bool):
+        connection.last_used = time.monotonic()
+        if healthy and connection.sent < self.max_messages_per_connection:
+            self._idle.put(connection)
+            return
+        connection.close()
+        with self._lock:
+            self.connections_recycled += 1
+
+    def send_sync(self, from_addr: str, to_addrs: Union[str, List[str]], message: Message):
+        """Send one message on a pooled connection, blocking the calling thread.
+
+        A list or tuple of byte chunks (see mime_builder) is streamed to the
+        server chunk by chunk; str and bytes go through smtplib's DATA.
+        """
+        started = time.monotonic()
+        self._slots.acquire()
+        with self._lock:
+            self.in_use += 1
+        try:
+            # A kept-alive connection may have been closed by the server; that
+            # shows on the envelope, which is retried once on a fresh connection.
+            for attempt in range(2):
+                connection = self._checkout()
+                try:
+                    _send_envelope(connection.server, from_addr, to_addrs)
+                except RECOVERABLE_SMTP_ERRORS:
+                    self._checkin(connection, healthy=True)
+                    raise
+                except (smtplib.SMTPServerDisconnected, OSError):
+                    self._checkin(connection, healthy=False)
+                    if attempt == 1:
+                        raise
+                    continue
+                except Exception:
+                    self._checkin(connection, healthy=False)
+                    raise
+                break
+            # Once DATA is sent the server may already have the message, so a
+            # failure from here on is not retried: that could deliver it twice.
+            try:
+                _send_data(connection.server, message)
+            except RECOVERABLE_SMTP_ERRORS:
+                self._checkin(connection, healthy=True)
+                raise
+            except Exception:
+                self._checkin(connection, healthy=False)
+                raise
+            connection.sent += 1
+            self._checkin(connection, healthy=True)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+        finished = time.monotonic()
+        with self._lock:
+            self.sent += 1
+            self.bytes_sent += sum(map(len, message)) if isinstance(message, (list, tuple)) else len(message)
+            self.send_seconds_total += finished - started
+            if self._first_send_at is None:
+                self._first_send_at = started
+            self._last_send_at = finished
+
+    async def send(self, from_addr: str, to_addrs: Union[str, List[str]], message: Message):
+        """Send one message without blocking the event loop."""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="smtp")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.send_sync, from_addr, to_addrs, message)
+
+    def stats(self) -> dict:
+        with self._lock:
+            elapsed = (self._last_send_at or 0) - (self._first_send_at or 0)
+            return {
+                "size": self.size,
+                "in_use": self.in_use,
+                "sent": self.sent,
+                "failed": self.failed,
+                "bytes_sent": self.bytes_sent,
+                "connections_opened": self.connections_opened,
+                "connections_recycled": self.connections_recycled,
+                "idle_connections": self._idle.qsize(),
+                "avg_send_seconds": self.send_seconds_total / self.sent if self.sent else 0.0,
+                "messages_per_second": self.sent / elapsed if elapsed > 0 else 0.0,
+            }
+
+    def close(self):
+        """Close idle connections and stop the send threads, waiting for sends in progress.
+
+        This blocks; from the event loop, run it with asyncio.to_thread.
+        """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
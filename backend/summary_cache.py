@@ -0,0 +1,84 @@
+# backend/summary_cache.py
+import hashlib
+from datetime import datetime
+from typing import Dict, Iterable
+
+from sqlalchemy import Column, String, DateTime, Text
+from sqlalchemy.exc import IntegrityError
+
+from database import Base, SessionLocal
+
+# Lookup counters for this process, exported on /metrics
+cache_stats = {"hits": 0, "misses": 0}
+
+
+class ArticleSummary(Base):
+    """AI summary cached by a hash of the exact prompt input"""
+    __tablename__ = "article_summaries"
+
+    content_hash = Column(String(64), primary_key=True)
+    prompt_version = Column(String(20), nullable=False)
+    title = Column(String(500), nullable=True)
+    summary = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ArticleSummary(hash='{self.content_hash[:12]}', title='{(self.title or '')[:50]}...')>"
+
+
+def summary_key(title: str, content: str, prompt_version: str) -> str:
+    """Hash of (title, truncated content, prompt version) identifying a summary."""
+    digest = hashlib.sha256()
+    for part in (prompt_version, title or "", content or ""):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def lookup_summaries(keys: Iterable[str]) -> Dict[str, str]:
+    """Return cached summaries for the given keys in a single query."""
+    keys = list(set(keys))
+    if not keys:
+        return {}
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(ArticleSummary.content_hash, ArticleSummary.summary)
+            .filter(ArticleSummary.content_hash.in_(keys))
+            .all()
+        )
+        found = {row.content_hash: row.summary for row in rows}
+        cache_stats["hits"] += len(found)
+        cache_stats["misses"] += len(keys) - len(found)
+        return found
+    finally:
+        db.close()
+
+
+def store_summaries(summaries: Dict[str, str], prompt_version: str, titles: Dict[str, str] = None):
+    """Persist new summaries; keys another worker stored first are left as they are."""
+    if not summaries:
+        return
+    titles = titles or {}
+    db = SessionLocal()
+    try:
+        rows = [
+            ArticleSummary(content_hash=key, prompt_version=prompt_version,
+                           title=(titles.get(key) or "")[:500], summary=summary)
+            for key, summary in summaries.items()
+        ]
+        try:
+            db.add_all(rows)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            for key, summary in summaries.items():
+                if db.get(ArticleSummary, key) is None:
+                    db.add(ArticleSummary(content_hash=key, prompt_version=prompt_version,
+                                          title=(titles.get(key) or "")[:500], summary=summary))
+                    try:
+                        db.commit()
+                    except IntegrityError:
+                        db.rollback()
+    finally:
+        db.close()
@@ -0,0 +1,166 @@
+# backend/unsubscribe.py
+"""Signed unsubscribe tokens, unsubscribe tombstones and the batched deletion job.
+
+With UNSUBSCRIBE_SIGNING_KEYS set ("kid:secret,kid:secret", the first key
+signs and all of them verify, so keys can be rotated), unsubscribe links carry
+a self-verifying token:
+
+    v1.<kid>.<user id>.<issued at>.<signature>
+
+It is checked without reading the database. An unsubscribe then only writes a
+tombstone row, which stops further mail immediately; the user's data is
+deleted later by `apply_unsubscribes`, in batches, from the job worker. Tokens
+without the v1 prefix are the random tokens stored on users before signing was
+enabled, and are still looked up in the database.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, delete, exists, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Base, SessionLocal
+from models import Newsletter, NewsletterArticle, User, UserCategory
+
+UNSUBSCRIBE_SIGNING_KEYS = os.getenv("UNSUBSCRIBE_SIGNING_KEYS", "")
+UNSUBSCRIBE_BATCH_SIZE = int(os.getenv("UNSUBSCRIBE_BATCH_SIZE", "500"))
+UNSUBSCRIBE_INTERVAL_SECONDS = float(os.getenv("UNSUBSCRIBE_INTERVAL_SECONDS", "5"))
+
+TOKEN_VERSION = "v1"
+
+
+def _parse_keys(value: str) -> Dict[str, bytes]:
+    keys = {}
+    for entry in value.split(","):
+        kid, _, secret = entry.strip().partition(":")
+        if not kid or not secret:
+            continue
+        if "." in kid:
+            raise ValueError(f"Unsubscribe key id '{kid}' must not contain '.'")
+        keys[kid] = secret.encode("utf-8")
+    return keys
+
+
+_keys = _parse_keys(UNSUBSCRIBE_SIGNING_KEYS)
+_active_kid = next(iter(_keys), None)
+
+
+class UnsubscribeTombstone(Base):
+    """A pending unsubscribe: mail stops at once, the user's rows are deleted in a later batch"""
+    __tablename__ = "unsubscribe_tombstones"
+
+    user_id = Column(Integer, primary_key=True)
+    # Only a user created before this is deleted, so a token can never remove a
+    # newer user that reused the id
+    created_before = Column(DateTime, nullable=False)
+    requested_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+def signed_tokens_enabled() -> bool:
+    return _active_kid is not None
+
+
+def _signature(key: bytes, payload: str) -> str:
+    digest = hmac.new(key, payload.encode("ascii"), hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def sign_token(user_id: int, issued_at: Optional[int] = None) -> str:
+    """A signed unsubscribe token for user_id, using the active key."""
+    if _active_kid is None:
+        raise RuntimeError("UNSUBSCRIBE_SIGNING_KEYS is not set")
+    issued_at = int(time.time()) if issued_at is None else issued_at
+    payload = f"{TOKEN_VERSION}.{_active_kid}.{user_id}.{issued_at}"
+    return f"{payload}.{_signature(_keys[_active_kid], payload)}"
+
+
+def is_signed_token(token: str) -> bool:
+    return token.startswith(TOKEN_VERSION + ".")
+
+
+def verify_token(token: str) -> Optional[Tuple[int, int]]:
+    """(user id, issued at) for a valid signed token, or None."""
+    # compare_digest refuses non-ASCII str, and no valid token contains any
+    if not token.isascii():
+        return None
+    parts = token.split(".")
+    if len(parts) != 5 or parts[0] != TOKEN_VERSION:
+        return None
+    _, kid, user_id, issued_at, signature = parts
+    key = _keys.get(kid)
+    if key is None or not user_id.isdigit() or not issued_at.isdigit():
+        return None
+    if not hmac.compare_digest(signature, _signature(key, token.rpartition(".")[0])):
+        return None
+    return int(user_id), int(issued_at)
+
+
+async def add_tombstone(db: AsyncSession, user_id: int, created_before: datetime):
+    """Record a pending unsubscribe for user_id and commit; a repeated request is a no-op."""
+    db.add(UnsubscribeTombstone(user_id=user_id, created_before=created_before))
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Already pending
+        await db.rollback()
+
+
+def not_unsubscribed(user_id=User.id):
+    """Filter leaving out users with a pending unsubscribe; user_id is the column holding the user's id."""
+    return ~exists().where(UnsubscribeTombstone.user_id == user_id)
+
+
+def apply_unsubscribes(batch_size: int = UNSUBSCRIBE_BATCH_SIZE) -> int:
+    """Delete the data of up to batch_size unsubscribed users in one transaction.
+
+    Returns the number of unsubscribes applied. Tombstones whose user is already
+    gone (or was replaced by a newer user with the same id) are cleared without
+    deleting anything.
+    """
+    db = SessionLocal()
+    try:
+        tombstones = db.execute(
+            select(UnsubscribeTombstone.user_id)
+            .order_by(UnsubscribeTombstone.requested_at)
+            .limit(batch_size)
+        ).scalars().all()
+        if not tombstones:
+            return 0
+        user_ids = db.execute(
+            select(User.id)
+            .join(UnsubscribeTombstone, UnsubscribeTombstone.user_id == User.id)
+            .where(
+                User.id.in_(tombstones),
+                or_(User.created_at.is_(None), User.created_at < UnsubscribeTombstone.created_before),
+            )
+        ).scalars().all()
+        if user_ids:
+            # Children first; SQLite does not enforce ON DELETE CASCADE without PRAGMA foreign_keys
+            newsletters = select(Newsletter.id).where(Newsletter.user_id.in_(user_ids))
+            db.execute(delete(NewsletterArticle).where(NewsletterArticle.newsletter_id.in_(newsletters)))
+            db.execute(delete(Newsletter).where(Newsletter.user_id.in_(user_ids)))
+            db.execute(delete(UserCategory).where(UserCategory.user_id.in_(user_ids)))
+            db.execute(delete(User).where(User.id.in_(user_ids)))
+        db.execute(delete(UnsubscribeTombstone).where(UnsubscribeTombstone.user_id.in_(tombstones)))
+        db.commit()
+        return len(tombstones)
+    finally:
+        db.close()
+
+
+async def apply_unsubscribes_periodically(interval_seconds: float = UNSUBSCRIBE_INTERVAL_SECONDS):
+    """Apply pending unsubscribes every interval_seconds until cancelled, draining full batches at once."""
+    while True:
+        try:
+            while await asyncio.to_thread(apply_unsubscribes) >= UNSUBSCRIBE_BATCH_SIZE:
+                pass
+        except Exception as e:
+            print(f"Error applying unsubscribes: {e}")
+        await asyncio.sleep(interval_seconds)
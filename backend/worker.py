@@ -0,0 +1,191 @@
+# backend/worker.py
+"""Background worker for the job queue.
+
+Run one or more worker processes against the same database:
+
+    python worker.py --processes 4 --concurrency 8
+
+Each process serves its metrics on WORKER_METRICS_PORT plus its index
+(0 disables them).
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import traceback
+
+from database import SessionLocal
+from job_queue import (
+    WELCOME_NEWSLETTER,
+    claim_job,
+    complete_job,
+    fail_job,
+    requeue_stale_jobs,
+)
+from main import API_USAGE_FLUSH_SECONDS, send_welcome_newsletter, smtp_pool
+from http_client import close_http_session
+from metrics import start_metrics_server
+from resilience import flush_usage_periodically
+from unsubscribe import apply_unsubscribes_periodically
+
+WORKER_POLL_INTERVAL_SECONDS = float(os.getenv("WORKER_POLL_INTERVAL_SECONDS", "1"))
+# How often each worker process looks for jobs left running by a dead worker
+WORKER_REQUEUE_INTERVAL_SECONDS = float(os.getenv("WORKER_REQUEUE_INTERVAL_SECONDS", "60"))
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9101"))
+
+
+async def handle_welcome_newsletter(payload: dict):
+    db = SessionLocal()
+    try:
+        sent = await send_welcome_newsletter(payload["user_id"], db)
+    finally:
+        db.close()
+    if sent is False:
+        raise RuntimeError("Newsletter delivery failed")
+
+
+HANDLERS = {
+    WELCOME_NEWSLETTER: handle_welcome_newsletter,
+}
+
+
+def _claim(worker_id: str):
+    db = SessionLocal()
+    try:
+        job = claim_job(db, worker_id)
+        if job is not None:
+            db.expunge(job)
+        return job
+    finally:
+        db.close()
+
+
+def _finish(job, error: str = None):
+    db = SessionLocal()
+    try:
+        job = db.merge(job)
+        if error is None:
+            complete_job(db, job)
+        else:
+            fail_job(db, job, error)
+    finally:
+        db.close()
+
+
+def _requeue_stale():
+    db = SessionLocal()
+    try:
+        return requeue_stale_jobs(db)
+    finally:
+        db.close()
+
+
+async def requeue_stale_periodically(interval_seconds: float = WORKER_REQUEUE_INTERVAL_SECONDS):
+    """Requeue stale jobs now and every interval_seconds until cancelled."""
+    while True:
+        try:
+            requeued, failed = await asyncio.to_thread(_requeue_stale)
+            if requeued or failed:
+                print(f"Requeued {requeued} stale jobs, failed {failed} out of attempts")
+        except Exception as e:
+            print(f"Error requeuing stale jobs: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+async def run_job(job):
+    handler = HANDLERS.get(job.kind)
+    if handler is None:
+        await asyncio.to_thread(_finish, job, f"No handler for job kind '{job.kind}'")
+        return
+    try:
+        await handler(job.data)
+    except Exception as e:
+        print(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed: {e}")
+        traceback.print_exc()
+        await asyncio.to_thread(_finish, job, str(e))
+    else:
+        await asyncio.to_thread(_finish, job)
+
+
+async def worker_loop(worker_id: str, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            job = await asyncio.to_thread(_claim, worker_id)
+        except Exception as e:
+            print(f"Worker {worker_id} failed to poll queue: {e}")
+            job = None
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=WORKER_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await run_job(job)
+
+
+async def run_worker(concurrency: int):
+    """Run `concurrency` job loops in this process until SIGINT/SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    base_id = f"{socket.gethostname()}:{os.getpid()}"
+    usage_flusher = asyncio.create_task(flush_usage_periodically(API_USAGE_FLUSH_SECONDS))
+    # Deletes the data of unsubscribed users in batches, off the request path
+    unsubscriber = asyncio.create_task(apply_unsubscribes_periodically())
+    # Jobs of a worker that died mid-run come back once their lock times out
+    requeuer = asyncio.create_task(requeue_stale_periodically())
+    try:
+        await asyncio.gather(*(worker_loop(f"{base_id}:{i}", stop) for i in range(concurrency)))
+    finally:
+        usage_flusher.cancel()
+        unsubscriber.cancel()
+        requeuer.cancel()
+        await asyncio.gather(usage_flusher, unsubscriber, requeuer, return_exceptions=True)
+        await close_http_session()
+        await asyncio.to_thread(smtp_pool.close)
+
+
+def _process_main(concurrency: int, index: int = 0):
+    server = start_metrics_server(WORKER_METRICS_PORT + index if WORKER_METRICS_PORT else 0)
+    try:
+        asyncio.run(run_worker(concurrency))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued newsletter jobs")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("WORKER_PROCESSES", "1")))
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WORKER_CONCURRENCY", "4")))
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _process_main(args.concurrency)
+        return
+
+    processes = [
+        multiprocessing.Process(target=_process_main, args=(args.concurrency, index))
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+// Writes .br and .gz copies of every compressible file in dist/ after `vite build`,
+// so the backend (backend/frontend.py) can serve them without compressing per request.
+import { readdirSync, readFileSync, statSync, writeFileSync } from 'node:fs'
+import { extname, join } from 'node:path'
+import { fileURLToPath } from 'node:url'
+import { brotliCompressSync, constants, gzipSync } from 'node:zlib'
+
+const DIST_DIR = fileURLToPath(new URL('../dist/', import.meta.url))
+const COMPRESSIBLE = new Set(['.html', '.js', '.mjs', '.css', '.svg', '.json', '.map', '.txt', '.xml', '.webmanifest'])
+// Below this, headers cost more than compression saves
+const MIN_SIZE = 1024
+
+function* walk(dir) {
+  for (const entry of readdirSync(dir, { withFileTypes: true })) {
+    const path = join(dir, entry.name)
+    if (entry.isDirectory()) {
+      yield* walk(path)
+    } else {
+      yield path
+    }
+  }
+}
+
+const encoders = {
+  '.br': (data) => brotliCompressSync(data, {
+    params: {
+      [constants.BROTLI_PARAM_QUALITY]: constants.BROTLI_MAX_QUALITY,
+      [constants.BROTLI_PARAM_SIZE_HINT]: data.length,
+    },
+  }),
+  '.gz': (data) => gzipSync(data, { level: constants.Z_BEST_COMPRESSION }),
+}
+
+let files = 0
+let originalBytes = 0
+let brotliBytes = 0
+for (const path of walk(DIST_DIR)) {
+  if (!COMPRESSIBLE.has(extname(path)) || statSync(path).size < MIN_SIZE) {
+    continue
+  }
+  const data = readFileSync(path)
+  for (const [suffix, encode] of Object.entries(encoders)) {
+    const compressed = encode(data)
+    // Only keep a variant that is actually smaller
+    if (compressed.length < data.length) {
+      writeFileSync(path + suffix, compressed)
+      if (suffix === '.br') {
+        brotliBytes += compressed.length
+      }
+    }
+  }
+  files += 1
+  originalBytes += data.length
+}
+console.log(`compress: ${files} files, ${originalBytes} bytes -> ${brotliBytes} bytes brotli`)
@@ -2,6 +2,10 @@
 import React, { useState } from 'react';
 import { Mail, Newspaper, Sparkles, Check, AlertCircle, Loader } from 'lucide-react';
 
+// Same origin when the backend serves the build; the dev server proxies /api to it.
+// Set VITE_API_URL to call a backend on another origin.
+const API_URL = import.meta.env.VITE_API_URL ?? (import.meta.env.DEV ? '/api' : '');
+
 const App = () => {
   const [formData, setFormData] = useState({
     name: '',
@@ -69,8 +73,7 @@ const App = () => {
     setErrorMessage('');
 
     try {
-      // Replace with your actual backend URL
-      const response = await fetch('http://localhost:8000/register', {
+      const response = await fetch(`${API_URL}/register`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',